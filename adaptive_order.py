@@ -0,0 +1,169 @@
+"""Adaptive first_match provider order (``[GENRE] adaptive_order = true``).
+
+The backends list providers in a fixed order. In ``first_match`` mode each
+album walks that chain until a provider answers, so the chain order decides
+how much time is spent: a provider that rarely answers but sits near the top
+is paid for on almost every album.
+
+:class:`ProviderHistory` keeps per-provider calls, successes and seconds across
+runs (per backend, older runs decayed so the order follows the library).
+:class:`AdaptiveOrder` reorders each chain by expected cost per successful
+answer (mean latency / yield, both smoothed towards a prior so rarely-called
+providers are not written off) — the classic optimal order for a sequential
+search. Quality is a hard constraint on *expected* quality, a provider's
+``SOURCE_WEIGHTS`` weight times its smoothed yield: a provider may only move
+ahead of one that statically precedes it if its expected quality is at least
+``quality_ratio`` times the other's. A high-weight source that almost never
+answers therefore drops behind lower-weight ones that do, while a source that
+answers about as often keeps its precedence. The time saved is reported as the expected provider time of
+the static chains versus the adaptive ones under the same statistics.
+"""
+
+import json
+import os
+import sys
+import tempfile
+from collections import Counter
+
+from genre_normalization import SOURCE_WEIGHTS
+
+DEFAULT_STATS_FILE = os.path.join("~", ".cache", "likes_songs_sorter", "provider_stats.json")
+# Weight of previous runs when merging in a new one.
+HISTORY_DECAY = 0.7
+# Beta prior on the yield and pseudo-calls at PRIOR_LATENCY for the latency.
+PRIOR_SUCCESSES = 1.0
+PRIOR_FAILURES = 1.0
+PRIOR_CALLS = 3.0
+PRIOR_LATENCY = 1.0
+
+
+class ProviderHistory:
+    """Decayed per-provider ``calls`` / ``successes`` / ``seconds`` for one backend."""
+
+    def __init__(self, path=None, scope="default"):
+        self.path = os.path.expanduser(path or DEFAULT_STATS_FILE)
+        self.scope = scope
+        self._all = self._load()
+        self.providers = self._all.get(scope, {})
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def estimate(self, name):
+        """Smoothed ``(yield, mean latency in seconds)`` for a provider."""
+        stats = self.providers.get(name) or {}
+        calls = float(stats.get("calls", 0.0))
+        successes = float(stats.get("successes", 0.0))
+        seconds = float(stats.get("seconds", 0.0))
+        p = (successes + PRIOR_SUCCESSES) / (calls + PRIOR_SUCCESSES + PRIOR_FAILURES)
+        latency = (seconds + PRIOR_CALLS * PRIOR_LATENCY) / (calls + PRIOR_CALLS)
+        return p, latency
+
+    def merge(self, metrics, decay=HISTORY_DECAY):
+        """Fold one run's :class:`~provider_metrics.ProviderMetrics` in."""
+        merged = {}
+        for name, stats in self.providers.items():
+            merged[name] = {k: float(v) * decay for k, v in stats.items()}
+        for name, stats in metrics.providers.items():
+            entry = merged.setdefault(name, {"calls": 0.0, "successes": 0.0, "seconds": 0.0})
+            entry["calls"] += stats.calls
+            entry["successes"] += stats.successes
+            entry["seconds"] += stats.total_seconds
+        self.providers = merged
+
+    def save(self):
+        data = self._load()  # keep other backends' sections
+        data[self.scope] = self.providers
+        directory = os.path.dirname(self.path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump(data, fh, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+        except OSError as exc:
+            print(f"⚠️ Could not save provider stats to {self.path} ({exc}).", file=sys.stderr)
+
+
+def expected_cost(names, estimate):
+    """Expected seconds spent walking ``names`` until the first answer."""
+    total, reach = 0.0, 1.0
+    for name in names:
+        p, latency = estimate(name)
+        total += reach * latency
+        reach *= 1.0 - p
+    return total
+
+
+def plan_order(names, estimate, weights=None, quality_ratio=1.0):
+    """Reorder a chain by latency / yield under the quality constraint.
+
+    Greedy topological order: at each step the cheapest provider whose every
+    remaining static predecessor it may overtake (expected quality, weight x
+    yield, at least ``quality_ratio`` times the predecessor's) is placed next.
+    The first remaining static provider is always eligible, so the plan is
+    complete.
+    """
+    weights = SOURCE_WEIGHTS if weights is None else weights
+    estimates = {name: estimate(name) for name in names}
+    quality = {name: weights.get(name, 1.0) * estimates[name][0] for name in names}
+    remaining = list(names)
+    order = []
+    while remaining:
+        best = None
+        for index, name in enumerate(remaining):
+            if any(quality[name] < quality_ratio * quality[before]
+                   for before in remaining[:index]):
+                continue
+            p, latency = estimates[name]
+            score = latency / p
+            if best is None or score < best[0]:
+                best = (score, index)
+        order.append(remaining.pop(best[1]))
+    return order
+
+
+class AdaptiveOrder:
+    """Reorders first_match provider chains and tracks the estimated saving."""
+
+    def __init__(self, history, quality_ratio=1.0, weights=None):
+        self.history = history
+        self.quality_ratio = quality_ratio
+        self.weights = weights
+        self._plans = {}
+        self.chains = Counter()
+
+    def order(self, providers):
+        """Return ``providers`` (``[(name, lookup)]``) in the adaptive order."""
+        names = tuple(name for name, _ in providers)
+        plan = self._plans.get(names)
+        if plan is None:
+            plan = self._plans[names] = plan_order(
+                names, self.history.estimate, self.weights, self.quality_ratio
+            )
+        self.chains[names] += 1
+        by_name = dict(providers)
+        return [(name, by_name[name]) for name in plan]
+
+    def finish(self, metrics):
+        """Merge this run's metrics into the history, save it and report."""
+        self.history.merge(metrics)
+        self.history.save()
+        if not self.chains:
+            return None
+        estimate = self.history.estimate
+        static = sum(expected_cost(names, estimate) * n for names, n in self.chains.items())
+        adaptive = sum(expected_cost(self._plans[names], estimate) * n
+                       for names, n in self.chains.items())
+        names, _ = self.chains.most_common(1)[0]
+        print("\n🧭 Adaptive provider order: " + " → ".join(self._plans[names]))
+        saved = static - adaptive
+        share = saved / static if static else 0.0
+        print(f"   Estimated provider time: {adaptive:.0f}s vs {static:.0f}s with the static "
+              f"order (saves {saved:.0f}s, {share:.0%}, over {sum(self.chains.values())} albums)")
+        return {"static_s": static, "adaptive_s": adaptive, "order": self._plans[names]}
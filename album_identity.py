@@ -0,0 +1,120 @@
+"""Album identity: cleaned names, ``Unique Album`` keys and lookup groups.
+
+The pipeline used to derive album identity per track several times over: a
+regex clean of the album name in the ``Unique Album`` computation and again
+inside the genre resolver, ``casefold`` on every row, and a
+``groupby("Album ID").transform("nunique")``. Here each *distinct* album name
+and artist is cleaned once (factorized with pandas, memoized across calls), the
+``Unique Album`` key is assembled from integer codes in one pass, and tracks
+are grouped by ``(Album ID, Album, Artist)`` so the genre resolver runs once per
+group with a precomputed cleaned name and cache key.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from genre_cache import make_key
+from genre_helpers import clean_album_name
+
+ALBUM_KEY_SEPARATOR = " — "
+
+
+@lru_cache(maxsize=None)
+def cached_clean_album_name(name):
+    """Memoized :func:`genre_helpers.clean_album_name`."""
+    return clean_album_name(name)
+
+
+def _factorize(values):
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object).fillna(""), sort=False)
+    return codes, list(uniques)
+
+
+class AlbumIdentity:
+    """Per-track album identity for a track frame (see :func:`album_identity`).
+
+    * ``clean_names`` — cleaned album name per track (object array);
+    * ``unique_album`` — the ``Unique Album`` key per track;
+    * ``group`` — lookup-group code per track; ``first[g]`` is the first track
+      of group ``g`` and ``cache_keys[g]`` its genre-cache key.
+    """
+
+    def __init__(self, clean_names, unique_album, group, first, cache_keys):
+        self.clean_names = clean_names
+        self.unique_album = unique_album
+        self.group = group
+        self.first = first
+        self.cache_keys = cache_keys
+
+    def __len__(self):
+        return len(self.first)
+
+
+def album_identity(df):
+    """Compute album identity for a frame with Album / Artist / Album ID columns.
+
+    ``Unique Album`` groups by normalized album name + primary artist, so that
+    multiple editions/IDs of the same album are treated as one album, but keeps
+    the raw Album ID for various-artist releases (compilations / soundtracks)
+    so they are not split apart by their per-track artists.
+    """
+    if df.empty:
+        empty = np.array([], dtype=object)
+        return AlbumIdentity(empty, empty, np.array([], dtype=np.int64),
+                             np.array([], dtype=np.int64), [])
+    album_codes, album_names = _factorize(df["Album"])
+    artist_codes, artist_names = _factorize(df["Artist"])
+    raw_ids = df["Album ID"]
+    id_codes, album_ids = pd.factorize(raw_ids, sort=False)
+    width = max(len(artist_names), 1)
+
+    cleaned = np.array([cached_clean_album_name(a) for a in album_names], dtype=object)
+    clean_names = cleaned[album_codes]
+
+    # Name key per distinct (album, artist) pair.
+    album_fold = [c.casefold().strip() for c in cleaned]
+    artist_fold = [a.casefold().strip() for a in artist_names]
+    pair_codes, pair_values = pd.factorize(
+        album_codes.astype(np.int64) * width + artist_codes, sort=False
+    )
+    pair_keys = np.array(
+        [album_fold[p // width] + ALBUM_KEY_SEPARATOR + artist_fold[p % width]
+         for p in pair_values],
+        dtype=object,
+    )
+    unique_album = pair_keys[pair_codes]
+
+    # Albums whose ID spans several artists keep the ID as their key.
+    has_id = id_codes >= 0
+    if has_id.any():
+        id_artist = np.unique(np.stack([id_codes[has_id], artist_codes[has_id]]), axis=1)
+        artists_per_id = np.bincount(id_artist[0], minlength=len(album_ids))
+        multi = has_id.copy()
+        multi[has_id] = artists_per_id[id_codes[has_id]] > 1
+        unique_album[multi] = np.asarray(
+            [str(v) for v in album_ids], dtype=object
+        )[id_codes[multi]]
+
+    # Genre lookup groups: one resolver call per (Album ID, Album, Artist).
+    id_slot = np.where(has_id, id_codes, len(album_ids)).astype(np.int64)
+    triple = (id_slot * (len(album_names) + 1) + album_codes) * width + artist_codes
+    group, first = _first_occurrence(triple)
+    cache_keys = []
+    for row in first:
+        album_id = raw_ids.iat[row]
+        cache_keys.append(make_key(
+            None if pd.isna(album_id) else album_id,
+            album_names[album_codes[row]], artist_names[artist_codes[row]],
+        ))
+    return AlbumIdentity(clean_names, unique_album, group, first, cache_keys)
+
+
+def _first_occurrence(values):
+    """Group codes in first-seen order, plus the first index of each group."""
+    codes, uniques = pd.factorize(values, sort=False)
+    first = np.full(len(uniques), -1, dtype=np.int64)
+    # Reverse assignment leaves the smallest index per code.
+    first[codes[::-1]] = np.arange(len(codes) - 1, -1, -1)
+    return codes, first
@@ -14,6 +14,7 @@ from urllib.parse import urlparse, parse_qs
 
 from tqdm import tqdm
 
+from album_identity import cached_clean_album_name
 from genre_helpers import (
     get_discogs_album_info,
     get_itunes_album_info,
@@ -26,6 +27,18 @@ from genre_helpers import (
     get_spotify_artist_genres,
     get_spotify_track_artist_genres,
 )
+from provider_metrics import response_hook
+from spotify_batch import SpotifyCrossLookup, SpotifyGenreTable
+from tracks import SpotifyTrack, TidalTrack
+import wikipedia_lookup
+
+
+def _count_provider_bytes(sp):
+    """Attribute spotipy response sizes to the provider metrics."""
+    session = getattr(sp, "_session", None)
+    if session is not None:
+        session.hooks["response"].append(response_hook)
+    return sp
 
 
 class Backend:
@@ -35,7 +48,7 @@ class Backend:
     display_name = ""      # human label, e.g. "Spotify"
     liked_label = ""       # label for the "saved tracks" source
     liked_slug = ""        # slug used in CSV file names
-    track_id_col = ""      # DataFrame column holding the service track id
+    track_type = None      # TrackRecord subclass produced by the fetchers
     supports_local = False # whether the service can return local files
 
     def authenticate(self, config):
@@ -59,11 +72,26 @@ class Backend:
         """Return an ordered list of ``(source_label, callable)`` providers."""
         raise NotImplementedError
 
+    def prefetch_genres(self, tracks, config):
+        """Optionally bulk-load provider data for the tracks about to be looked up.
+
+        ``tracks`` holds one record per album group that missed the cache.
+        The default batch-fetches the Wikipedia articles already resolved on
+        earlier runs.
+        """
+        wikipedia_lookup.prefetch_titles(
+            (cached_clean_album_name(t.album or ""), t.artist) for t in tracks
+        )
+
+    def finish_genres(self):
+        """Called once genre enrichment is over (flush provider state)."""
+        wikipedia_lookup.save_titles()
+
     def create_playlist(self, name, description):
         raise NotImplementedError
 
-    def add_tracks(self, handle, ordered_rows):
-        """Upload the ordered rows. Return ``(uploaded, local_skipped)``."""
+    def add_tracks(self, handle, ordered_tracks):
+        """Upload the ordered track records. Return ``(uploaded, local_skipped)``."""
         raise NotImplementedError
 
 
@@ -75,7 +103,7 @@ class SpotifyBackend(Backend):
     display_name = "Spotify"
     liked_label = "Liked songs"
     liked_slug = "liked_songs"
-    track_id_col = "Spotify Track ID"
+    track_type = SpotifyTrack
     supports_local = True
 
     EXPECTED_REDIRECT_URI = "http://127.0.0.1:8080/"
@@ -85,6 +113,7 @@ class SpotifyBackend(Backend):
         self.user_id = None
         self._discogs_key = None
         self._lastfm_key = None
+        self._genre_table = None
 
     # --- auth -----------------------------------------------------------------
     def authenticate(self, config):
@@ -152,7 +181,7 @@ class SpotifyBackend(Backend):
                 print("Could not obtain an access_token.", file=sys.stderr)
                 sys.exit(1)
 
-        self.sp = spotipy.Spotify(auth_manager=oauth)
+        self.sp = _count_provider_bytes(spotipy.Spotify(auth_manager=oauth))
         self.user_id = self.sp.current_user()["id"]
         print("✅ Authentication successful!\n")
 
@@ -163,17 +192,17 @@ class SpotifyBackend(Backend):
             return None
         artists = track.get("artists") or []
         album = track.get("album") or {}
-        return {
-            "Song": track.get("name") or "Unknown Song",
-            "Artist": artists[0].get("name") if artists else "Unknown Artist",
-            "Album": album.get("name") or "Unknown Album",
-            "Album ID": album.get("id"),
-            "Track Number": track.get("track_number"),
-            "Disc Number": track.get("disc_number"),
-            "Spotify Track ID": track.get("id"),
-            "Spotify URI": track.get("uri"),
-            "Is Local": bool(track.get("is_local", False)),
-        }
+        return SpotifyTrack(
+            track.get("name") or "Unknown Song",
+            artists[0].get("name") if artists else "Unknown Artist",
+            album.get("name") or "Unknown Album",
+            album_id=album.get("id"),
+            track_number=track.get("track_number"),
+            disc_number=track.get("disc_number"),
+            track_id=track.get("id"),
+            uri=track.get("uri"),
+            is_local=bool(track.get("is_local", False)),
+        )
 
     # --- fetching -------------------------------------------------------------
     def get_liked_songs(self):
@@ -227,16 +256,32 @@ class SpotifyBackend(Backend):
         return rows
 
     # --- genres ---------------------------------------------------------------
+    def prefetch_genres(self, tracks, config):
+        """Resolve album/track/artist metadata with Spotify's bulk endpoints."""
+        super().prefetch_genres(tracks, config)
+        table = self._genre_table or SpotifyGenreTable(self.sp)
+        album_ids = [t.album_id for t in tracks if not t.is_local]
+        track_ids = [t.track_id for t in tracks if not t.is_local]
+        table.prefetch(album_ids, track_ids)
+        self._genre_table = table
+        print(f"⚡ Prefetched Spotify metadata for {len(table.albums)} albums, "
+              f"{len(table.tracks)} tracks and {len(table.artists)} artists "
+              f"in {table.requests} requests.")
+
     def get_genre_providers(self, song, artist, album, clean_album,
                             album_id, track_id, config):
         sp = self.sp
+        table = self._genre_table
         providers = [
             ("Discogs", lambda: get_discogs_album_info(clean_album, artist, self._discogs_key)),
         ]
         if album_id:
-            providers.append(("Spotify Album", lambda: get_spotify_album_info(sp, album_id)))
+            providers.append(("Spotify Album", (lambda: table.album_genres(album_id)) if table
+                              else (lambda: get_spotify_album_info(sp, album_id))))
         if track_id:
-            providers.append(("Spotify Track Artist", lambda: get_spotify_track_artist_genres(sp, track_id)))
+            providers.append(("Spotify Track Artist",
+                              (lambda: table.track_artist_genres(track_id)) if table
+                              else (lambda: get_spotify_track_artist_genres(sp, track_id))))
         providers.extend([
             ("LastFM Album", lambda: get_lastfm_album_info(clean_album, artist, self._lastfm_key)),
             ("MusicBrainz", lambda: get_musicbrainz_album_info(clean_album, artist)),
@@ -254,13 +299,13 @@ class SpotifyBackend(Backend):
         )
         return playlist["id"]
 
-    def add_tracks(self, playlist_id, ordered_rows):
+    def add_tracks(self, playlist_id, ordered_tracks):
         track_uris = [
-            f"spotify:track:{row.get(self.track_id_col)}"
-            for row in ordered_rows
-            if isinstance(row.get(self.track_id_col), str) and row.get(self.track_id_col)
+            f"spotify:track:{t.track_id}"
+            for t in ordered_tracks
+            if isinstance(t.track_id, str) and t.track_id
         ]
-        local_count = sum(1 for row in ordered_rows if row.get("Is Local"))
+        local_count = sum(1 for t in ordered_tracks if t.is_local)
         chunks = [track_uris[i:i + 100] for i in range(0, len(track_uris), 100)]
         for chunk in tqdm(chunks, desc="Uploading playlist", unit="chunk"):
             self.sp.playlist_add_items(playlist_id, chunk)
@@ -276,7 +321,7 @@ class TidalBackend(Backend):
     display_name = "Tidal"
     liked_label = "Favorite tracks"
     liked_slug = "favorite_tracks"
-    track_id_col = "Tidal Track ID"
+    track_type = TidalTrack
     supports_local = False
 
     PAGE_LIMIT = 100
@@ -286,6 +331,7 @@ class TidalBackend(Backend):
         self._discogs_key = None
         self._lastfm_key = None
         self._spotify = None  # optional Spotify client-credentials client for genre cross-lookup
+        self._cross_lookup = None
 
     # --- auth -----------------------------------------------------------------
     def authenticate(self, config):
@@ -332,11 +378,11 @@ class TidalBackend(Backend):
         try:
             import spotipy
             from spotipy.oauth2 import SpotifyClientCredentials
-            client = spotipy.Spotify(
+            client = _count_provider_bytes(spotipy.Spotify(
                 client_credentials_manager=SpotifyClientCredentials(
                     client_id=client_id, client_secret=client_secret
                 )
-            )
+            ))
             # Probe credentials early so a misconfiguration fails loudly here
             # rather than silently swallowing every lookup later.
             client.search(q="artist:Radiohead", type="artist", limit=1)
@@ -362,15 +408,15 @@ class TidalBackend(Backend):
             artist_name = "Unknown Artist"
         album = getattr(track, "album", None)
         album_id = getattr(album, "id", None)
-        return {
-            "Song": getattr(track, "name", None) or "Unknown Song",
-            "Artist": artist_name,
-            "Album": getattr(album, "name", None) or "Unknown Album",
-            "Album ID": str(album_id) if album_id is not None else None,
-            "Track Number": getattr(track, "track_num", None),
-            "Disc Number": getattr(track, "volume_num", None),
-            "Tidal Track ID": str(track.id) if getattr(track, "id", None) is not None else None,
-        }
+        return TidalTrack(
+            getattr(track, "name", None) or "Unknown Song",
+            artist_name,
+            getattr(album, "name", None) or "Unknown Album",
+            album_id=str(album_id) if album_id is not None else None,
+            track_number=getattr(track, "track_num", None),
+            disc_number=getattr(track, "volume_num", None),
+            track_id=str(track.id) if getattr(track, "id", None) is not None else None,
+        )
 
     # --- fetching -------------------------------------------------------------
     def get_liked_songs(self):
@@ -431,6 +477,24 @@ class TidalBackend(Backend):
         return rows
 
     # --- genres ---------------------------------------------------------------
+    def prefetch_genres(self, tracks, config):
+        """Match albums/artists to Spotify ids once per library, then bulk-load."""
+        super().prefetch_genres(tracks, config)
+        if self._spotify is None:
+            return
+        if self._cross_lookup is None:
+            match_file = config.get("TIDAL", "spotify_match_file", fallback=None) or None
+            self._cross_lookup = SpotifyCrossLookup(self._spotify, match_file)
+        cross = self._cross_lookup
+        cross.prefetch((t.album, t.artist) for t in tracks)
+        print(f"🔗 Spotify cross-lookup: {cross.searches} searches, "
+              f"{cross.table.requests} bulk requests for {len(tracks)} albums.")
+
+    def finish_genres(self):
+        super().finish_genres()
+        if self._cross_lookup is not None:
+            self._cross_lookup.save()
+
     def get_genre_providers(self, song, artist, album, clean_album,
                             album_id, track_id, config):
         # Tidal exposes no genre metadata, so genres come from name-based
@@ -438,7 +502,11 @@ class TidalBackend(Backend):
         # consulted first as a cross-lookup: album-level genres (resolved by
         # searching Spotify for the album) take priority over artist-level.
         providers = []
-        if self._spotify is not None:
+        cross = self._cross_lookup
+        if cross is not None:
+            providers.append(("Spotify Album", lambda: cross.album_genres(album, artist)))
+            providers.append(("Spotify Artist", lambda: cross.artist_genres(artist)))
+        elif self._spotify is not None:
             sp = self._spotify
             providers.append(("Spotify Album", lambda: get_spotify_album_search_info(sp, album, artist)))
             providers.append(("Spotify Artist", lambda: get_spotify_artist_genres(sp, artist)))
@@ -478,13 +546,13 @@ class TidalBackend(Backend):
         self._refresh_tidal_token()
         return self.session.user.create_playlist(name, description)
 
-    def add_tracks(self, playlist, ordered_rows):
+    def add_tracks(self, playlist, ordered_tracks):
         import requests
         from tidalapi.playlist import UserPlaylist
         track_ids = [
-            str(row.get(self.track_id_col))
-            for row in ordered_rows
-            if isinstance(row.get(self.track_id_col), str) and row.get(self.track_id_col)
+            str(t.track_id)
+            for t in ordered_tracks
+            if isinstance(t.track_id, str) and t.track_id
         ]
         chunks = [track_ids[i:i + 100] for i in range(0, len(track_ids), 100)]
         playlist_id = playlist.id
@@ -0,0 +1 @@
+"""Benchmarks for the sorting pipeline (see ``python -m benchmarks.run --help``)."""
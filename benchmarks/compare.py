@@ -0,0 +1,69 @@
+"""Compare two ``benchmarks.run`` reports stage by stage.
+
+    python -m benchmarks.compare BASELINE.json CANDIDATE.json [--threshold 0.2]
+
+Prints the wall time of every stage at every size present in both reports
+and exits with status 1 when any stage got slower by more than
+``--threshold`` (a fraction; stages faster than ``--min-seconds`` in both
+runs are ignored as noise).
+"""
+
+import argparse
+import json
+import sys
+
+
+def compare_reports(baseline, candidate, threshold=0.2, min_seconds=0.01):
+    """Return ``[(size, stage, base_s, new_s, ratio, regressed)]`` for shared stages."""
+    rows = []
+    for size, base in baseline.get("results", {}).items():
+        new = candidate.get("results", {}).get(size)
+        if new is None:
+            continue
+        for stage, base_stage in base.get("stages", {}).items():
+            new_stage = new.get("stages", {}).get(stage)
+            if new_stage is None:
+                continue
+            base_s, new_s = base_stage["wall_s"], new_stage["wall_s"]
+            ratio = new_s / base_s if base_s > 0 else float("inf")
+            regressed = max(base_s, new_s) >= min_seconds and ratio > 1.0 + threshold
+            rows.append((int(size), stage, base_s, new_s, ratio, regressed))
+    return sorted(rows, key=lambda row: row[0])
+
+
+def _label(report):
+    commit = (report.get("commit") or "?")[:10]
+    return commit + ("+dirty" if report.get("dirty") else "")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed slowdown as a fraction (default 0.2 = 20%%).")
+    parser.add_argument("--min-seconds", type=float, default=0.01,
+                        help="Ignore stages faster than this in both runs.")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, encoding="utf-8") as fh:
+        baseline = json.load(fh)
+    with open(args.candidate, encoding="utf-8") as fh:
+        candidate = json.load(fh)
+
+    rows = compare_reports(baseline, candidate, args.threshold, args.min_seconds)
+    print(f"{'size':>8}  {'stage':<18} {_label(baseline):>16} {_label(candidate):>16}  change")
+    for size, stage, base_s, new_s, ratio, regressed in rows:
+        flag = "  ⚠️ regression" if regressed else ""
+        print(f"{size:>8}  {stage:<18} {base_s:>15.4f}s {new_s:>15.4f}s  "
+              f"{(ratio - 1) * 100:+6.1f}%{flag}")
+    regressions = [row for row in rows if row[5]]
+    if regressions:
+        print(f"\n⚠️ {len(regressions)} stage(s) slower than the {args.threshold:.0%} threshold.")
+        return 1
+    print("\n✅ No stage regressed beyond the threshold.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,357 @@
+"""Time each sorting-pipeline stage on synthetic libraries and write JSON.
+
+    python -m benchmarks.run                         # 1k and 10k tracks
+    python -m benchmarks.run --sizes 1000,10000,50000,200000 --memory-budget-mb 2048
+    python -m benchmarks.compare benchmarks/results/<old>.json benchmarks/results/<new>.json
+
+The stages mirror :func:`sorter_core.run` after enrichment (genres come from
+the synthetic library instead of the providers): dedupe, frame, album
+identity, tag encoding, root inference, similarity, one ordering per
+``ordering_mode``, the ordering metrics and the CSV export. Each stage is run
+``--repeat`` times and the fastest wall / CPU time is kept. With
+``--providers N`` the Wikipedia provider is also timed against N recorded
+MediaWiki responses served by :mod:`http_replay` (requests, bytes, CPU): a
+first run (one search per album), a later run (batched ``titles=`` prefetch)
+and, as the baseline, the pre-API provider that downloaded and parsed each
+full article's HTML, with the ratio of the baseline to the first run.
+
+Results carry the commit hash, so runs from different commits can be compared
+with :mod:`benchmarks.compare`.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from urllib.parse import quote_plus
+
+import numpy as np
+import pandas as pd
+import requests
+
+import sorter_core
+from album_identity import album_identity
+from benchmarks.synthetic import (
+    synthetic_library,
+    wikipedia_album_pairs,
+    write_wikipedia_cassettes,
+    write_wikipedia_html_cassettes,
+)
+from genre_normalization import display_root, infer_roots_encoded, load_genre_roots
+from http_replay import CassetteStore, ReplayConfig, replaying
+from similarity import SimilarityWorkspace
+from tag_vocab import TagVocabulary
+from tracks import dedupe_tracks, tracks_frame
+from wikipedia_lookup import USER_AGENT, WikipediaGenreLookup
+
+SCHEMA_VERSION = 1
+DEFAULT_SIZES = (1000, 10000)
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_DIR, "benchmarks", "results")
+
+
+class StageTimer:
+    """Accumulates the best wall / CPU time (and optional peak memory) per stage."""
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    def __call__(self, name, fn, *args, **kwargs):
+        if self.trace_memory:
+            tracemalloc.start()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            peak = tracemalloc.get_traced_memory()[1] if self.trace_memory else None
+            if self.trace_memory:
+                tracemalloc.stop()
+        best = self.stages.setdefault(name, {"wall_s": wall, "cpu_s": cpu})
+        best["wall_s"] = min(best["wall_s"], wall)
+        best["cpu_s"] = min(best["cpu_s"], cpu)
+        if peak is not None:
+            best["peak_bytes"] = min(best.get("peak_bytes", peak), peak)
+        return result
+
+
+def _encode(unique_albums_df, vocab):
+    raw_lists = [g if isinstance(g, list) else [] for g in unique_albums_df["Album Genre"]]
+    codes = vocab.encode_albums(raw_lists)
+    unique_albums_df["Sorted Genres"] = [", ".join(sub) for sub in codes.display_lists()]
+    return codes
+
+
+def _export_csv(df, ordering, path):
+    final_df = (
+        df.join(ordering.set_index("Unique Album"), on="Unique Album")
+        .sort_values(["Sort Order", "Disc Number", "Track Number"])
+    )
+    final_df["Album Genre"] = final_df["Sorted Genres"]
+    final_df.drop(columns=["Sorted Genres"], inplace=True)
+    final_df.to_csv(path, index=False)
+    return final_df
+
+
+def bench_pipeline(library, timer, rules, modes=sorter_core.ORDERING_MODES,
+                   segmentation_strength=0.6, max_clusters=10, root_weight=2.0,
+                   memory_budget_mb=0, workers=1):
+    """One pass over every stage; returns counts and ordering-quality metrics."""
+    tracks = timer("dedupe", dedupe_tracks, library)
+    df = timer("frame", tracks_frame, tracks)
+    identity = timer("album_identity", album_identity, df)
+    df["Unique Album"] = identity.unique_album
+    unique_albums_df = df.drop_duplicates(subset=["Unique Album"]).copy()
+
+    codes = timer("encode", _encode, unique_albums_df, TagVocabulary())
+    roots = timer("root_inference", infer_roots_encoded, codes, rules)
+    unique_albums_df["Root Genre"] = [display_root(r) for r in roots]
+    names = list(unique_albums_df["Unique Album"])
+    tag_sets = codes.id_sets()
+
+    with SimilarityWorkspace(memory_budget_mb or None) as workspace:
+        M, sim_tags, sim_roots = timer(
+            "similarity", sorter_core._similarity_matrices, codes, rules, root_weight,
+            workspace,
+        )
+        orders = {}
+        for mode in modes:
+            if mode == "two_level":
+                orders[mode] = timer(
+                    "order_two_level", sorter_core._two_level_order, names, M, sim_tags,
+                    tag_sets, roots, segmentation_strength, max_clusters, workspace, workers,
+                )
+            else:
+                sim = sim_roots if mode == "roots" else sim_tags
+                orders[mode] = timer(
+                    f"order_{mode}", sorter_core._order_from_similarity, names, sim,
+                    segmentation_strength, max_clusters, workspace,
+                )
+        del M, sim_tags, sim_roots
+
+    tag_sets_by_name = dict(zip(names, tag_sets))
+    root_by_name = dict(zip(names, roots))
+    quality = timer("metrics", lambda: {
+        mode: sorter_core._ordering_metric(order, tag_sets_by_name, root_by_name)
+        for mode, order in orders.items()
+    })
+
+    chosen = orders.get("two_level") or next(iter(orders.values()))
+    ordering = sorter_core._ordering_frame(unique_albums_df, chosen)
+    with tempfile.TemporaryDirectory() as tmp:
+        timer("csv_export", _export_csv, df, ordering, os.path.join(tmp, "sorted.csv"))
+
+    return {
+        "tracks": len(tracks),
+        "albums": len(names),
+        "tags": int(codes.one_hot().shape[1]),
+        "quality": quality,
+    }
+
+
+def _html_album_genres(album_name, artist_name):
+    """The pre-API Wikipedia provider: ``(genres, response bytes)``."""
+    from bs4 import BeautifulSoup
+
+    slug = quote_plus(f"{album_name} {artist_name}")
+    resp = requests.get(f"https://en.wikipedia.org/wiki/{slug}", timeout=4,
+                        headers={"User-Agent": USER_AGENT})
+    if resp.status_code >= 400:
+        return [], len(resp.content or b"")
+    soup = BeautifulSoup(resp.text, "html.parser")
+    info = soup.find("table", class_="infobox")
+    if info:
+        th = info.find("th", string="Genre")
+        if th:
+            td = th.find_next_sibling("td")
+            return [a.get_text(strip=True) for a in td.find_all("a")], len(resp.content)
+    return [], len(resp.content)
+
+
+def _timed_lookups(lookup, pairs):
+    found = 0
+    wall, cpu = time.perf_counter(), time.process_time()
+    for album, artist, _ in pairs:
+        found += bool(lookup(album, artist))
+    return found, time.perf_counter() - wall, time.process_time() - cpu
+
+
+def bench_providers(library, n_albums, latency_ms=0.0):
+    """Wikipedia lookups for ``n_albums`` albums replayed from synthetic cassettes."""
+    pairs = wikipedia_album_pairs(library, limit=n_albums)
+    with tempfile.TemporaryDirectory() as tmp:
+        write_wikipedia_cassettes(CassetteStore(tmp), pairs)
+        lookup = WikipediaGenreLookup()
+        with replaying(tmp, ReplayConfig(latency_ms=latency_ms)) as server:
+            found, wall, cpu = _timed_lookups(lookup.album_genres, pairs)
+        result = {
+            "albums": len(pairs),
+            "found": found,
+            "requests": lookup.requests,
+            "bytes": lookup.bytes,
+            "replay": dict(server.stats),
+            "wall_s": wall,
+            "cpu_s": cpu,
+        }
+
+        # A later run: the titles are known and prefetched in batches.
+        later = WikipediaGenreLookup()
+        later.titles = dict(lookup.titles)
+        with replaying(tmp, ReplayConfig(latency_ms=latency_ms)) as server:
+            wall, cpu = time.perf_counter(), time.process_time()
+            later.prefetch((album, artist) for album, artist, _ in pairs)
+            found, _, _ = _timed_lookups(later.album_genres, pairs)
+        result["prefetched"] = {
+            "found": found,
+            "requests": later.requests,
+            "bytes": later.bytes,
+            "replay": dict(server.stats),
+            "wall_s": time.perf_counter() - wall,
+            "cpu_s": time.process_time() - cpu,
+        }
+
+    try:
+        import bs4  # noqa: F401 -- only the baseline needs it
+    except ImportError:
+        return result
+    with tempfile.TemporaryDirectory() as tmp:
+        write_wikipedia_html_cassettes(CassetteStore(tmp), pairs)
+        fetched = []
+
+        def html_lookup(album, artist):
+            genres, size = _html_album_genres(album, artist)
+            fetched.append(size)
+            return genres
+
+        with replaying(tmp, ReplayConfig(latency_ms=latency_ms)) as server:
+            found, wall, cpu = _timed_lookups(html_lookup, pairs)
+    result["html_baseline"] = {
+        "found": found,
+        "requests": len(fetched),
+        "bytes": sum(fetched),
+        "replay": dict(server.stats),
+        "wall_s": wall,
+        "cpu_s": cpu,
+    }
+    result["baseline_ratio"] = {
+        "bytes": sum(fetched) / max(result["bytes"], 1),
+        "cpu": cpu / max(result["cpu_s"], 1e-9),
+    }
+    return result
+
+
+def git_revision():
+    """``(commit, dirty)`` of the working tree, ``(None, None)`` outside git."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True,
+            check=True,
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, repeat=3, seed=0, modes=sorter_core.ORDERING_MODES,
+                   memory_budget_mb=0, workers=1, trace_memory=False, providers=0,
+                   provider_latency_ms=0.0, log=print):
+    """Run every size and return the JSON-ready report."""
+    rules = load_genre_roots()
+    commit, dirty = git_revision()
+    report = {
+        "schema": SCHEMA_VERSION,
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "settings": {
+            "repeat": repeat, "seed": seed, "modes": list(modes),
+            "memory_budget_mb": memory_budget_mb, "workers": workers,
+        },
+        "results": {},
+    }
+    for size in sizes:
+        start = time.perf_counter()
+        library = synthetic_library(size, seed=seed, rules=rules)
+        generate_s = time.perf_counter() - start
+        timer = StageTimer(trace_memory)
+        for _ in range(max(1, repeat)):
+            info = bench_pipeline(library, timer, rules, modes=modes,
+                                  memory_budget_mb=memory_budget_mb, workers=workers)
+        result = {**info, "generate_s": generate_s, "stages": timer.stages}
+        if providers:
+            result["providers"] = {"wikipedia": bench_providers(
+                library, providers, provider_latency_ms
+            )}
+        ratio = result.get("providers", {}).get("wikipedia", {}).get("baseline_ratio")
+        if ratio:
+            log(f"📚 Wikipedia vs. the full-article HTML baseline: {ratio['bytes']:.1f}x fewer "
+                f"bytes, {ratio['cpu']:.1f}x less CPU")
+        total = sum(stage["wall_s"] for stage in timer.stages.values())
+        stages = ", ".join(f"{k} {v['wall_s']:.3f}" for k, v in timer.stages.items())
+        log(f"⏱️  {size} tracks / {info['albums']} albums: {total:.2f}s ({stages})")
+        report["results"][str(size)] = result
+    return report
+
+
+def default_output_path(report):
+    label = (report.get("commit") or "nogit")[:10] + ("-dirty" if report.get("dirty") else "")
+    return os.path.join(RESULTS_DIR, f"bench-{label}.json")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the sorting pipeline stages.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="Comma-separated library sizes in tracks (e.g. 1000,10000,50000,200000).")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per size; the fastest is kept.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--modes", default=",".join(sorter_core.ORDERING_MODES),
+                        help="Ordering modes to time.")
+    parser.add_argument("--memory-budget-mb", type=float, default=0,
+                        help="Same as [CLUSTERING] memory_budget_mb (needed for large sizes).")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Same as [CLUSTERING] workers.")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Record tracemalloc peak bytes per stage (slower).")
+    parser.add_argument("--providers", type=int, default=0, metavar="N",
+                        help="Also time N Wikipedia lookups against replayed responses.")
+    parser.add_argument("--provider-latency-ms", type=float, default=0.0)
+    parser.add_argument("--output", help="JSON output path (default: benchmarks/results/).")
+    args = parser.parse_args(argv)
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = set(modes) - set(sorter_core.ORDERING_MODES)
+    if unknown:
+        parser.error(f"unknown ordering mode(s): {', '.join(sorted(unknown))}")
+    report = run_benchmarks(
+        sizes=[int(s) for s in args.sizes.split(",") if s.strip()],
+        repeat=args.repeat, seed=args.seed, modes=modes,
+        memory_budget_mb=args.memory_budget_mb, workers=args.workers,
+        trace_memory=args.trace_memory, providers=args.providers,
+        provider_latency_ms=args.provider_latency_ms,
+    )
+    output = args.output or default_output_path(report)
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"📁 Benchmark results saved to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""Deterministic synthetic libraries for benchmarking.
+
+A liked-songs library is not a uniform sample: a few artists account for many
+albums, most albums contribute a handful of tracks, the same record shows up
+under several editions, some tracks are liked twice and some albums have no
+genres at all. :func:`synthetic_library` reproduces those shapes from a seed,
+with tag sets drawn from the ``genre_roots.json`` families (keyword + optional
+modifier, plus the occasional cross-family tag), so every pipeline stage sees
+realistic cardinalities without touching a streaming service.
+"""
+
+import html
+import itertools
+import json
+import random
+from urllib.parse import quote_plus
+
+import requests
+
+from genre_normalization import load_genre_roots
+from tracks import SpotifyTrack
+from wikipedia_lookup import QUERY_PARAMS, SEARCH_CANDIDATES, TITLE_BATCH, WIKI_API
+
+TRACKS_PER_ALBUM = ((1, 1), (4, 6), (8, 16))   # single / EP / album
+ALBUM_SHAPE_WEIGHTS = (0.15, 0.15, 0.70)
+EDITION_SUFFIXES = (" (Deluxe Edition)", " (Remastered)", " - 2011 Remaster", " [Expanded]")
+MODIFIERS = ("", "", "", "indie", "alternative", "progressive", "experimental", "modern",
+             "classic", "neo", "dark", "melodic", "atmospheric", "lo-fi")
+WORDS = ("blue", "night", "river", "glass", "echo", "summer", "iron", "paper", "golden",
+         "silent", "electric", "wild", "hollow", "north", "velvet", "static", "broken")
+
+
+def _name(rng, words=2):
+    return " ".join(rng.choice(WORDS).title() for _ in range(words))
+
+
+def _album_tags(rng, families, primary, secondary):
+    count = rng.choice((1, 2, 2, 3, 3, 4, 5, 6))
+    tags = []
+    for _ in range(count):
+        family = secondary if secondary is not None and rng.random() < 0.25 else primary
+        tag = f"{rng.choice(MODIFIERS)} {rng.choice(families[family])}".strip()
+        if tag not in tags:
+            tags.append(tag)
+    return tags
+
+
+def synthetic_library(n_tracks, seed=0, rules=None, duplicate_rate=0.02, untagged_rate=0.05,
+                      edition_rate=0.03):
+    """Return ``n_tracks`` :class:`~tracks.SpotifyTrack` records with genres set.
+
+    Albums carry their synthetic tag list in ``genres`` (``source`` is
+    ``"synthetic"``). About ``duplicate_rate`` of the tracks repeat an earlier
+    track id (exercising dedupe) and ``edition_rate`` of the albums re-release
+    an earlier album under an edition suffix (exercising album identity).
+    """
+    rng = random.Random(seed)
+    rules = rules if rules is not None else load_genre_roots()
+    families = [rule["keywords"] for rule in rules if rule["keywords"]] or [["pop"]]
+    family_weights = [1.0 / (i + 1) ** 0.7 for i in range(len(families))]
+
+    n_unique = n_tracks - int(n_tracks * duplicate_rate)
+    n_artists = max(1, n_unique // 30)
+    artists = []
+    for i in range(n_artists):
+        primary = rng.choices(range(len(families)), family_weights)[0]
+        secondary = rng.randrange(len(families)) if rng.random() < 0.3 else None
+        artists.append((f"{_name(rng)} {i}", primary, secondary))
+    artist_cum = list(itertools.accumulate(1.0 / (rank + 1) ** 0.8 for rank in range(n_artists)))
+
+    tracks, released = [], []
+    album_no = 0
+    while len(tracks) < n_unique:
+        artist, primary, secondary = rng.choices(artists, cum_weights=artist_cum)[0]
+        if released and rng.random() < edition_rate:
+            # Re-release of an earlier record: same tags, new id, edition suffix.
+            base, artist, tags = rng.choice(released)
+            title = base + rng.choice(EDITION_SUFFIXES)
+        else:
+            base = f"{_name(rng, rng.choice((1, 2, 3)))} {album_no}"
+            tags = ([] if rng.random() < untagged_rate
+                    else _album_tags(rng, families, primary, secondary))
+            released.append((base, artist, tags))
+            title = base
+        album_id = f"al{album_no:07d}"
+        album_no += 1
+        low, high = rng.choices(TRACKS_PER_ALBUM, ALBUM_SHAPE_WEIGHTS)[0]
+        for number in range(1, min(rng.randint(low, high), n_unique - len(tracks)) + 1):
+            track_id = f"tr{len(tracks):08d}"
+            track = SpotifyTrack(
+                f"{_name(rng)} {number}", artist, title, album_id, number, 1, track_id,
+                uri=f"spotify:track:{track_id}",
+            )
+            track.genres = tags
+            track.source = "synthetic"
+            tracks.append(track)
+
+    duplicates = [rng.choice(tracks) for _ in range(n_tracks - len(tracks))]
+    tracks.extend(duplicates)
+    rng.shuffle(tracks)  # liked order interleaves albums
+    return tracks
+
+
+def wikipedia_album_pairs(tracks, limit=None):
+    """Distinct ``(album, artist, genres)`` of a synthetic library, in first-seen order."""
+    seen = {}
+    for track in tracks:
+        key = (track.album, track.artist)
+        if key not in seen:
+            seen[key] = track.genres or []
+            if limit is not None and len(seen) >= limit:
+                break
+    return [(album, artist, genres) for (album, artist), genres in seen.items()]
+
+
+def _wikitext(album, artist, genres, filler_lines):
+    genre_lines = "\n".join(f"* [[{g.title()}]]" for g in genres) or "* "
+    filler = "\n".join(f"| field{i:02d} = value {i}" for i in range(filler_lines))
+    prose = ("'''" + album + "''' is a studio album by " + artist + ". ") * 12
+    return (
+        "{{Short description|album}}\n{{Infobox album\n"
+        f"| name = {album}\n| type = studio\n| artist = [[{artist}]]\n{filler}\n"
+        f"| genre = {{{{flatlist|\n{genre_lines}\n}}}}\n"
+        "| length = 42:00\n| label = Synthetic\n}}\n" + prose
+    )
+
+
+def _page(album, wikitext, index=1):
+    return {"index": index, "title": album,
+            "revisions": [{"slots": {"main": {"content": wikitext}}}]}
+
+
+def write_wikipedia_cassettes(store, pairs):
+    """Record the MediaWiki responses for ``pairs`` into an http_replay store.
+
+    Each search response mirrors what :class:`~wikipedia_lookup.WikipediaGenreLookup`
+    receives on a first run: the top candidates' section-0 wikitext, the real
+    article first. The batched ``titles=`` queries a later run's prefetch
+    sends for the same albums are recorded too.
+    """
+    for album, artist, genres in pairs:
+        params = dict(
+            QUERY_PARAMS, generator="search", gsrsearch=f"{album} {artist} album",
+            gsrlimit=str(SEARCH_CANDIDATES),
+        )
+        url = requests.Request("GET", WIKI_API, params=params).prepare().url
+        pages = [_page(album, _wikitext(album, artist, genres, 30))]
+        for extra in range(2, SEARCH_CANDIDATES + 1):
+            pages.append(_page(f"{artist} discography {extra}",
+                               "{{Infobox artist discography\n| artist = x\n}}\n"
+                               + "text " * 300, extra))
+        body = json.dumps({"query": {"pages": pages}}).encode("utf-8")
+        store.put("GET", url, None, 200, {"Content-Type": "application/json"}, body)
+    for start in range(0, len(pairs), TITLE_BATCH):
+        batch = pairs[start:start + TITLE_BATCH]
+        params = dict(QUERY_PARAMS, titles="|".join(album for album, _, _ in batch))
+        url = requests.Request("GET", WIKI_API, params=params).prepare().url
+        pages = [_page(album, _wikitext(album, artist, genres, 30), i)
+                 for i, (album, artist, genres) in enumerate(batch)]
+        body = json.dumps({"query": {"pages": pages}}).encode("utf-8")
+        store.put("GET", url, None, 200, {"Content-Type": "application/json"}, body)
+    store.save()
+
+
+def _article_html(album, artist, genres, rng):
+    """A rendered album article shaped like Wikipedia's, about 150 KB.
+
+    Page chrome, infobox, prose, track listing, references and navboxes, the
+    parts a typical album article's HTML is made of.
+    """
+    def words(n):
+        return " ".join(rng.choice(WORDS) for _ in range(n))
+
+    head = "".join(
+        f'<link rel="stylesheet" href="/w/load.php?modules=skin.{i}&amp;only=styles">'
+        f'<meta name="x-{i}" content="{words(6)}">' for i in range(40)
+    )
+    head += "<script>" + ";".join(f"mw.config.set('w{i}','{words(4)}')"
+                                  for i in range(400)) + "</script>"
+    sidebar = "".join(f'<li id="n-{i}"><a href="/wiki/Special:{i}">{words(2)}</a></li>'
+                      for i in range(300))
+    genre_links = "".join(f'<li><a href="/wiki/{quote_plus(g)}" title="{html.escape(g)}">'
+                          f"{html.escape(g.title())}</a></li>" for g in genres)
+    infobox = (
+        '<table class="infobox vevent haudio"><tbody>'
+        '<tr><th colspan="2" class="infobox-above summary album">'
+        f"{html.escape(album)}</th></tr>"
+        f'<tr><td colspan="2" class="infobox-image"><img src="/cover/{rng.randrange(10**9)}.jpg" '
+        'width="220" height="220"></td></tr>'
+        '<tr><td colspan="2">Studio album by '
+        f'<a href="/wiki/x">{html.escape(artist)}</a></td></tr>'
+        + "".join(f'<tr><th scope="row" class="infobox-label">Field {i}</th>'
+                  f'<td class="infobox-data">{words(5)}</td></tr>' for i in range(12))
+        + '<tr><th scope="row" class="infobox-label">Genre</th>'
+        f'<td class="infobox-data category"><div class="hlist"><ul>{genre_links}</ul></div>'
+        "</td></tr>"
+        "</tbody></table>"
+    )
+    prose = "".join(f"<p>{words(120)}<sup class=\"reference\"><a href=\"#cite_note-{i}\">"
+                    f"[{i}]</a></sup></p>" for i in range(50))
+    tracks = '<table class="tracklist">' + "".join(
+        f"<tr><td>{i}.</td><td>\"{words(3)}\"</td><td>{words(2)}</td><td>4:{i:02d}</td></tr>"
+        for i in range(1, 15)) + "</table>"
+    refs = '<ol class="references">' + "".join(
+        f'<li id="cite_note-{i}"><cite class="citation web"><a class="external text" '
+        f'href="https://example.org/{i}">{words(10)}</a>. <i>{words(2)}</i>. Retrieved '
+        f"{words(2)}.</cite></li>" for i in range(200)) + "</ol>"
+    navboxes = "".join(
+        f'<div class="navbox"><table class="nowraplinks">'
+        + "".join(f'<tr><th>{words(2)}</th><td><a href="/wiki/{j}">{words(20)}</a></td></tr>'
+                  for j in range(40))
+        + "</table></div>" for _ in range(3))
+    return (f"<!DOCTYPE html><html><head><title>{html.escape(album)} - Wikipedia</title>{head}"
+            f'</head><body><div id="mw-panel"><ul>{sidebar}</ul></div>'
+            f'<div id="content"><h1>{html.escape(album)}</h1>{infobox}{prose}{tracks}{refs}'
+            f"{navboxes}</div></body></html>")
+
+
+def write_wikipedia_html_cassettes(store, pairs, seed=0):
+    """Record the full rendered article the pre-API provider downloaded per album.
+
+    The old provider requested ``/wiki/<album artist>`` and parsed the page
+    with BeautifulSoup. Every slug is recorded as a hit, the old path's best case.
+    """
+    rng = random.Random(seed)
+    for album, artist, genres in pairs:
+        url = "https://en.wikipedia.org/wiki/" + quote_plus(f"{album} {artist}")
+        body = _article_html(album, artist, genres, rng).encode("utf-8")
+        store.put("GET", url, None, 200, {"Content-Type": "text/html; charset=UTF-8"}, body)
+    store.save()
@@ -0,0 +1,499 @@
+#!/usr/bin/env python3
+"""Maintenance commands for the persistent genre cache.
+
+``GenreCache`` only drops an expired record when it happens to read it, so the
+JSON file grows forever, and Redis keys can't be inspected by source or age.
+This tool works on the stores directly, one record at a time, so million-entry
+caches never have to fit in memory:
+
+* ``stats`` — entries, size, lifetime hit ratio, negative / stale / expired
+  shares, source and age distribution;
+* ``sweep`` — drop hard-expired records (the file store is rewritten, which
+  also compacts it);
+* ``compact`` — ``sweep`` plus malformed records, optionally negatives too;
+* ``export`` / ``import`` — a portable JSON Lines snapshot (gzip if the
+  path ends in ``.gz``);
+* ``migrate`` — copy every live record into another store.
+
+Stores are given as ``file:PATH``, ``sqlite:PATH`` or a ``redis://`` URL; the
+default is the ``[CACHE]`` store of ``settings.ini``. Writes into a JSON file
+store replace it, so ``import`` and ``migrate`` refuse a non-empty target file
+without ``--force``; Redis and sqlite targets are merged into. Don't run
+``sweep`` / ``compact`` on a file store while a sorter run is using it.
+
+Usage:
+    python cache_admin.py stats
+    python cache_admin.py migrate --to redis://localhost:6379/0
+    python cache_admin.py export genre_cache.jsonl.gz
+"""
+
+import argparse
+import configparser
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from itertools import chain
+
+from genre_cache import (
+    DEFAULT_REDIS_URL,
+    STATS_KEY,
+    _default_file_path,
+    expires_at,
+    iter_sqlite,
+    open_sqlite,
+)
+
+KEY_PREFIX = "genre:"
+AGE_BUCKETS = ((86400, "< 1 day"), (7 * 86400, "< 1 week"), (30 * 86400, "< 30 days"),
+               (90 * 86400, "< 90 days"), (None, "older"))
+
+
+def iter_json_object(fh, chunk_size=1 << 16):
+    """Yield ``(key, value)`` from a top-level JSON object without loading it whole."""
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = fh.read(chunk_size)
+        eof = not chunk
+        buf, pos = buf[pos:] + chunk, 0
+
+    def peek():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf) or eof:
+                return buf[pos:pos + 1]
+            fill()
+
+    def decode():
+        nonlocal pos
+        while True:
+            try:
+                value, pos = decoder.raw_decode(buf, pos)
+                return value
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+
+    def expect(char):
+        nonlocal pos
+        if peek() != char:
+            raise ValueError(f"expected {char!r} at offset {pos} of the JSON object")
+        pos += 1
+
+    expect("{")
+    if peek() == "}":
+        return
+    while True:
+        peek()
+        key = decode()
+        expect(":")
+        peek()
+        value = decode()
+        yield key, value
+        if peek() == "}":
+            return
+        expect(",")
+
+
+def is_valid(record):
+    return (isinstance(record, dict) and isinstance(record.get("genre", []), list)
+            and "source" in record)
+
+
+class FileStore:
+    """The JSON file written by ``GenreCache(backend="file")``."""
+
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+        self.name = f"file:{self.path}"
+
+    def items(self):
+        """``(key, record)`` for every record, including the counters entry."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as fh:
+            yield from iter_json_object(fh)
+
+    def records(self):
+        return ((k, r) for k, r in self.items() if k.startswith(KEY_PREFIX))
+
+    def counters(self):
+        return next((r for k, r in self.items() if k == STATS_KEY), {})
+
+    def size_bytes(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def is_empty(self):
+        return next(self.records(), None) is None
+
+    def replace(self, items):
+        """Stream ``items`` into a new file that atomically replaces this one."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        written = 0
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                fh.write("{")
+                for key, record in items:
+                    fh.write(("," if written else "") + json.dumps(key) + ":" + json.dumps(record))
+                    written += 1
+                fh.write("}")
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return written
+
+    def filter(self, keep):
+        """Rewrite the file with only the records ``keep(record)`` accepts."""
+        if not os.path.exists(self.path):
+            return {"kept": 0, "dropped": 0, "bytes_before": 0, "bytes_after": 0}
+        dropped = 0
+
+        def kept():
+            nonlocal dropped
+            for key, record in self.items():
+                if key == STATS_KEY or (key.startswith(KEY_PREFIX) and keep(record)):
+                    yield key, record
+                else:
+                    dropped += 1
+
+        before = self.size_bytes()
+        kept_count = self.replace(kept())
+        return {"kept": kept_count, "dropped": dropped,
+                "bytes_before": before, "bytes_after": self.size_bytes()}
+
+    def write(self, records, force=False):
+        if not force and not self.is_empty():
+            raise SystemExit(f"{self.name} already has entries; use --force to replace it.")
+        counters = self.counters()
+        items = chain([(STATS_KEY, counters)], records) if counters else records
+        return self.replace(items) - (1 if counters else 0)
+
+
+class RedisStore:
+    """A Redis database written by ``GenreCache(backend="redis")``."""
+
+    BATCH = 1000
+
+    def __init__(self, url):
+        import redis
+        self.name = url
+        self.client = redis.from_url(url, socket_connect_timeout=2, socket_timeout=10)
+        self.client.ping()
+
+    def _keys(self):
+        for raw in self.client.scan_iter(match=KEY_PREFIX + "*", count=self.BATCH):
+            yield raw.decode() if isinstance(raw, bytes) else raw
+
+    def records(self):
+        batch = []
+        for key in self._keys():
+            batch.append(key)
+            if len(batch) >= self.BATCH:
+                yield from self._fetch(batch)
+                batch = []
+        yield from self._fetch(batch)
+
+    def _fetch(self, keys):
+        if not keys:
+            return
+        for key, raw in zip(keys, self.client.mget(keys)):
+            if raw is None:
+                continue
+            try:
+                yield key, json.loads(raw)
+            except ValueError:
+                yield key, raw
+
+    def counters(self):
+        raw = self.client.hgetall(STATS_KEY) or {}
+        return {(k.decode() if isinstance(k, bytes) else k): int(v) for k, v in raw.items()}
+
+    def size_bytes(self):
+        return None  # Redis stores its own encoding; the stats sum record sizes instead
+
+    def is_empty(self):
+        return next(self._keys(), None) is None
+
+    def filter(self, keep):
+        dropped, kept, batch = 0, 0, []
+        for key, record in self.records():
+            if keep(record):
+                kept += 1
+                continue
+            dropped += 1
+            batch.append(key)
+            if len(batch) >= self.BATCH:
+                self.client.delete(*batch)
+                batch = []
+        if batch:
+            self.client.delete(*batch)
+        return {"kept": kept, "dropped": dropped}
+
+    def write(self, records, force=False, now=None):
+        now = time.time() if now is None else now
+        written = 0
+        pipe = self.client.pipeline(transaction=False)
+        for key, record in records:
+            expiry = expires_at(record)
+            if expiry is not None and expiry <= now:
+                continue
+            ex = max(1, int(expiry - now)) if expiry is not None else None
+            pipe.set(key, json.dumps(record), ex=ex)
+            written += 1
+            if written % self.BATCH == 0:
+                pipe.execute()
+        pipe.execute()
+        return written
+
+
+class SqliteStore:
+    """A sqlite database written by ``GenreCache(backend="sqlite")``."""
+
+    BATCH = 1000
+
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+        self.name = f"sqlite:{self.path}"
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = open_sqlite(self.path)
+
+    def records(self):
+        for key, raw in iter_sqlite(self.conn, batch=self.BATCH):
+            try:
+                yield key, json.loads(raw)
+            except ValueError:
+                yield key, raw
+
+    def counters(self):
+        row = self.conn.execute("SELECT record FROM genre_cache WHERE key = ?",
+                                (STATS_KEY,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def size_bytes(self):
+        return os.path.getsize(self.path)
+
+    def is_empty(self):
+        return next(iter_sqlite(self.conn, batch=1), None) is None
+
+    def filter(self, keep):
+        """Delete the records ``keep(record)`` rejects, then VACUUM the file."""
+        before, kept, dropped, batch = self.size_bytes(), 0, 0, []
+        for key, record in self.records():
+            if keep(record):
+                kept += 1
+                continue
+            dropped += 1
+            batch.append((key,))
+            if len(batch) >= self.BATCH:
+                self.conn.executemany("DELETE FROM genre_cache WHERE key = ?", batch)
+                batch = []
+        self.conn.executemany("DELETE FROM genre_cache WHERE key = ?", batch)
+        self.conn.commit()
+        self.conn.execute("VACUUM")
+        return {"kept": kept, "dropped": dropped,
+                "bytes_before": before, "bytes_after": self.size_bytes()}
+
+    def write(self, records, force=False):
+        written, batch = 0, []
+        for key, record in records:
+            batch.append((key, json.dumps(record), expires_at(record)))
+            if len(batch) >= self.BATCH:
+                written += self._upsert(batch)
+                batch = []
+        return written + self._upsert(batch)
+
+    def _upsert(self, rows):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO genre_cache (key, record, expires) VALUES (?, ?, ?)", rows
+        )
+        self.conn.commit()
+        return len(rows)
+
+
+STORES = {"file": FileStore, "redis": RedisStore, "sqlite": SqliteStore}
+
+
+def open_store(spec=None, config=None):
+    """Open ``file:PATH`` / ``redis://…``, or the ``[CACHE]`` store when ``spec`` is None."""
+    if spec is None:
+        backend = config.get("CACHE", "backend", fallback="redis").strip().lower()
+        if backend == "redis":
+            return RedisStore(config.get("CACHE", "redis_url", fallback=DEFAULT_REDIS_URL))
+        if backend == "sqlite":
+            return SqliteStore(config.get("CACHE", "file_path", fallback=None)
+                               or _default_file_path("genre_cache.sqlite3"))
+        path = config.get("CACHE", "file_path", fallback=None) or _default_file_path()
+        return FileStore(path)
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStore(spec)
+    scheme, _, rest = spec.partition(":")
+    if scheme in STORES and rest:
+        return STORES[scheme](rest)
+    raise SystemExit(f"Unknown cache store '{spec}' "
+                     "(expected file:PATH, sqlite:PATH or a redis:// URL).")
+
+
+def cache_stats(store, now=None):
+    """One streaming pass over ``store`` -> summary dict."""
+    now = time.time() if now is None else now
+    entries = negatives = stale = expired = record_bytes = 0
+    sources, ages = Counter(), Counter()
+    for key, record in store.records():
+        entries += 1
+        record_bytes += len(key) + len(json.dumps(record))
+        if not isinstance(record, dict):
+            sources["(malformed)"] += 1
+            continue
+        if not record.get("genre"):
+            negatives += 1
+        sources[record.get("source") or "None"] += 1
+        expiry = expires_at(record)
+        if expiry is not None and expiry <= now:
+            expired += 1
+        elif record.get("ttl") and now - record.get("ts", now) > record["ttl"]:
+            stale += 1
+        age = now - record.get("ts", now)
+        ages[next(label for limit, label in AGE_BUCKETS if limit is None or age < limit)] += 1
+    counters = store.counters()
+    lookups = counters.get("hits", 0) + counters.get("misses", 0)
+    return {
+        "store": store.name,
+        "entries": entries,
+        "bytes": store.size_bytes() or record_bytes,
+        "hit_ratio": counters.get("hits", 0) / lookups if lookups else None,
+        "lookups": lookups,
+        "negative": negatives,
+        "stale": stale,
+        "expired": expired,
+        "sources": dict(sources.most_common()),
+        "ages": {label: ages[label] for _, label in AGE_BUCKETS if ages[label]},
+    }
+
+
+def print_stats(stats):
+    entries = stats["entries"] or 1
+    print(f"🗃️  {stats['store']}")
+    print(f"   Entries: {stats['entries']}  ({stats['bytes'] / 1024:.0f} KB)")
+    if stats["hit_ratio"] is not None:
+        print(f"   Hit ratio: {stats['hit_ratio']:.1%} of {stats['lookups']} lookups")
+    print(f"   Negative: {stats['negative'] / entries:.1%}   Stale: {stats['stale'] / entries:.1%}"
+          f"   Expired: {stats['expired'] / entries:.1%}")
+    print("   Sources: " + ", ".join(f"{s} {n}" for s, n in stats["sources"].items()))
+    print("   Age: " + ", ".join(f"{label} {n}" for label, n in stats["ages"].items()))
+
+
+def _open_snapshot(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def export_snapshot(store, path, now=None):
+    """Write every live record as JSON Lines ``{"key": …, "record": …}``."""
+    now = time.time() if now is None else now
+    written = 0
+    with _open_snapshot(path, "w") as fh:
+        for key, record in store.records():
+            expiry = expires_at(record) if isinstance(record, dict) else None
+            if expiry is not None and expiry <= now:
+                continue
+            fh.write(json.dumps({"key": key, "record": record}) + "\n")
+            written += 1
+    return written
+
+
+def read_snapshot(path):
+    with _open_snapshot(path, "r") as fh:
+        for line in fh:
+            if line.strip():
+                entry = json.loads(line)
+                yield entry["key"], entry["record"]
+
+
+def live_records(records, now=None):
+    """``records`` without hard-expired or malformed entries."""
+    now = time.time() if now is None else now
+    for key, record in records:
+        if not is_valid(record):
+            continue
+        expiry = expires_at(record)
+        if expiry is None or expiry > now:
+            yield key, record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and maintain the genre cache.")
+    parser.add_argument("--config", default="settings.ini", help="Path to settings.ini")
+    parser.add_argument("--store", help="Cache store to act on: file:PATH, sqlite:PATH or a "
+                                        "redis:// URL (default: the [CACHE] store).")
+    commands = parser.add_subparsers(dest="command", required=True)
+    stats_cmd = commands.add_parser("stats", help="Entry count, size, hit ratio, sources, ages.")
+    stats_cmd.add_argument("--json", action="store_true", help="Print the stats as JSON.")
+    commands.add_parser("sweep", help="Drop hard-expired records (compacts the file store).")
+    compact_cmd = commands.add_parser("compact", help="Sweep, drop malformed records, rewrite.")
+    compact_cmd.add_argument("--drop-negative", action="store_true",
+                             help="Also drop cached 'not found' results.")
+    export_cmd = commands.add_parser("export", help="Write a JSON Lines snapshot.")
+    export_cmd.add_argument("path")
+    import_cmd = commands.add_parser("import", help="Load a JSON Lines snapshot.")
+    import_cmd.add_argument("path")
+    import_cmd.add_argument("--force", action="store_true", help="Replace a non-empty file store.")
+    migrate_cmd = commands.add_parser("migrate", help="Copy every live record into another store.")
+    migrate_cmd.add_argument("--to", required=True,
+                             help="Target store: file:PATH, sqlite:PATH or a redis:// URL.")
+    migrate_cmd.add_argument("--force", action="store_true", help="Replace a non-empty file store.")
+    args = parser.parse_args(argv)
+
+    config = configparser.ConfigParser()
+    config.read(args.config)
+    store = open_store(args.store, config)
+    now = time.time()
+
+    if args.command == "stats":
+        stats = cache_stats(store, now)
+        if args.json:
+            print(json.dumps(stats, indent=2))
+        else:
+            print_stats(stats)
+    elif args.command in ("sweep", "compact"):
+        drop_negative = args.command == "compact" and args.drop_negative
+
+        def keep(record):
+            if args.command == "compact" and not is_valid(record):
+                return False
+            if drop_negative and not record.get("genre"):
+                return False
+            expiry = expires_at(record) if isinstance(record, dict) else None
+            return expiry is None or expiry > now
+
+        result = store.filter(keep)
+        print(f"🧹 {store.name}: kept {result['kept']}, dropped {result['dropped']}.")
+        if "bytes_before" in result:
+            print(f"   {result['bytes_before'] / 1024:.0f} KB -> {result['bytes_after'] / 1024:.0f} KB")
+    elif args.command == "export":
+        written = export_snapshot(store, args.path, now)
+        print(f"📦 Exported {written} entries from {store.name} to {args.path}.")
+    elif args.command == "import":
+        written = store.write(live_records(read_snapshot(args.path), now), force=args.force)
+        print(f"📥 Imported {written} entries from {args.path} into {store.name}.")
+    else:
+        target = open_store(args.to, config)
+        written = target.write(live_records(store.records(), now), force=args.force)
+        print(f"🚚 Migrated {written} entries from {store.name} to {target.name}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""Shared genre cache for many users of the sorter.
+
+Most popular albums overlap between users, yet each user's :class:`GenreCache`
+resolves them again. ``cache_server.py`` is a small HTTP cache that several
+sorter installations point at (``[CACHE] shared_url``); :class:`SharedCacheClient`
+is the sorter's side of it. Each user keeps their local cache, and the shared
+one sits behind it:
+
+* reads go through: an album missing locally is asked for in the shared cache
+  (in batches, before enrichment) and, when found, copied into the local cache;
+* every result a user resolves is written back (in batches), so one user's
+  enrichment warms everyone else's.
+
+Keys are content-addressed: the SHA-256 of the :func:`genre_cache.make_key`
+key (with its resolution suffix), so the server never sees album names or ids
+in its key space. Records carry only the genres, their source and timestamps,
+never the song or track they were resolved from. Found genres are shared by
+everyone, the most recently resolved record winning. "Not found" results stay
+in the namespace of the user who recorded them (``--share-negative`` shares
+them too): one user's provider outage or missing API key should not hide an
+album from the others.
+
+The server keeps its records in sqlite (the ``genre_cache`` schema the local
+sqlite cache uses) and is meant for a trusted network; it has no
+authentication. Endpoints (JSON bodies, at most ``MAX_BATCH`` keys each):
+
+* ``POST /v1/get``  ``{"user", "keys"}`` -> ``{"records": {key: record}}``
+* ``POST /v1/set``  ``{"user", "records": {key: record}}`` -> ``{"stored": n}``
+* ``GET /v1/stats`` entry count and per-user gets / hits / sets
+* ``GET /healthz``
+
+Usage:
+    python cache_server.py --port 8765 --db ~/genre_cache_server.sqlite3
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from genre_cache import _default_file_path, expires_at, open_sqlite
+
+DEFAULT_PORT = 8765
+DEFAULT_TIMEOUT_S = 2.0
+MAX_BATCH = 1000
+SHARED_PREFIX = "genre:sha256:"
+_SHARED_KEY = re.compile(r"^genre:sha256:[0-9a-f]{64}$")
+_USER = re.compile(r"^[\w.@+-]{1,64}$")
+# The only record fields shared between users; anything else a client sends
+# (such as the local ``lookup`` with its song and track id) is dropped.
+SHARED_FIELDS = ("genre", "source", "ts", "ttl", "grace")
+
+
+def shared_key(key):
+    """Content-addressed shared-cache key for a local cache key."""
+    return SHARED_PREFIX + hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class _BadRequest(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class CacheServer(ThreadingHTTPServer):
+    """Shared genre cache served over HTTP from a sqlite database."""
+
+    daemon_threads = True
+
+    def __init__(self, db_path=":memory:", share_negative=False, address=("127.0.0.1", 0),
+                 clock=time.time):
+        super().__init__(address, _CacheHandler)
+        self.share_negative = share_negative
+        self._clock = clock
+        self._db = open_sqlite(db_path)
+        self._lock = threading.Lock()
+        self.users = {}  # user -> {"gets", "hits", "hits_from_others", "sets"}
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _count(self, user, name, n=1):
+        stats = self.users.setdefault(
+            user, {"gets": 0, "hits": 0, "hits_from_others": 0, "sets": 0})
+        stats[name] += n
+
+    def _row(self, key, now):
+        row = self._db.execute(
+            "SELECT record, expires FROM genre_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or (row[1] is not None and now > row[1]):
+            return None
+        try:
+            return json.loads(row[0])
+        except ValueError:
+            return None
+
+    def get_many(self, user, keys):
+        """Live records for ``keys``: shared ones first, then ``user``'s own negatives."""
+        now = self._clock()
+        found = {}
+        with self._lock:
+            for key in keys:
+                record = self._row(key, now) or self._row(f"user:{user}:{key}", now)
+                if record is None:
+                    continue
+                if record.pop("by", user) != user:
+                    self._count(user, "hits_from_others")
+                found[key] = record
+            self._count(user, "gets", len(keys))
+            self._count(user, "hits", len(found))
+        return found
+
+    def set_many(self, user, records):
+        """Store ``records``; returns how many were written."""
+        now = self._clock()
+        stored = 0
+        with self._lock:
+            for key, record in records.items():
+                record = {k: record[k] for k in SHARED_FIELDS if k in record}
+                expires = expires_at(record)
+                if expires is not None and now > expires:
+                    continue
+                if record.get("genre") or self.share_negative:
+                    current = self._row(key, now)
+                    if current is not None and (
+                            (current.get("genre") and not record.get("genre"))
+                            or current.get("ts", 0) > record.get("ts", 0)):
+                        continue  # never replace found genres with "not found" or older ones
+                    row_key = key
+                else:
+                    row_key = f"user:{user}:{key}"
+                self._db.execute(
+                    "INSERT OR REPLACE INTO genre_cache (key, record, expires) VALUES (?, ?, ?)",
+                    (row_key, json.dumps(dict(record, by=user)), expires),
+                )
+                stored += 1
+            self._db.commit()
+            self._count(user, "sets", stored)
+        return stored
+
+    def stats(self):
+        with self._lock:
+            entries = self._db.execute(
+                "SELECT COUNT(*) FROM genre_cache WHERE key LIKE 'genre:%'"
+            ).fetchone()[0]
+            return {"entries": entries, "users": {u: dict(s) for u, s in self.users.items()}}
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+        self._db.close()
+
+
+class _CacheHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/healthz":
+            return self._reply(200, {"ok": True})
+        if self.path == "/v1/stats":
+            return self._reply(200, self.server.stats())
+        self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        try:
+            body = self._body()
+            user = body.get("user")
+            if not isinstance(user, str) or not _USER.match(user):
+                raise _BadRequest(400, "missing or invalid user")
+            if self.path == "/v1/get":
+                keys = self._keys(body.get("keys"))
+                return self._reply(200, {"records": self.server.get_many(user, keys)})
+            if self.path == "/v1/set":
+                records = body.get("records")
+                if not isinstance(records, dict) or not all(
+                        isinstance(r, dict) for r in records.values()):
+                    raise _BadRequest(400, "records must map keys to records")
+                self._keys(list(records))
+                return self._reply(200, {"stored": self.server.set_many(user, records)})
+            self._reply(404, {"error": "not found"})
+        except _BadRequest as exc:
+            self._reply(exc.status, {"error": str(exc)})
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            raise _BadRequest(400, "body is not JSON") from None
+        if not isinstance(body, dict):
+            raise _BadRequest(400, "body must be a JSON object")
+        return body
+
+    @staticmethod
+    def _keys(keys):
+        if not isinstance(keys, list):
+            raise _BadRequest(400, "keys must be a list")
+        if len(keys) > MAX_BATCH:
+            raise _BadRequest(413, f"at most {MAX_BATCH} keys per request")
+        if not all(isinstance(k, str) and _SHARED_KEY.match(k) for k in keys):
+            raise _BadRequest(400, f"keys must be {SHARED_PREFIX}<sha256 hex>")
+        return keys
+
+    def _reply(self, status, payload):
+        content = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SharedCacheClient:
+    """The sorter's side of a :class:`CacheServer`.
+
+    Works in local cache keys and records; hashes keys on the way out. The
+    first failed request prints a warning and turns the client off for the
+    rest of the run, which then goes on with the local cache alone.
+    """
+
+    def __init__(self, url, user, timeout=DEFAULT_TIMEOUT_S, batch=500):
+        import requests
+
+        self.url = url.rstrip("/")
+        self.user = user
+        self.timeout = timeout
+        self.batch = max(1, min(int(batch), MAX_BATCH))
+        self.available = True
+        self._session = requests.Session()
+
+    def _post(self, path, payload):
+        if not self.available:
+            return None
+        try:
+            response = self._session.post(self.url + path, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except Exception as exc:
+            self.available = False
+            print(f"⚠️ Shared genre cache unavailable ({exc}); using the local cache only.",
+                  file=sys.stderr)
+            return None
+
+    def get_many(self, keys):
+        """``{key: record}`` for the ``keys`` the shared cache holds."""
+        found = {}
+        keys = list(keys)
+        for i in range(0, len(keys), self.batch):
+            hashed = {shared_key(k): k for k in keys[i:i + self.batch]}
+            reply = self._post("/v1/get", {"user": self.user, "keys": list(hashed)})
+            if reply is None:
+                break
+            for key, record in (reply.get("records") or {}).items():
+                if key in hashed and isinstance(record, dict):
+                    found[hashed[key]] = record
+        return found
+
+    def set_many(self, records):
+        """Write ``[(key, record), ...]``; returns how many the server stored."""
+        stored = 0
+        for i in range(0, len(records), self.batch):
+            chunk = {shared_key(k): r for k, r in records[i:i + self.batch]}
+            reply = self._post("/v1/set", {"user": self.user, "records": chunk})
+            if reply is None:
+                break
+            stored += int(reply.get("stored") or 0)
+        return stored
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a genre cache shared by many users.")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="Interface to listen on (default: 127.0.0.1).")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help=f"Port to listen on (default: {DEFAULT_PORT}).")
+    parser.add_argument("--db", default=_default_file_path("genre_cache_server.sqlite3"),
+                        help="sqlite database holding the shared records "
+                             "(':memory:' keeps them for the life of the process).")
+    parser.add_argument("--share-negative", action="store_true",
+                        help="Share 'not found' results between users too.")
+    args = parser.parse_args(argv)
+
+    db_path = args.db if args.db == ":memory:" else os.path.expanduser(args.db)
+    if db_path != ":memory:":
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    server = CacheServer(db_path, share_negative=args.share_negative,
+                         address=(args.host, args.port))
+    print(f"🗃️  Shared genre cache on {server.base_url} ({db_path}).")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⏹️  Stopped.")
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""Per-host circuit breakers for the genre providers.
+
+Every provider has a 4-5 s timeout and swallows its exceptions, so when a
+service is down or throttling us each album pays the full timeout — over
+thousands of albums that adds hours to a run. A :class:`CircuitBreaker` per
+host counts consecutive failures (a raised or swallowed error, see
+:func:`provider_metrics.record_error`, or optionally a call slower than
+``slow_seconds``). After ``failure_threshold`` of them the breaker *opens* and
+the host's providers are skipped for ``cooldown`` seconds; then it lets a
+single *half-open* probe through, which closes it again on success or re-opens
+it on failure.
+
+Providers sharing a host (the Spotify and Last.fm lookups) share a breaker.
+The resolver asks :meth:`BreakerBoard.allow` before calling a provider; an
+album that came out empty while a provider was skipped is only cached for
+:attr:`BreakerBoard.retry_ttl` instead of the full negative TTL.
+"""
+
+import threading
+import time
+from collections import Counter
+
+from provider_metrics import clear_failure, failure_recorded
+
+DEFAULT_FAILURES = 5
+DEFAULT_COOLDOWN_S = 300.0
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+# Provider name -> host; unknown providers get a breaker of their own.
+PROVIDER_HOSTS = {
+    "Discogs": "api.discogs.com",
+    "Spotify Album": "api.spotify.com",
+    "Spotify Track Artist": "api.spotify.com",
+    "Spotify Artist": "api.spotify.com",
+    "LastFM Album": "ws.audioscrobbler.com",
+    "LastFM Track": "ws.audioscrobbler.com",
+    "MusicBrainz": "musicbrainz.org",
+    "Wikipedia": "en.wikipedia.org",
+    "iTunes": "itunes.apple.com",
+}
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker for one host."""
+
+    def __init__(self, name, failure_threshold=DEFAULT_FAILURES, cooldown=DEFAULT_COOLDOWN_S,
+                 clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = int(failure_threshold)
+        self.cooldown = float(cooldown)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+
+    def allow(self):
+        """Whether a call may go out now (moves an expired open breaker to half-open)."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and self._clock() - self.opened_at >= self.cooldown:
+                self.state = HALF_OPEN  # this caller is the probe
+                return True
+            return False
+
+    def record(self, ok):
+        """Record the outcome of a call that :meth:`allow` let through."""
+        with self._lock:
+            if ok:
+                self.state = CLOSED
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.trips += 1
+                self.state = OPEN
+                self.opened_at = self._clock()
+
+
+class BreakerBoard:
+    """The breakers of one run, keyed by provider host."""
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURES, cooldown=DEFAULT_COOLDOWN_S,
+                 slow_seconds=0.0, clock=time.monotonic, hosts=None):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.slow_seconds = float(slow_seconds or 0.0)
+        self.hosts = PROVIDER_HOSTS if hosts is None else hosts
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.breakers = {}
+        self.skipped = Counter()
+
+    @property
+    def retry_ttl(self):
+        """TTL (seconds) for a negative result resolved with a provider skipped."""
+        return max(1, int(self.cooldown))
+
+    def breaker(self, provider):
+        host = self.hosts.get(provider, provider)
+        with self._lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(
+                    host, self.failure_threshold, self.cooldown, self._clock
+                )
+            return self.breakers[host]
+
+    def allow(self, provider):
+        """Whether ``provider`` may be called; counts the skip if not."""
+        if self.breaker(provider).allow():
+            return True
+        with self._lock:
+            self.skipped[provider] += 1
+        return False
+
+    def call(self, provider, lookup):
+        """Run ``lookup()`` for an allowed provider and feed its breaker."""
+        breaker = self.breaker(provider)
+        clear_failure()
+        start = self._clock()
+        try:
+            result = lookup()
+        except Exception:
+            breaker.record(False)
+            raise
+        slow = self.slow_seconds and self._clock() - start >= self.slow_seconds
+        breaker.record(not (failure_recorded() or slow))
+        return result
+
+    def report(self):
+        return {
+            "breakers": {host: {"state": b.state, "trips": b.trips}
+                         for host, b in self.breakers.items()},
+            "skipped": dict(self.skipped),
+        }
+
+    def print_report(self):
+        tripped = [b for b in self.breakers.values() if b.trips]
+        if not tripped:
+            return
+        print("\n🔌 Circuit breakers (failing hosts skipped during cool-down):")
+        for b in tripped:
+            skipped = sum(n for provider, n in self.skipped.items()
+                          if self.hosts.get(provider, provider) == b.name)
+            print(f"   {b.name}: opened {b.trips}×, {skipped} lookup(s) skipped, now {b.state}")
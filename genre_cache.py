@@ -5,30 +5,54 @@ deterministic per album/artist, so caching them across runs turns a 15-20 min
 enrichment pass into a few seconds on subsequent runs.
 
 Two levels:
-  * L1 — an in-process dict (fast, lives for the run).
-  * L2 — a persistent store: Redis by default, automatically falling back to a
-    JSON file when Redis is unreachable (a warning is printed, the run goes on).
+  * L1 — an in-process LRU, bounded by entry count and/or bytes
+    (:class:`LRUCache`), so long-running or batch processes don't grow forever.
+  * L2 — a persistent store: Redis by default, automatically falling back to
+    the sqlite store when Redis is unreachable (a warning is printed, the run
+    goes on; a JSON file cache from before is migrated into it once). The
+    ``sqlite`` store reads entries on demand, so a cache of millions of albums
+    costs a small run nothing up front; the ``file`` store loads its JSON file
+    whole at startup.
 
 Values keep the resolved genres *and* their ``source`` so the CSV's ``source``
 column is preserved across cached runs. Negative results (no genre found) are
 also cached, but with a short TTL so they get retried before long.
+
+Found genres expire softly (stale-while-revalidate): past ``ttl_days`` an entry
+is still served for another ``stale_days`` but is recorded in
+:attr:`GenreCache.stale` so it can be refreshed off the critical path (by idle
+workers during a run or by ``refresh_cache.py``). Their TTL is jittered by
+``ttl_jitter`` so entries written in one run don't all expire on the same day.
+
+With ``[CACHE] shared_url`` set, a shared cache (``cache_server.py``) sits
+behind L2: local misses are read through it, copied into L2, and every result
+resolved locally is written back to it in batches.
 """
 
+import contextlib
 import json
+import math
 import os
+import random
+import sqlite3
 import sys
 import tempfile
+import threading
 import time
+from collections import OrderedDict
 
 DEFAULT_REDIS_URL = "redis://localhost:6379/0"
 DEFAULT_TTL_DAYS = 90
 DEFAULT_NEGATIVE_TTL_HOURS = 6
+DEFAULT_STALE_DAYS = 30
+DEFAULT_TTL_JITTER = 0.1
+DEFAULT_L1_MAX_ENTRIES = 100_000
+# Lifetime L2 hit/miss counters (outside the ``genre:`` key space).
+STATS_KEY = "genre_cache:stats"
 
 
-def _default_file_path():
-    return os.path.join(
-        os.path.expanduser("~"), ".cache", "likes_songs_sorter", "genre_cache.json"
-    )
+def _default_file_path(name="genre_cache.json"):
+    return os.path.join(os.path.expanduser("~"), ".cache", "likes_songs_sorter", name)
 
 
 def _slug(value):
@@ -42,20 +66,95 @@ def make_key(album_id, album_name, artist_name):
     return f"genre:name:{_slug(album_name)}|{_slug(artist_name)}"
 
 
+def _entry_size(key, value):
+    """Approximate bytes held by one L1 entry (key, genres list and strings, source)."""
+    genres, source = value
+    return (sys.getsizeof(key) + sys.getsizeof(value) + sys.getsizeof(genres)
+            + sum(sys.getsizeof(g) for g in genres) + sys.getsizeof(source))
+
+
+class LRUCache:
+    """Mapping that evicts least-recently-used entries past a count or size bound.
+
+    ``max_entries`` / ``max_bytes`` of ``None`` or 0 mean unbounded; sizes come
+    from ``sizeof(key, value)``.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, sizeof=_entry_size):
+        self.max_entries = max_entries or None
+        self.max_bytes = max_bytes or None
+        self._sizeof = sizeof
+        self._data = OrderedDict()
+        self._sizes = {}
+        self.bytes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def __setitem__(self, key, value):
+        size = self._sizeof(key, value) if self.max_bytes else 0
+        with self._lock:
+            if key in self._data:
+                self.bytes -= self._sizes.pop(key, 0)
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if size:
+                self._sizes[key] = size
+                self.bytes += size
+            while ((self.max_entries and len(self._data) > self.max_entries)
+                   or (self.max_bytes and self.bytes > self.max_bytes and len(self._data) > 1)):
+                old, _ = self._data.popitem(last=False)
+                self.bytes -= self._sizes.pop(old, 0)
+                self.evictions += 1
+
+
 class GenreCache:
-    """Two-level (memory + Redis/file) cache for album/artist genres."""
+    """Two-level (memory + Redis/sqlite/file) cache for album/artist genres."""
 
     def __init__(self, backend="redis", redis_url=DEFAULT_REDIS_URL, file_path=None,
                  ttl_days=DEFAULT_TTL_DAYS, negative_ttl_hours=DEFAULT_NEGATIVE_TTL_HOURS,
-                 refresh=False, time_fn=time.time):
+                 refresh=False, time_fn=time.time, stale_days=DEFAULT_STALE_DAYS,
+                 ttl_jitter=DEFAULT_TTL_JITTER, rng=None,
+                 l1_max_entries=DEFAULT_L1_MAX_ENTRIES, l1_max_bytes=None, shared=None):
         self.refresh = refresh
         self._time = time_fn
-        self._mem = {}
+        self._mem = LRUCache(l1_max_entries, l1_max_bytes)
+        # Soft-expired keys served this run -> the lookup they were stored with.
+        self.stale = {}
+        # L2 lookups this run (added to the store's STATS_KEY counters on close).
+        self.hits = 0
+        self._missed = set()
+        # Shared cache (a ``cache_server.SharedCacheClient``): records prefetched
+        # from it, keys already asked for, and results waiting to be written back.
+        self.shared = shared
+        self.shared_hits = 0
+        self._shared_found = {}
+        self._shared_checked = set()
+        self._shared_pending = []
         self._redis = None
+        self._sqlite = None
         self._file_path = None
         self._file_data = None
+        # Stale entries are refreshed from worker threads while the run goes on.
+        self._lock = threading.Lock()
         self.ttl = int(ttl_days * 86400)
         self.negative_ttl = int(negative_ttl_hours * 3600)
+        self.grace = int(stale_days * 86400)
+        self.ttl_jitter = float(ttl_jitter)
+        self._rng = rng or random.Random()
 
         requested = (backend or "none").strip().lower()
         if requested == "none":
@@ -66,7 +165,14 @@ class GenreCache:
             if self._try_init_redis(redis_url):
                 self.backend = "redis"
                 return
-            print("⚠️ Redis cache unavailable; falling back to file cache.", file=sys.stderr)
+            print("⚠️ Redis cache unavailable; falling back to the sqlite cache.", file=sys.stderr)
+            json_path = os.path.expanduser(file_path or _default_file_path())
+            root, ext = os.path.splitext(json_path)
+            if self._try_init_sqlite(root + ".sqlite3" if ext == ".json" else json_path):
+                self.backend = "sqlite"
+                if ext == ".json":
+                    self._migrate_json(json_path)
+                return
             requested = "file"
 
         if requested == "file":
@@ -74,6 +180,13 @@ class GenreCache:
             self.backend = "file"
             return
 
+        if requested == "sqlite":
+            if self._try_init_sqlite(file_path):
+                self.backend = "sqlite"
+                return
+            self.backend = "none"
+            return
+
         print(f"⚠️ Unknown cache backend '{backend}'; caching disabled.", file=sys.stderr)
         self.backend = "none"
 
@@ -91,6 +204,60 @@ class GenreCache:
             print(f"⚠️ Could not connect to Redis ({exc}).", file=sys.stderr)
             return False
 
+    def _try_init_sqlite(self, file_path):
+        self._file_path = os.path.expanduser(file_path or _default_file_path("genre_cache.sqlite3"))
+        try:
+            os.makedirs(os.path.dirname(self._file_path) or ".", exist_ok=True)
+            self._sqlite = open_sqlite(self._file_path)
+            return True
+        except (OSError, sqlite3.Error) as exc:
+            print(f"⚠️ Could not open the sqlite genre cache ({exc}); caching disabled.",
+                  file=sys.stderr)
+            return False
+
+    def _migrate_json(self, json_path):
+        """Copy a JSON file cache into a new, empty sqlite store (streamed)."""
+        if not os.path.exists(json_path):
+            return
+        with self._lock:
+            if self._sqlite.execute("SELECT 1 FROM genre_cache LIMIT 1").fetchone():
+                return  # not a new store: already migrated (or in use)
+        from cache_admin import iter_json_object
+
+        now, migrated, batch, stats = self._time(), 0, [], {}
+        try:
+            with open(json_path, "r", encoding="utf-8") as fh:
+                for key, record in iter_json_object(fh):
+                    if key == STATS_KEY and isinstance(record, dict):
+                        stats = record
+                        continue
+                    if not key.startswith("genre:") or not isinstance(record, dict):
+                        continue
+                    expires = expires_at(record)
+                    if expires is not None and expires < now:
+                        continue
+                    batch.append((key, json.dumps(record), expires))
+                    if len(batch) >= 1000:
+                        migrated += self._sqlite_insert(batch)
+                        batch = []
+        except (OSError, ValueError) as exc:
+            print(f"⚠️ Could not migrate {json_path} to the sqlite cache ({exc}).",
+                  file=sys.stderr)
+        migrated += self._sqlite_insert(batch)
+        # The counters row doubles as the "migrated" marker.
+        self._sqlite_insert([(STATS_KEY, json.dumps(stats), None)])
+        if migrated:
+            print(f"🗃️  Migrated {migrated} genre-cache entries from {json_path} "
+                  f"to {self._file_path}.")
+
+    def _sqlite_insert(self, rows):
+        with self._lock:
+            self._sqlite.executemany(
+                "INSERT OR REPLACE INTO genre_cache (key, record, expires) VALUES (?, ?, ?)", rows
+            )
+            self._sqlite.commit()
+        return len(rows)
+
     def _init_file(self, file_path):
         self._file_path = file_path or _default_file_path()
         try:
@@ -110,36 +277,179 @@ class GenreCache:
     # --- public API -----------------------------------------------------------
     @property
     def enabled(self):
-        return self.backend != "none"
+        return self.backend != "none" or self.shared is not None
 
     def get(self, key):
-        """Return ``(genres, source)`` if cached and unexpired, else ``None``."""
-        if key in self._mem:
-            return self._mem[key]
+        """Return ``(genres, source)`` if cached and not hard-expired, else ``None``.
+
+        A soft-expired (stale) entry is still returned, and its key is added
+        to :attr:`stale`.
+        """
+        value = self._mem.get(key)
+        if value is not None:
+            return value
         if not self.enabled or self.refresh:
             return None
         record = self._l2_get(key)
         if record is None:
-            return None
+            record = self._shared_get(key)
+            if record is None:
+                self._missed.add(key)
+                return None
+        self.hits += 1
+        if self.is_stale(record):
+            self.stale[key] = record.get("lookup")
         value = (list(record.get("genre") or []), record.get("source") or "None")
         self._mem[key] = value
         return value
 
-    def set(self, key, genres, source):
-        """Store a lookup result in L1 and L2 (negatives get a short TTL)."""
+    def set(self, key, genres, source, ttl=None, lookup=None):
+        """Store a lookup result in L1 and L2 (negatives get a short TTL).
+
+        ``ttl`` (seconds) overrides the TTL for this entry. ``lookup`` (the
+        album/artist/ids it was resolved from) is kept with the entry so
+        ``refresh_cache.py`` can re-resolve it once it goes stale.
+        """
         genres = list(genres or [])
         value = (genres, source)
         self._mem[key] = value
+        self.stale.pop(key, None)
         if not self.enabled:
             return
-        ttl = self.ttl if genres else self.negative_ttl
-        record = {"genre": genres, "source": source, "ts": int(self._time())}
-        self._l2_set(key, record, ttl)
+        grace = 0
+        if ttl is None and genres:
+            ttl = int(self.ttl * (1.0 + self._rng.uniform(-self.ttl_jitter, self.ttl_jitter)))
+            grace = self.grace
+        elif ttl is None:
+            ttl = self.negative_ttl
+        record = {"genre": genres, "source": source, "ts": int(self._time()), "ttl": ttl}
+        if grace:
+            record["grace"] = grace
+        if lookup:
+            record["lookup"] = lookup
+        self._l2_set(key, record, ttl + grace)
+        if self.shared is not None:
+            with self._lock:
+                # ``lookup`` names this user's song and track: it stays local.
+                self._shared_pending.append(
+                    (key, {k: v for k, v in record.items() if k != "lookup"}))
+                flush = len(self._shared_pending) >= self.shared.batch
+            if flush:
+                self.flush_shared()
+
+    def prefetch(self, keys):
+        """Fetch the ``keys`` missing locally from the shared cache in batches.
+
+        Found records are copied into L2 and served by :meth:`get`. Without a
+        shared cache (or with ``refresh``) this does nothing.
+        """
+        if self.shared is None or self.refresh:
+            return 0
+        wanted = [k for k in dict.fromkeys(keys)
+                  if k not in self._mem and k not in self._shared_checked
+                  and self._l2_get(k) is None]
+        found = self.shared.get_many(wanted) if wanted else {}
+        if self.shared.available:
+            self._shared_checked.update(wanted)
+        now = self._time()
+        for key, record in found.items():
+            expires = expires_at(record)
+            if expires is None or expires > now:
+                self._shared_found[key] = record
+        return len(self._shared_found)
+
+    def flush_shared(self):
+        """Write the results resolved since the last flush to the shared cache."""
+        if self.shared is None:
+            return
+        with self._lock:
+            pending, self._shared_pending = self._shared_pending, []
+        if pending:
+            self.shared.set_many(pending)
+
+    def is_stale(self, record):
+        """Whether ``record`` is past its soft expiry (its TTL, without the grace)."""
+        ttl, ts = record.get("ttl"), record.get("ts")
+        return bool(ttl) and ts is not None and self._time() - ts > ttl
+
+    def entries(self):
+        """Iterate ``(key, record)`` over the persistent store."""
+        if self._redis is not None:
+            try:
+                for raw_key in self._redis.scan_iter(match="genre:*", count=1000):
+                    key = raw_key.decode() if isinstance(raw_key, bytes) else raw_key
+                    record = self._l2_get(key)
+                    if record is not None:
+                        yield key, record
+            except Exception as exc:
+                print(f"⚠️ Could not scan the Redis cache ({exc}).", file=sys.stderr)
+            return
+        if self._sqlite is not None:
+            for key, raw in iter_sqlite(self._sqlite, self._lock, now=self._time()):
+                try:
+                    yield key, json.loads(raw)
+                except ValueError:
+                    continue
+            return
+        if self._file_data is not None:
+            for key in list(self._file_data):
+                if not key.startswith("genre:"):
+                    continue
+                record = self._file_get(key)
+                if record is not None:
+                    yield key, record
 
     def close(self):
-        """Flush the file backend (Redis persists on every write)."""
+        """Save the hit/miss counters, flush the file backend and the shared write-back."""
+        self.flush_shared()
+        hits, misses = self.hits, len(self._missed)
+        self.hits, self._missed = 0, set()
+        if self._redis is not None and (hits or misses):
+            try:
+                pipe = self._redis.pipeline()
+                pipe.hincrby(STATS_KEY, "hits", hits)
+                pipe.hincrby(STATS_KEY, "misses", misses)
+                pipe.execute()
+            except Exception:
+                pass
+        if self._sqlite is not None and (hits or misses):
+            with self._lock:
+                row = self._sqlite.execute(
+                    "SELECT record FROM genre_cache WHERE key = ?", (STATS_KEY,)
+                ).fetchone()
+                stats = json.loads(row[0]) if row else {}
+                stats["hits"] = stats.get("hits", 0) + hits
+                stats["misses"] = stats.get("misses", 0) + misses
+                self._sqlite.execute(
+                    "INSERT OR REPLACE INTO genre_cache (key, record, expires) VALUES (?, ?, NULL)",
+                    (STATS_KEY, json.dumps(stats)),
+                )
+                self._sqlite.commit()
         if self.backend == "file":
-            self._flush_file()
+            with self._lock:
+                stats = self._file_data.setdefault(STATS_KEY, {})
+                stats["hits"] = stats.get("hits", 0) + hits
+                stats["misses"] = stats.get("misses", 0) + misses
+                self._flush_file()
+
+    # --- shared cache ---------------------------------------------------------
+    def _shared_get(self, key):
+        """Read ``key`` through the shared cache (once per run) into L2."""
+        if self.shared is None:
+            return None
+        record = self._shared_found.pop(key, None)
+        if record is None and key not in self._shared_checked and self.shared.available:
+            self._shared_checked.add(key)
+            record = self.shared.get_many([key]).get(key)
+            expires = expires_at(record) if record is not None else None
+            if expires is not None and expires <= self._time():
+                record = None
+        if record is None:
+            return None
+        self.shared_hits += 1
+        expires = expires_at(record)
+        self._l2_set(key, record, 0 if expires is None else expires - record["ts"])
+        return record
 
     # --- L2: redis ------------------------------------------------------------
     def _l2_get(self, key):
@@ -154,22 +464,51 @@ class GenreCache:
                 return json.loads(raw)
             except ValueError:
                 return None
+        if self._sqlite is not None:
+            return self._sqlite_get(key)
         if self._file_data is not None:
             return self._file_get(key)
         return None
 
-    def _l2_set(self, key, record, ttl):
+    def _l2_set(self, key, record, expire):
         if self._redis is not None:
             try:
-                self._redis.set(key, json.dumps(record), ex=ttl if ttl > 0 else None)
+                # ``expire`` counts from the record's ts, which may be in the past
+                # for records copied from the shared cache.
+                ex = max(1, math.ceil(record["ts"] + expire - self._time())) if expire > 0 else None
+                self._redis.set(key, json.dumps(record), ex=ex)
             except Exception:
                 pass
             return
+        if self._sqlite is not None:
+            expires = record["ts"] + expire if expire > 0 else None
+            with self._lock:
+                self._sqlite.execute(
+                    "INSERT OR REPLACE INTO genre_cache (key, record, expires) VALUES (?, ?, ?)",
+                    (key, json.dumps(record), expires),
+                )
+                self._sqlite.commit()
+            return
         if self._file_data is not None:
-            record = dict(record)
-            record["ttl"] = ttl
-            self._file_data[key] = record
-            self._flush_file()
+            with self._lock:
+                self._file_data[key] = record
+                self._flush_file()
+
+    # --- L2: sqlite -----------------------------------------------------------
+    def _sqlite_get(self, key):
+        with self._lock:
+            row = self._sqlite.execute(
+                "SELECT record, expires FROM genre_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        raw, expires = row
+        if expires is not None and self._time() > expires:
+            return None  # hard-expired; overwritten on the next set, swept by cache_admin
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
 
     # --- L2: file -------------------------------------------------------------
     def _file_get(self, key):
@@ -178,8 +517,8 @@ class GenreCache:
             return None
         ttl = record.get("ttl")
         ts = record.get("ts")
-        if ttl and ts is not None and self._time() - ts > ttl:
-            # Expired: drop it so it gets retried.
+        if ttl and ts is not None and self._time() - ts > ttl + record.get("grace", 0):
+            # Hard-expired: drop it so it gets retried.
             self._file_data.pop(key, None)
             return None
         return record
@@ -198,6 +537,47 @@ class GenreCache:
             print(f"⚠️ Could not write genre cache file ({exc}).", file=sys.stderr)
 
 
+def expires_at(record):
+    """Unix time at which ``record`` hard-expires (``None`` = never)."""
+    ttl, ts = record.get("ttl"), record.get("ts")
+    if not ttl or ts is None:
+        return None
+    return ts + ttl + record.get("grace", 0)
+
+
+def open_sqlite(path):
+    """Open (creating if needed) a sqlite genre-cache database."""
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS genre_cache "
+        "(key TEXT PRIMARY KEY, record TEXT NOT NULL, expires REAL)"
+    )
+    conn.commit()
+    return conn
+
+
+def iter_sqlite(conn, lock=None, now=None, batch=1000):
+    """Yield ``(key, raw record)`` for the ``genre:`` rows, a batch at a time.
+
+    Rows hard-expired at ``now`` are skipped (``None`` keeps them all).
+    """
+    last = ""
+    while True:
+        with lock or contextlib.nullcontext():
+            rows = conn.execute(
+                "SELECT key, record, expires FROM genre_cache "
+                "WHERE key > ? AND key LIKE 'genre:%' ORDER BY key LIMIT ?", (last, batch)
+            ).fetchall()
+        for key, raw, expires in rows:
+            if now is None or expires is None or expires >= now:
+                yield key, raw
+        if len(rows) < batch:
+            return
+        last = rows[-1][0]
+
+
 def build_cache_from_config(config, refresh=False, disabled=False):
     """Construct a :class:`GenreCache` from a ``[CACHE]`` settings section."""
     if disabled:
@@ -209,6 +589,22 @@ def build_cache_from_config(config, refresh=False, disabled=False):
     negative_ttl_hours = float(
         config.get("CACHE", "negative_ttl_hours", fallback=DEFAULT_NEGATIVE_TTL_HOURS)
     )
+    stale_days = float(config.get("CACHE", "stale_days", fallback=DEFAULT_STALE_DAYS))
+    ttl_jitter = float(config.get("CACHE", "ttl_jitter", fallback=DEFAULT_TTL_JITTER))
+    l1_max_entries = int(config.get("CACHE", "l1_max_entries", fallback=DEFAULT_L1_MAX_ENTRIES))
+    l1_max_mb = float(config.get("CACHE", "l1_max_mb", fallback="0"))
+    shared = None
+    shared_url = config.get("CACHE", "shared_url", fallback="").strip()
+    if shared_url:
+        import getpass
+
+        from cache_server import DEFAULT_TIMEOUT_S, SharedCacheClient
+
+        shared = SharedCacheClient(
+            shared_url,
+            config.get("CACHE", "shared_user", fallback="").strip() or getpass.getuser(),
+            timeout=float(config.get("CACHE", "shared_timeout", fallback=DEFAULT_TIMEOUT_S)),
+        )
     return GenreCache(
         backend=backend,
         redis_url=redis_url,
@@ -216,4 +612,9 @@ def build_cache_from_config(config, refresh=False, disabled=False):
         ttl_days=ttl_days,
         negative_ttl_hours=negative_ttl_hours,
         refresh=refresh,
+        stale_days=stale_days,
+        ttl_jitter=ttl_jitter,
+        l1_max_entries=l1_max_entries,
+        l1_max_bytes=int(l1_max_mb * 1024 * 1024),
+        shared=shared,
     )
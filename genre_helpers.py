@@ -4,11 +4,25 @@ import re
 from collections import OrderedDict, Counter
 import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials
-from bs4 import BeautifulSoup
-from urllib.parse import quote_plus
+
+import wikipedia_lookup
+from provider_metrics import count_response, record_error
+from rate_limit import RateLimiter
 
 BLACKLIST = {"wrong tag", "incorrect tag"}
 
+def _http_get(url, **kwargs):
+    """``requests.get`` that reports the response to the provider metrics.
+
+    Throttling and server errors (429, 5xx) are recorded as provider errors
+    even though the callers degrade them to an empty result.
+    """
+    r = count_response(requests.get(url, **kwargs))
+    status = getattr(r, "status_code", 200)
+    if isinstance(status, int) and (status == 429 or status >= 500):
+        record_error(requests.HTTPError(f"HTTP {status} from {url}"))
+    return r
+
 def clean_tags(tags):
     return [t for t in tags if t.lower() not in BLACKLIST]
 
@@ -24,42 +38,74 @@ def clean_album_name(name):
         flags=re.IGNORECASE
     ).strip()
 
+DISCOGS_API = "https://api.discogs.com"
+# Discogs allows 60 authenticated requests per minute.
+DISCOGS_LIMITER = RateLimiter(60, 60.0)
+DISCOGS_MAX_RETRIES = 2
+# Master records are shared by many releases: cache their tags by master id.
+_discogs_masters = {}
+
+def _discogs_get(path, params):
+    """GET a Discogs endpoint within the rate limit, backing off on HTTP 429."""
+    for attempt in range(DISCOGS_MAX_RETRIES + 1):
+        DISCOGS_LIMITER.acquire()
+        r = _http_get(f"{DISCOGS_API}{path}", params=params, timeout=5)
+        if r.status_code != 429 or attempt == DISCOGS_MAX_RETRIES:
+            return r.json()
+        try:
+            retry_after = float(r.headers.get("Retry-After", 5))
+        except (TypeError, ValueError):
+            retry_after = 5.0
+        DISCOGS_LIMITER.pause(min(max(retry_after, 1.0), 60.0))
+    return {}
+
+def _discogs_master_genres(master_id, api_key):
+    if master_id not in _discogs_masters:
+        mdata = _discogs_get(f"/masters/{master_id}", {"token": api_key})
+        _discogs_masters[master_id] = mdata.get("genres", []) + mdata.get("styles", [])
+    return _discogs_masters[master_id]
+
 def get_discogs_album_info(album_name, artist_name, api_key, max_results=5):
     """
-    Fetch genres/styles from Discogs via master or release record.
+    Fetch genres/styles from Discogs search results, using master records only
+    when needed.
+
+    Results are ranked by title similarity first; a well-matching result that
+    already carries ``genre``/``style`` in the search payload is used as is.
+    Master records (cached by id) are only fetched for results whose payload
+    lacks them.
     """
     try:
-        search_url = "https://api.discogs.com/database/search"
-        params = {
+        results = _discogs_get("/database/search", {
             "release_title": album_name,
             "artist": artist_name,
             "type": "release",
             "token": api_key,
             "per_page": max_results
-        }
-        r = requests.get(search_url, params=params, timeout=5)
-        results = r.json().get("results", [])
-        for result in results:
-            # try master record first
-            master_id = result.get("master_id")
-            if master_id:
-                murl = f"https://api.discogs.com/masters/{master_id}"
-                mr = requests.get(murl, params={"token": api_key}, timeout=5)
-                mdata = mr.json()
-                genres = mdata.get("genres", []) + mdata.get("styles", [])
-                if genres:
-                    return clean_tags(genres)
-            # fallback to release record
-            title = result.get("title", "").lower()
-            score = SequenceMatcher(
-                None, title, f"{artist_name} - {album_name}".lower()
-            ).ratio()
-            if score > 0.5:
-                genres = result.get("genre", []) + result.get("style", [])
+        }).get("results", [])
+        target = f"{artist_name} - {album_name}".lower()
+        scored = sorted(
+            ((SequenceMatcher(None, r.get("title", "").lower(), target).ratio(), k, r)
+             for k, r in enumerate(results)),
+            key=lambda item: (-item[0], item[1]),
+        )
+        # Good title matches: payload tags first, their master if missing.
+        for score, _, result in scored:
+            if score <= 0.5:
+                break
+            genres = result.get("genre", []) + result.get("style", [])
+            if not genres and result.get("master_id"):
+                genres = _discogs_master_genres(result["master_id"], api_key)
+            if genres:
+                return clean_tags(genres)
+        # Weak title matches: only trust the master record.
+        for score, _, result in scored:
+            if score <= 0.5 and result.get("master_id"):
+                genres = _discogs_master_genres(result["master_id"], api_key)
                 if genres:
                     return clean_tags(genres)
-    except Exception:
-        pass
+    except Exception as exc:
+        record_error(exc)
     return []
 
 def get_lastfm_album_info(album_name, artist_name, api_key):
@@ -75,7 +121,7 @@ def get_lastfm_album_info(album_name, artist_name, api_key):
             "album": album_name,
             "format": "json"
         }
-        data = requests.get(url, params=params, timeout=5).json()
+        data = _http_get(url, params=params, timeout=5).json()
         if data.get("error"):
             return []
         album = data.get("album")
@@ -83,8 +129,8 @@ def get_lastfm_album_info(album_name, artist_name, api_key):
             return []
         tags = album.get("tags", {}).get("tag", [])
         return clean_tags([t.get("name", "") for t in tags if isinstance(t, dict)])
-    except Exception:
-        pass
+    except Exception as exc:
+        record_error(exc)
     return []
 
 def get_musicbrainz_album_info(album_name, artist_name, max_results=5):
@@ -98,8 +144,8 @@ def get_musicbrainz_album_info(album_name, artist_name, max_results=5):
             "fmt": "json",
             "limit": max_results
         }
-        r = requests.get(url, params=params, timeout=5,
-                         headers={"User-Agent": "MusicSorter/1.0"})
+        r = _http_get(url, params=params, timeout=5,
+                      headers={"User-Agent": "MusicSorter/1.0"})
         groups = r.json().get("release-groups", [])
         for grp in groups:
             title = grp.get("title", "").lower()
@@ -107,8 +153,8 @@ def get_musicbrainz_album_info(album_name, artist_name, max_results=5):
             if score > 0.5:
                 tags = [t.get("name", "") for t in grp.get("tags", [])]
                 return clean_tags(tags)
-    except Exception:
-        pass
+    except Exception as exc:
+        record_error(exc)
     return []
 
 def get_lastfm_track_info(song_name, artist_name, api_key):
@@ -124,13 +170,13 @@ def get_lastfm_track_info(song_name, artist_name, api_key):
             "track": song_name,
             "format": "json"
         }
-        data = requests.get(url, params=params, timeout=5).json()
+        data = _http_get(url, params=params, timeout=5).json()
         if data.get("error"):
             return []
         tags = data.get("track", {}).get("toptags", {}).get("tag", [])
         return clean_tags([t.get("name", "") for t in tags if isinstance(t, dict)])
-    except Exception:
-        pass
+    except Exception as exc:
+        record_error(exc)
     return []
 
 def get_spotify_album_info(sp, album_id):
@@ -150,8 +196,8 @@ def get_spotify_album_info(sp, album_id):
             a = sp.artist(art.get("id"))
             genres.extend(a.get("genres", []))
         return clean_tags(genres)
-    except Exception:
-        pass
+    except Exception as exc:
+        record_error(exc)
     return []
 
 def get_spotify_album_search_info(sp, album_name, artist_name):
@@ -171,8 +217,8 @@ def get_spotify_album_search_info(sp, album_name, artist_name):
         album_id = items[0].get("id")
         if album_id:
             return get_spotify_album_info(sp, album_id)
-    except Exception:
-        pass
+    except Exception as exc:
+        record_error(exc)
     return []
 
 def get_spotify_artist_genres(sp, artist_name):
@@ -184,8 +230,8 @@ def get_spotify_artist_genres(sp, artist_name):
         items = res.get("artists", {}).get("items", [])
         if items:
             return clean_tags(items[0].get("genres", []))
-    except Exception:
-        pass
+    except Exception as exc:
+        record_error(exc)
     return []
 
 def get_spotify_track_artist_genres(sp, track_id):
@@ -199,34 +245,19 @@ def get_spotify_track_artist_genres(sp, track_id):
             art = sp.artist(artist.get("id"))
             genres.extend(art.get("genres", []))
         return clean_tags(genres)
-    except Exception:
-        pass
+    except Exception as exc:
+        record_error(exc)
     return []
 
 def get_wikipedia_album_info(album_name, artist_name):
     """
-    Scrape album infobox on Wikipedia for the Genre field.
+    Read the Genre field of the album's Wikipedia infobox (MediaWiki API,
+    section-0 wikitext only; see ``wikipedia_lookup``).
     """
     try:
-        slug = quote_plus(f"{album_name} {artist_name}")
-        url = f"https://en.wikipedia.org/wiki/{slug}"
-        resp = requests.get(
-            url,
-            timeout=4,
-            headers={"User-Agent": "MusicSorter/1.0 (+github.com/likes-songs-sorter)"}
-        )
-        if resp.status_code >= 400:
-            return []
-        soup = BeautifulSoup(resp.text, "html.parser")
-        info = soup.find("table", class_="infobox")
-        if info:
-            th = info.find("th", string="Genre")
-            if th:
-                td = th.find_next_sibling("td")
-                tags = [a.get_text(strip=True) for a in td.find_all("a")]
-                return clean_tags(tags)
-    except Exception:
-        pass
+        return clean_tags(wikipedia_lookup.get_album_genres(album_name, artist_name))
+    except Exception as exc:
+        record_error(exc)
     return []
 
 def get_itunes_album_info(album_name, artist_name):
@@ -240,7 +271,7 @@ def get_itunes_album_info(album_name, artist_name):
             "media": "music",
             "limit": 3,
         }
-        data = requests.get("https://itunes.apple.com/search", params=params, timeout=4).json()
+        data = _http_get("https://itunes.apple.com/search", params=params, timeout=4).json()
         for item in data.get("results", []):
             if item.get("collectionType") != "Album":
                 continue
@@ -254,8 +285,8 @@ def get_itunes_album_info(album_name, artist_name):
                     if g and g not in unique:
                         unique.append(g)
                 return clean_tags(unique)
-    except Exception:
-        pass
+    except Exception as exc:
+        record_error(exc)
     return []
 
 def lookup_genres(artist, album, song, cfg):
@@ -15,30 +15,72 @@ kept for display in the CSV.
 
 import json
 import os
+import re
 
 import numpy as np
+from scipy import sparse
 from sklearn.metrics.pairwise import cosine_similarity
 
 DEFAULT_ROOTS_FILE = os.path.join(os.path.dirname(__file__), "genre_roots.json")
 
 
+class GenreRoots(list):
+    """Ordered root rules plus a compiled keyword matcher.
+
+    Behaves as the plain list of ``{"root", "keywords"}`` dicts, but all
+    keywords are compiled into one lookahead alternation in priority order, so
+    a single scan of a tag finds the highest-priority rule with a keyword
+    inside it (at each position the regex takes the first alternative, i.e. the
+    lowest rule index). The result per normalized tag is memoized, so each
+    distinct tag is classified once per run. Treat it as read-only once built.
+    """
+
+    def __init__(self, rules=()):
+        super().__init__(rules)
+        self._rule_of = {}
+        for index, rule in enumerate(self):
+            for keyword in rule["keywords"]:
+                self._rule_of.setdefault(keyword, index)
+        alternation = "|".join(re.escape(k) for k in self._rule_of)
+        self._pattern = re.compile(f"(?=({alternation}))") if self._rule_of else None
+        self._memo = {}
+
+    def rule_index(self, norm_tag):
+        """Index of the first rule matching a normalized tag, or ``None``."""
+        try:
+            return self._memo[norm_tag]
+        except KeyError:
+            pass
+        best = None
+        if self._pattern is not None:
+            for match in self._pattern.finditer(norm_tag):
+                index = self._rule_of[match.group(1)]
+                if best is None or index < best:
+                    best = index
+                    if best == 0:
+                        break
+        self._memo[norm_tag] = best
+        return best
+
+
 def load_genre_roots(path=None):
-    """Load the ordered list of root rules; returns ``[]`` on any problem."""
+    """Load the ordered root rules as a :class:`GenreRoots`; empty on any problem."""
     path = path or DEFAULT_ROOTS_FILE
     try:
         with open(path, "r", encoding="utf-8") as fh:
             data = json.load(fh)
         rules = data.get("rules", []) if isinstance(data, dict) else []
-        return [
+        return GenreRoots(
             {"root": r["root"], "keywords": [k.lower() for k in r.get("keywords", [])]}
             for r in rules
             if isinstance(r, dict) and r.get("root")
-        ]
+        )
     except (OSError, ValueError, KeyError):
-        return []
+        return GenreRoots()
 
 
-def _norm(tag):
+def normalize_tag(tag):
+    """Canonical tag form: lower-case, trimmed, inner whitespace collapsed."""
     return " ".join(str(tag or "").strip().lower().split())
 
 
@@ -47,9 +89,12 @@ def root_of(tag, rules):
 
     First matching rule wins; unmatched tags fall back to their first word.
     """
-    t = _norm(tag)
+    t = normalize_tag(tag)
     if not t:
         return "unknown"
+    if isinstance(rules, GenreRoots):
+        index = rules.rule_index(t)
+        return rules[index]["root"] if index is not None else t.split()[0]
     for rule in rules:
         if any(kw in t for kw in rule["keywords"]):
             return rule["root"]
@@ -59,7 +104,7 @@ def root_of(tag, rules):
 def primary_root(genre_list, rules):
     """Root family of an album, taken from its most prominent (first) tag."""
     for tag in genre_list or []:
-        if _norm(tag):
+        if normalize_tag(tag):
             return root_of(tag, rules)
     return "unknown"
 
@@ -73,9 +118,12 @@ def infer_root(genre_list, rules):
     Unmatched tag sets fall back to the most specific tag (the last one, since
     tags are sorted broad->niche), never a bare ``"unknown"``.
     """
-    norm_tags = [_norm(t) for t in (genre_list or []) if _norm(t)]
+    norm_tags = [normalize_tag(t) for t in (genre_list or []) if normalize_tag(t)]
     if not norm_tags:
         return "unknown"
+    if isinstance(rules, GenreRoots):
+        indexes = [i for i in map(rules.rule_index, norm_tags) if i is not None]
+        return rules[min(indexes)]["root"] if indexes else norm_tags[-1]
     for rule in rules:
         for tag in norm_tags:
             if any(kw in tag for kw in rule["keywords"]):
@@ -83,6 +131,30 @@ def infer_root(genre_list, rules):
     return norm_tags[-1]
 
 
+def infer_roots_encoded(albums, rules):
+    """:func:`infer_root` for every album of a :class:`~tag_vocab.AlbumTags`.
+
+    Each distinct tag id is matched against the rules once; an album's root is
+    then the lowest rule index among its ids (same first-rule-wins semantics).
+    """
+    matcher = rules if isinstance(rules, GenreRoots) else GenreRoots(rules)
+    vocab = albums.vocab
+    unmatched = len(matcher)
+    rule_idx = np.array(
+        [unmatched if i is None else i for i in map(matcher.rule_index, vocab.norm)],
+        dtype=np.int64,
+    )
+    roots = []
+    for i in range(len(albums)):
+        ids = albums.ids(i)
+        if not len(ids):
+            roots.append("unknown")
+            continue
+        best = int(rule_idx[ids].min())
+        roots.append(matcher[best]["root"] if best < unmatched else vocab.norm[ids[-1]])
+    return roots
+
+
 def display_root(root):
     return root.replace("_", " ").title()
 
@@ -93,12 +165,24 @@ def genre_similarity_matrix(genre_lists, rules, root_weight):
     Each album contributes weight 1 per tag plus ``root_weight`` per (deduped)
     root family of its tags, so shared families dominate the similarity.
     """
+    matrix = root_feature_matrix(genre_lists, rules, root_weight)
+    if matrix.shape[1] == 0:
+        return np.zeros((len(genre_lists), len(genre_lists)))
+    return cosine_similarity(matrix)
+
+
+def root_feature_matrix(genre_lists, rules, root_weight, dtype=np.float64):
+    """Root-weighted tag feature matrix behind :func:`genre_similarity_matrix`.
+
+    Exposed separately so the similarity can be computed in blocks under a
+    memory budget (see ``similarity.blocked_cosine_similarity``).
+    """
     rows = []
     for sub in genre_lists:
         feats = {}
         roots_seen = set()
         for tag in sub:
-            t = _norm(tag)
+            t = normalize_tag(tag)
             if not t:
                 continue
             feats["tag:" + t] = feats.get("tag:" + t, 0.0) + 1.0
@@ -108,14 +192,41 @@ def genre_similarity_matrix(genre_lists, rules, root_weight):
         rows.append(feats)
 
     vocab = sorted({token for feats in rows for token in feats})
-    if not vocab:
-        return np.zeros((len(rows), len(rows)))
     index = {token: i for i, token in enumerate(vocab)}
-    matrix = np.zeros((len(rows), len(vocab)))
+    matrix = np.zeros((len(rows), len(vocab)), dtype=dtype)
     for i, feats in enumerate(rows):
         for token, value in feats.items():
             matrix[i, index[token]] = value
-    return cosine_similarity(matrix)
+    return matrix
+
+
+def encoded_root_features(albums, rules, root_weight, dtype=np.float64):
+    """Sparse root-weighted features for a :class:`~tag_vocab.AlbumTags`.
+
+    Same feature space as :func:`root_feature_matrix` (1 per tag, plus
+    ``root_weight`` per distinct root family), built from tag ids.
+    """
+    vocab = albums.vocab
+    root_ids = {}
+    tag_root = np.array(
+        [root_ids.setdefault(root_of(norm, rules), len(root_ids)) for norm in vocab.norm],
+        dtype=np.int64,
+    )
+    n_tags = len(vocab)
+    rows, cols, vals = [], [], []
+    for i in range(len(albums)):
+        ids = albums.ids(i)
+        rows.extend([i] * len(ids))
+        cols.extend(ids.tolist())
+        vals.extend([1.0] * len(ids))
+        fams = np.unique(tag_root[ids]) if len(ids) else []
+        rows.extend([i] * len(fams))
+        cols.extend((n_tags + fams).tolist() if len(fams) else [])
+        vals.extend([float(root_weight)] * len(fams))
+    return sparse.csr_matrix(
+        (np.asarray(vals, dtype=dtype), (rows, cols)),
+        shape=(len(albums), n_tags + len(root_ids)),
+    )
 
 
 # -----------------------------
@@ -136,23 +247,27 @@ SOURCE_WEIGHTS = {
 }
 
 
-def merge_consensus(collected, source_weights=None, keep_ratio=0.34, top_k=8):
+def merge_consensus(collected, source_weights=None, keep_ratio=0.34, top_k=8, vocab=None):
     """Merge tags from several providers by weighted vote.
 
     ``collected`` is a list of ``(source_label, tags)``. Each tag accrues its
     provider's weight; tags far below the top score are dropped (cuts
     single-source outliers) and the strongest ``top_k`` are returned, preserving
     a human-readable casing. Deterministic ordering (weight desc, then name).
+    With a run-wide :class:`~tag_vocab.TagVocabulary`, tags are keyed by their
+    interned id instead of being re-normalized for every album.
     """
     weights = source_weights if source_weights is not None else SOURCE_WEIGHTS
+    normalize = vocab.intern if vocab is not None else normalize_tag
+    name_of = (lambda k: vocab.norm[k]) if vocab is not None else (lambda k: k)
     acc = {}
     display = {}
     for source, tags in collected:
         weight = weights.get(source, 1.0)
         seen = set()
         for tag in tags:
-            key = _norm(tag)
-            if not key or key in seen:
+            key = normalize(tag)
+            if key is None or key == "" or key in seen:
                 continue
             seen.add(key)
             acc[key] = acc.get(key, 0.0) + weight
@@ -160,7 +275,7 @@ def merge_consensus(collected, source_weights=None, keep_ratio=0.34, top_k=8):
     if not acc:
         return []
     top = max(acc.values())
-    ranked = sorted(acc, key=lambda k: (-acc[k], k))
+    ranked = sorted(acc, key=lambda k: (-acc[k], name_of(k)))
     kept = [k for k in ranked if acc[k] >= top * keep_ratio][:top_k]
     return [display[k] for k in kept]
 
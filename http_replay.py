@@ -0,0 +1,354 @@
+"""Offline record / replay of the sorter's HTTP traffic.
+
+Every genre provider and both backends talk HTTP through ``requests``
+(spotipy and tidalapi included), so all of that traffic passes through
+``requests.adapters.HTTPAdapter.send``. This module hooks that one method:
+
+* :func:`recording` lets requests hit the live services and stores each
+  response in a :class:`CassetteStore` (one JSON file per host). Secret query
+  parameters (API keys, tokens) are stripped before anything is written,
+  request headers are never stored, and token and profile fields of JSON
+  response bodies (OAuth token responses, the user profile) are replaced by
+  ``REDACTED``, which the replayed authentication accepts like any token.
+* :func:`replaying` starts a local :class:`ReplayServer` and rewrites every
+  outgoing request to it. The server answers from the cassettes, optionally
+  adding latency and injecting 5xx errors or 429 rate-limit responses
+  (:class:`ReplayConfig`), deterministically for a given seed.
+
+Together they make enrichment and fetch runs reproducible without network,
+so concurrency, caching and rate-limit behaviour can be benchmarked. From the
+command line: ``python sorter.py --record-http DIR`` once, then
+``python sorter.py --replay-http DIR``.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from requests.adapters import HTTPAdapter
+
+SECRET_PARAMS = {
+    "token", "key", "api_key", "apikey", "access_token", "refresh_token",
+    "client_id", "client_secret", "code", "sessionid",
+}
+# JSON response fields (any depth, case-insensitive) never written to a cassette.
+SECRET_FIELDS = {
+    "access_token", "refresh_token", "id_token", "client_secret", "device_code",
+    "user_code", "sessionid", "session_id", "password", "email", "birthdate",
+    "username", "display_name", "firstname", "lastname", "fullname",
+}
+REDACTED = "REDACTED"
+# Response headers worth replaying (rate-limit hints, content type).
+KEPT_HEADERS = {"content-type", "retry-after", "x-discogs-ratelimit",
+                "x-discogs-ratelimit-remaining", "x-ratelimit-remaining"}
+REPLAY_PREFIX = "/_replay"
+
+_patch_lock = threading.Lock()
+
+
+def _body_bytes(body):
+    if body is None:
+        return b""
+    if isinstance(body, str):
+        return body.encode("utf-8")
+    if isinstance(body, (bytes, bytearray)):
+        return bytes(body)
+    return b""  # streamed bodies are not part of the key
+
+
+def _redact(value):
+    if isinstance(value, dict):
+        return {k: REDACTED if k.lower() in SECRET_FIELDS else _redact(v)
+                for k, v in value.items()}
+    if isinstance(value, list):
+        return [_redact(v) for v in value]
+    return value
+
+
+def redact_body(content):
+    """``content`` with :data:`SECRET_FIELDS` of a JSON body replaced by ``REDACTED``."""
+    try:
+        data = json.loads(content)
+    except ValueError:  # not JSON (or not UTF-8): nothing structured to redact
+        return content
+    redacted = _redact(data)
+    return content if redacted == data else json.dumps(redacted).encode("utf-8")
+
+
+def request_key(method, url, body=None):
+    """Return ``(key, canonical)`` for a request, ignoring secret parameters."""
+    parts = urlsplit(url)
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in SECRET_PARAMS
+    )
+    canonical = f"{method.upper()} {parts.scheme}://{parts.netloc}{parts.path}"
+    if query:
+        canonical += "?" + urlencode(query)
+    payload = _body_bytes(body)
+    if payload:
+        canonical += " body:" + hashlib.sha1(payload).hexdigest()
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest(), canonical
+
+
+# -----------------------------------------------------------------------------
+#  Cassettes
+# -----------------------------------------------------------------------------
+class CassetteStore:
+    """Recorded responses, one ``<host>.json`` file per service host."""
+
+    def __init__(self, directory):
+        self.directory = os.path.expanduser(directory)
+        self._hosts = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def _host_file(self, host):
+        safe = "".join(c if c.isalnum() or c in ".-" else "_" for c in host)
+        return os.path.join(self.directory, f"{safe}.json")
+
+    def _entries(self, host):
+        if host not in self._hosts:
+            try:
+                with open(self._host_file(host), "r", encoding="utf-8") as fh:
+                    data = json.load(fh)
+            except (OSError, ValueError):
+                data = {}
+            self._hosts[host] = data if isinstance(data, dict) else {}
+        return self._hosts[host]
+
+    def get(self, method, url, body=None):
+        key, _ = request_key(method, url, body)
+        with self._lock:
+            return self._entries(urlsplit(url).netloc).get(key)
+
+    def put(self, method, url, body, status, headers, content):
+        key, canonical = request_key(method, url, body)
+        entry = {
+            "request": canonical,
+            "status": int(status),
+            "headers": {k: v for k, v in (headers or {}).items()
+                        if k.lower() in KEPT_HEADERS},
+        }
+        content = redact_body(content)
+        try:
+            entry["body"] = content.decode("utf-8")
+        except UnicodeDecodeError:
+            entry["body_b64"] = base64.b64encode(content).decode("ascii")
+        host = urlsplit(url).netloc
+        with self._lock:
+            self._entries(host)[key] = entry
+            self._dirty.add(host)
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._hosts.values())
+
+    def save(self):
+        with self._lock:
+            for host in sorted(self._dirty):
+                try:
+                    os.makedirs(self.directory, exist_ok=True)
+                    fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+                    with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                        json.dump(self._hosts[host], fh, indent=1, sort_keys=True)
+                    os.replace(tmp, self._host_file(host))
+                except OSError as exc:
+                    print(f"⚠️ Could not write HTTP cassette for {host} ({exc}).",
+                          file=sys.stderr)
+            self._dirty.clear()
+
+
+def entry_body(entry):
+    if "body_b64" in entry:
+        return base64.b64decode(entry["body_b64"])
+    return entry.get("body", "").encode("utf-8")
+
+
+# -----------------------------------------------------------------------------
+#  Adapter hook
+# -----------------------------------------------------------------------------
+@contextmanager
+def _patched_send(make_send):
+    with _patch_lock:
+        original = HTTPAdapter.send
+        HTTPAdapter.send = make_send(original)
+    try:
+        yield
+    finally:
+        with _patch_lock:
+            HTTPAdapter.send = original
+
+
+@contextmanager
+def recording(directory):
+    """Record every HTTP response made through ``requests`` into ``directory``."""
+    store = CassetteStore(directory)
+
+    def make_send(original):
+        def send(adapter, request, **kwargs):
+            response = original(adapter, request, **kwargs)
+            store.put(request.method, request.url, request.body,
+                      response.status_code, response.headers, response.content)
+            return response
+        return send
+
+    try:
+        with _patched_send(make_send):
+            yield store
+    finally:
+        store.save()
+
+
+# -----------------------------------------------------------------------------
+#  Replay server
+# -----------------------------------------------------------------------------
+class ReplayConfig:
+    """Latency and fault injection for the replay server.
+
+    ``latency_ms`` (+ uniform ``jitter_ms``) is added to every response;
+    ``error_rate`` and ``rate_limit_rate`` are the probabilities of answering
+    with a 503 or a 429 (with ``Retry-After: retry_after``) instead of the
+    recording. ``per_host`` maps a host to a dict of overrides.
+    """
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, rate_limit_rate=0.0,
+                 retry_after=1, seed=0, per_host=None):
+        self.latency_ms = float(latency_ms)
+        self.jitter_ms = float(jitter_ms)
+        self.error_rate = float(error_rate)
+        self.rate_limit_rate = float(rate_limit_rate)
+        self.retry_after = retry_after
+        self.seed = seed
+        self.per_host = dict(per_host or {})
+
+    def for_host(self, host):
+        overrides = self.per_host.get(host)
+        if not overrides:
+            return self
+        values = {k: getattr(self, k) for k in
+                  ("latency_ms", "jitter_ms", "error_rate", "rate_limit_rate", "retry_after")}
+        values.update(overrides)
+        return ReplayConfig(seed=self.seed, **values)
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """Local stand-in answering rewritten requests from a :class:`CassetteStore`."""
+
+    daemon_threads = True
+
+    def __init__(self, store, config=None, address=("127.0.0.1", 0)):
+        super().__init__(address, _ReplayHandler)
+        self.store = store
+        self.config = config or ReplayConfig()
+        self._rng = random.Random(self.config.seed)
+        self._rng_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "errors": 0, "rate_limited": 0}
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{REPLAY_PREFIX}"
+
+    def rewrite(self, url):
+        """Map a live URL onto this server (scheme and host become path parts)."""
+        parts = urlsplit(url)
+        rewritten = f"{self.base_url}/{parts.scheme}/{parts.netloc}{parts.path or '/'}"
+        return rewritten + (f"?{parts.query}" if parts.query else "")
+
+    def original_url(self, path):
+        rest = path[len(REPLAY_PREFIX) + 1:]
+        scheme, _, rest = rest.partition("/")
+        netloc, _, tail = rest.partition("/")
+        tail, _, query = tail.partition("?")
+        return f"{scheme}://{netloc}/{tail}" + (f"?{query}" if query else "")
+
+    def draw(self):
+        with self._rng_lock:
+            return self._rng.random(), self._rng.random()
+
+    def count(self, name):
+        with self._rng_lock:
+            self.stats[name] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _handle(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else None
+        url = server.original_url(self.path)
+        config = server.config.for_host(urlsplit(url).netloc)
+        fault, jitter = server.draw()
+        delay = config.latency_ms + jitter * config.jitter_ms
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        if fault < config.rate_limit_rate:
+            server.count("rate_limited")
+            return self._reply(429, {"Retry-After": str(config.retry_after)}, b"{}")
+        if fault < config.rate_limit_rate + config.error_rate:
+            server.count("errors")
+            return self._reply(503, {}, b"{}")
+        entry = server.store.get(self.command, url, body)
+        if entry is None:
+            server.count("misses")
+            return self._reply(404, {"Content-Type": "application/json",
+                                     "X-Replay-Miss": "1"},
+                               json.dumps({"error": "not recorded"}).encode())
+        server.count("hits")
+        self._reply(entry["status"], entry.get("headers", {}), entry_body(entry))
+
+    def _reply(self, status, headers, content):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_PATCH = _handle
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def replaying(directory, config=None):
+    """Serve recorded responses locally and route all ``requests`` traffic there."""
+    server = ReplayServer(CassetteStore(directory), config).start()
+
+    def make_send(original):
+        def send(adapter, request, **kwargs):
+            if not request.url.startswith(server.base_url):
+                request = request.copy()
+                request.url = server.rewrite(request.url)
+            return original(adapter, request, **kwargs)
+        return send
+
+    try:
+        with _patched_send(make_send):
+            yield server
+    finally:
+        server.stop()
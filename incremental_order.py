@@ -0,0 +1,167 @@
+"""Incremental re-ordering: splice library changes into the previous order.
+
+A full ordering pass (MST + silhouette search + chaining) reorders the whole
+library from scratch, so liking five new songs can move thousands of tracks.
+In incremental mode the previous run's album order is persisted; on the next
+run removed albums are simply dropped, and each new album is inserted at the
+cheapest point of its root family's block (the position that maximises
+``sim(prev, new) + sim(new, next) - sim(prev, next)``). Albums of a root family
+not seen before open a new block at the best seam between blocks.
+
+Only ``O(new * n)`` tag-set similarities are computed. The state also keeps
+a signature of every album as of the last full rebuild; when the library has
+drifted too far from that baseline (too many additions, removals or
+re-classified albums, summed over all incremental runs since) the caller
+falls back to a full rebuild.
+"""
+
+import hashlib
+import json
+import math
+import os
+import sys
+import tempfile
+
+STATE_VERSION = 2
+DEFAULT_DRIFT_THRESHOLD = 0.25
+
+
+def default_state_path(service_key, source_slug):
+    return os.path.join(
+        os.path.expanduser("~"), ".cache", "likes_songs_sorter", "order_state",
+        f"{service_key}_{source_slug}.json",
+    )
+
+
+def load_order_state(path):
+    """Return the stored state dict, or ``None`` when missing/unreadable."""
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get("version") != STATE_VERSION:
+        return None
+    if not isinstance(data.get("albums"), list):
+        return None
+    return data
+
+
+def album_signature(root, tags):
+    """Short hash of an album's root and normalized tag set."""
+    payload = "\x1f".join([str(root)] + sorted(tags))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def state_baseline(state):
+    """``{album: signature}`` as of the last full rebuild recorded in ``state``."""
+    baseline = (state or {}).get("baseline")
+    if isinstance(baseline, dict):
+        return baseline
+    # No baseline stored: the stored order is its own baseline.
+    return {a.get("album"): album_signature(a.get("root"), a.get("tags", []))
+            for a in (state or {}).get("albums", []) if isinstance(a, dict)}
+
+
+def save_order_state(path, ordering, ordering_mode, baseline=None):
+    """Persist the album order from an ``ordering`` frame (sorted by position).
+
+    ``ordering`` carries each album's normalized tags in its ``Tags`` column.
+    ``baseline`` is the :func:`state_baseline` to keep; ``None`` (after a full
+    rebuild) makes this order the new baseline.
+    """
+    ordered = ordering.sort_values("Sort Order")
+    albums = [
+        {"album": str(name), "root": root, "tags": sorted(tags)}
+        for name, root, tags in zip(
+            ordered["Unique Album"], ordered["Root Genre"], ordered["Tags"]
+        )
+    ]
+    if baseline is None:
+        baseline = {a["album"]: album_signature(a["root"], a["tags"]) for a in albums}
+    state = {"version": STATE_VERSION, "mode": ordering_mode, "albums": albums,
+             "baseline": baseline}
+    try:
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            json.dump(state, fh)
+        os.replace(tmp, path)
+    except OSError as exc:
+        print(f"⚠️ Could not write ordering state ({exc}).", file=sys.stderr)
+
+
+def tag_cosine(a, b):
+    """Cosine similarity of two binary tag sets (same as one-hot cosine)."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / math.sqrt(len(a) * len(b))
+
+
+def _insertion_gain(order, pos, new, tags):
+    prev = tags[order[pos - 1]] if pos > 0 else None
+    nxt = tags[order[pos]] if pos < len(order) else None
+    gain = 0.0
+    if prev is not None:
+        gain += tag_cosine(prev, tags[new])
+    if nxt is not None:
+        gain += tag_cosine(tags[new], nxt)
+    if prev is not None and nxt is not None:
+        gain -= tag_cosine(prev, nxt)
+    return gain
+
+
+def plan_incremental_order(state, names, tag_sets, roots,
+                           drift_threshold=DEFAULT_DRIFT_THRESHOLD):
+    """Splice the current albums into the stored order.
+
+    ``names``, ``tag_sets`` (lowercase tag sets) and ``roots`` (display roots)
+    describe the current library. Returns ``(order, stats)``; ``order`` is
+    ``None`` when a full rebuild is needed (no usable state, or drift above
+    ``drift_threshold``). ``stats`` reports ``added`` and ``removed`` (against
+    the stored order) and ``drift``: albums added, removed or changed since the
+    last full rebuild, as a fraction of that rebuild's album count.
+    """
+    previous = [a for a in (state or {}).get("albums", []) if isinstance(a, dict)]
+    current = {
+        name: (root, frozenset(tags)) for name, root, tags in zip(names, roots, tag_sets)
+    }
+    kept, removed = [], 0
+    for album in previous:
+        name = album.get("album")
+        entry = current.get(name)
+        if entry is not None and entry == (album.get("root"), frozenset(album.get("tags", []))):
+            kept.append(name)
+        else:
+            removed += 1
+    kept_set = set(kept)
+    added = [name for name in names if name not in kept_set]
+    baseline = state_baseline(state)
+    unchanged = sum(1 for name, (root, tags) in current.items()
+                    if baseline.get(name) == album_signature(root, tags))
+    drift = (len(current) - unchanged + len(baseline) - unchanged) / max(len(baseline), 1)
+    stats = {"added": len(added), "removed": removed, "drift": drift}
+    if not previous or drift > drift_threshold:
+        return None, stats
+
+    tags = {name: entry[1] for name, entry in current.items()}
+    root_of = {name: entry[0] for name, entry in current.items()}
+    order = list(kept)
+    # Deterministic insertion order: by root family, then album name.
+    for new in sorted(added, key=lambda n: (root_of[n], n)):
+        root = root_of[new]
+        candidates = [
+            pos for pos in range(len(order) + 1)
+            if (pos > 0 and root_of[order[pos - 1]] == root)
+            or (pos < len(order) and root_of[order[pos]] == root)
+        ]
+        if not candidates:
+            # New family: open a block at a seam between two blocks.
+            candidates = [
+                pos for pos in range(len(order) + 1)
+                if pos in (0, len(order)) or root_of[order[pos - 1]] != root_of[order[pos]]
+            ]
+        best = max(candidates, key=lambda pos: (_insertion_gain(order, pos, new, tags), -pos))
+        order.insert(best, new)
+    return order, stats
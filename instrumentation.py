@@ -0,0 +1,290 @@
+"""Per-stage timing and profiling for a sorter run (``sorter.py --profile``).
+
+Pipeline code marks its stages with :func:`stage`::
+
+    with stage("fetch.liked") as s:
+        rows = backend.get_liked_songs()
+        s.items = len(rows)
+
+Without an active :class:`Profiler` that is a shared no-op. With one, every
+stage name accumulates calls, wall time, CPU time, traced peak memory
+(``tracemalloc``; nested stages fold into their parent) and item counts, and
+the run ends with a JSON report. Stages opened with ``capture=True`` (the
+ordering stage) can additionally be dumped as a cProfile ``.pstats`` file
+and/or a flame-graph-compatible collapsed-stack file produced by sampling the
+main thread.
+"""
+
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+CAPTURE_MODES = ("pstats", "collapsed")
+
+_active = None
+
+
+class StageRecord:
+    """Accumulated measurements for one stage name."""
+
+    __slots__ = ("name", "calls", "wall_s", "cpu_s", "peak_bytes", "items")
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall_s = 0.0
+        self.cpu_s = 0.0
+        self.peak_bytes = None
+        self.items = None
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class _NullStage:
+    items = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, profiler, name, items, capture):
+        self.profiler = profiler
+        self.name = name
+        self.items = items
+        self.capture = capture
+        self.child_peak = 0
+        self._wall = self._cpu = None
+        self._capturers = []
+
+    def __enter__(self):
+        self.profiler._enter(self)
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._exit(self)
+        return False
+
+
+class _StackSampler:
+    """Sample one thread's Python stack at a fixed interval (collapsed format)."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def stop(self, path):
+        self._stop.set()
+        self._thread.join()
+        with open(path, "w", encoding="utf-8") as fh:
+            for stack, count in self.counts.most_common():
+                fh.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    """Collect stage measurements for one run; see the module docstring.
+
+    ``capture`` is a subset of :data:`CAPTURE_MODES` applied to stages opened
+    with ``capture=True``; artifacts and the report go to ``output_dir`` as
+    ``<prefix>.json``, ``<prefix>.<stage>.pstats`` and
+    ``<prefix>.<stage>.collapsed``.
+    """
+
+    def __init__(self, output_dir=".", prefix="profile", trace_memory=True, capture=(),
+                 sample_interval=0.005):
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.trace_memory = trace_memory
+        self.capture = tuple(capture)
+        self.sample_interval = sample_interval
+        self.records = {}
+        self.notes = {}
+        self.artifacts = {}
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self._stack = []
+        self._thread = threading.current_thread()
+        self._started_tracing = False
+        self._t0 = time.perf_counter()
+
+    # --- activation -------------------------------------------------------------
+    def __enter__(self):
+        global _active
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._thread = threading.current_thread()
+        self._t0 = time.perf_counter()
+        _active = self
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        _active = None
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        return False
+
+    # --- stages -----------------------------------------------------------------
+    def stage(self, name, items=None, capture=False):
+        return _Stage(self, name, items, capture)
+
+    def note(self, key, value):
+        """Attach a run-level value (counts, settings) to the report."""
+        self.notes[key] = value
+
+    def _tracing(self):
+        return self.trace_memory and tracemalloc.is_tracing()
+
+    def _enter(self, stage):
+        if stage.name not in self.records:  # report stages in first-entry order
+            self.records[stage.name] = StageRecord(stage.name)
+        if self._tracing():
+            current = tracemalloc.get_traced_memory()[1]
+            if self._stack:
+                parent = self._stack[-1]
+                parent.child_peak = max(parent.child_peak, current)
+            tracemalloc.reset_peak()
+        self._stack.append(stage)
+        if stage.capture:
+            self._start_capture(stage)
+        stage._wall = time.perf_counter()
+        stage._cpu = time.process_time()
+
+    def _exit(self, stage):
+        wall = time.perf_counter() - stage._wall
+        cpu = time.process_time() - stage._cpu
+        if stage._capturers:
+            self._stop_capture(stage)
+        peak = None
+        if self._tracing():
+            peak = max(tracemalloc.get_traced_memory()[1], stage.child_peak)
+            tracemalloc.reset_peak()
+        self._stack.pop()
+        if peak is not None and self._stack:
+            parent = self._stack[-1]
+            parent.child_peak = max(parent.child_peak, peak)
+
+        record = self.records[stage.name]
+        record.calls += 1
+        record.wall_s += wall
+        record.cpu_s += cpu
+        if peak is not None:
+            record.peak_bytes = max(record.peak_bytes or 0, peak)
+        if stage.items is not None:
+            record.items = (record.items or 0) + stage.items
+
+    def _artifact_path(self, stage, extension):
+        os.makedirs(self.output_dir, exist_ok=True)
+        return os.path.join(self.output_dir, f"{self.prefix}.{stage.name}.{extension}")
+
+    def _start_capture(self, stage):
+        if "collapsed" in self.capture:
+            sampler = _StackSampler(threading.get_ident(), self.sample_interval)
+            sampler.start()
+            stage._capturers.append(("collapsed", sampler))
+        if "pstats" in self.capture:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:  # another profiler is already active
+                return
+            stage._capturers.append(("pstats", profile))
+
+    def _stop_capture(self, stage):
+        for kind, capturer in stage._capturers:  # sampler first: keep dumps out of it
+            path = self._artifact_path(stage, kind)
+            try:
+                if kind == "pstats":
+                    capturer.disable()
+                    capturer.dump_stats(path)
+                else:
+                    capturer.stop(path)
+            except OSError as exc:
+                print(f"⚠️ Could not write {kind} profile for {stage.name} ({exc}).",
+                      file=sys.stderr)
+                continue
+            self.artifacts[f"{stage.name}.{kind}"] = path
+        stage._capturers = []
+
+    # --- report -----------------------------------------------------------------
+    def report(self):
+        return {
+            "started": self.started,
+            "total_wall_s": time.perf_counter() - self._t0,
+            "trace_memory": self.trace_memory,
+            "stages": [record.as_dict() for record in self.records.values()],
+            "notes": self.notes,
+            "artifacts": self.artifacts,
+        }
+
+    def write(self, path=None):
+        """Write the JSON report; returns its path (``None`` if it failed)."""
+        path = path or os.path.join(self.output_dir, f"{self.prefix}.json")
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as fh:
+                json.dump(self.report(), fh, indent=2, default=str)
+        except OSError as exc:
+            print(f"⚠️ Could not write the profile report ({exc}).", file=sys.stderr)
+            return None
+        return path
+
+    def print_summary(self):
+        print("\n⏱️  Stage timings:")
+        width = max((len(name) + 2 * name.count(".") for name in self.records), default=0)
+        for record in self.records.values():
+            depth = record.name.count(".")
+            peak = (f"  peak {record.peak_bytes / (1024 * 1024):7.1f} MB"
+                    if record.peak_bytes is not None else "")
+            items = f"  {record.items} items" if record.items is not None else ""
+            calls = f" ×{record.calls}" if record.calls > 1 else ""
+            print(f"   {'  ' * depth}{record.name:<{width - 2 * depth}} "
+                  f"{record.wall_s:8.3f}s wall {record.cpu_s:8.3f}s cpu{peak}{items}{calls}")
+
+
+def stage(name, items=None, capture=False):
+    """Context manager timing ``name`` on the active profiler (no-op without one)."""
+    profiler = _active
+    if profiler is None or threading.current_thread() is not profiler._thread:
+        return _NULL_STAGE
+    return profiler.stage(name, items, capture)
+
+
+def note(key, value):
+    if _active is not None:
+        _active.note(key, value)
+
+
+def active():
+    return _active
@@ -0,0 +1,121 @@
+"""Persistent index of albums that no provider could resolve.
+
+Many obscure albums come back "None" from every provider, and each retry
+after ``negative_ttl_hours`` runs the whole provider chain again, timeouts
+included. :class:`NegativeIndex` counts consecutive misses per album and is
+stored next to the genre cache. The index is compact: each entry is a 64-bit
+hash of the cache key, a miss count and the time of the last miss, about
+14 bytes on disk.
+
+Two things use the counts:
+
+* the resolver caches a repeat miss for ``negative_ttl * 2 ** (misses - 1)``
+  (capped at ``max_backoff``) instead of the flat negative TTL, so doomed
+  albums are retried less and less often;
+* the enrichment stage resolves albums with ``defer_after`` or more misses
+  last, under their own time budget, so the run's critical path goes to
+  albums that can actually be resolved.
+
+An album that resolves is dropped from the index.
+"""
+
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_INDEX_FILE = os.path.join("~", ".cache", "likes_songs_sorter", "negative_index.npz")
+DEFAULT_BACKOFF_MAX_DAYS = 30
+DEFAULT_DEFER_AFTER = 2
+DEFAULT_DEFERRED_BUDGET_S = 120
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class NegativeIndex:
+    """Consecutive-miss counts per album cache key, persisted as compact arrays."""
+
+    def __init__(self, path=None, max_backoff_days=DEFAULT_BACKOFF_MAX_DAYS,
+                 defer_after=DEFAULT_DEFER_AFTER, clock=time.time):
+        self.path = os.path.expanduser(path or DEFAULT_INDEX_FILE)
+        self.max_backoff = int(max_backoff_days * 86400)
+        self.defer_after = int(defer_after)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._entries = self._load()  # key hash -> (misses, last miss unix time)
+
+    def _load(self):
+        try:
+            with np.load(self.path) as data:
+                return {int(h): (int(m), int(t))
+                        for h, m, t in zip(data["hashes"], data["misses"], data["last"])}
+        except (OSError, ValueError, KeyError):
+            return {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def misses(self, key):
+        return self._entries.get(_hash(key), (0, 0))[0]
+
+    def record_miss(self, key):
+        """Count a miss for ``key``; returns its consecutive-miss count."""
+        h = _hash(key)
+        with self._lock:
+            misses = min(self._entries.get(h, (0, 0))[0] + 1, np.iinfo(np.uint16).max)
+            self._entries[h] = (misses, int(self._clock()))
+            self._dirty = True
+        return misses
+
+    def clear(self, key):
+        """Forget ``key`` (it resolved)."""
+        with self._lock:
+            if self._entries.pop(_hash(key), None) is not None:
+                self._dirty = True
+
+    def backoff_ttl(self, misses, base):
+        """Negative-cache TTL (seconds) after ``misses`` consecutive misses."""
+        return int(min(base * 2 ** max(misses - 1, 0), max(self.max_backoff, base)))
+
+    def is_deferred(self, key):
+        return self.misses(key) >= self.defer_after > 0
+
+    def save(self):
+        """Write the index if it changed, dropping entries idle for twice the max backoff."""
+        if not self._dirty:
+            return
+        horizon = self._clock() - 2 * self.max_backoff
+        with self._lock:
+            items = [(h, m, t) for h, (m, t) in self._entries.items() if t >= horizon]
+            self._dirty = False
+        hashes = np.array([h for h, _, _ in items], dtype=np.uint64)
+        misses = np.array([m for _, m, _ in items], dtype=np.uint16)
+        last = np.array([t for _, _, t in items], dtype=np.uint32)
+        directory = os.path.dirname(self.path) or "."
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".npz")
+            with os.fdopen(fd, "wb") as fh:
+                np.savez_compressed(fh, hashes=hashes, misses=misses, last=last)
+            os.replace(tmp, self.path)
+        except OSError as exc:
+            print(f"⚠️ Could not save the negative-lookup index ({exc}).", file=sys.stderr)
+
+
+def build_negative_index_from_config(config, disabled=False):
+    """A :class:`NegativeIndex` from ``[CACHE]`` settings (``None`` when disabled)."""
+    if disabled or not config.getboolean("CACHE", "negative_index", fallback=True):
+        return None
+    return NegativeIndex(
+        config.get("CACHE", "negative_index_file", fallback=None) or None,
+        max_backoff_days=float(config.get("CACHE", "negative_backoff_max_days",
+                                          fallback=DEFAULT_BACKOFF_MAX_DAYS)),
+        defer_after=int(config.get("CACHE", "defer_after_misses", fallback=DEFAULT_DEFER_AFTER)),
+    )
@@ -0,0 +1,169 @@
+"""Local-search refinement (2-opt / Or-opt) of a finished album order.
+
+The chains built by ``greedy_chain`` and ``_nearest_neighbor_order`` are
+nearest-neighbour heuristics: each step is locally greedy, so the order often
+leaves easy adjacent-similarity gains on the table. This module post-optimises
+an order by maximising the sum of adjacent similarities with two classic moves:
+
+* **2-opt** — reverse a segment ``[i..j]`` (rewires two edges);
+* **Or-opt** — move a short segment (1-3 albums) elsewhere, optionally reversed.
+
+Moves never cross a block boundary (a block is a maximal run of one root
+family in the order), so root-family contiguity is preserved exactly. The
+album just outside each block stays fixed and still counts towards the
+objective, so seams are optimised too. Gains for all candidate partners of a
+move are evaluated at once with NumPy, and the whole pass respects a wall
+clock budget.
+"""
+
+import time
+
+import numpy as np
+
+_EPS = 1e-9
+_MAX_SEGMENT = 3
+
+
+def root_blocks(roots_in_order):
+    """Return ``(start, stop)`` spans of maximal same-root runs."""
+    blocks = []
+    start = 0
+    for k in range(1, len(roots_in_order) + 1):
+        if k == len(roots_in_order) or roots_in_order[k] != roots_in_order[start]:
+            blocks.append((start, k))
+            start = k
+    return blocks
+
+
+def path_score(order, sim):
+    """Sum of similarities between consecutive entries of ``order``."""
+    if len(order) < 2:
+        return 0.0
+    order = np.asarray(order)
+    return float(np.sum(sim[order[:-1], order[1:]]))
+
+
+class _Block:
+    """One block with its fixed neighbours, as a padded local sub-problem.
+
+    Position 0 and the last position hold the neighbouring albums (or a
+    zero-similarity sentinel at the ends of the order) and never move.
+    """
+
+    def __init__(self, order, sim, start, stop):
+        k = stop - start
+        idx = list(order[start:stop])
+        left = [order[start - 1]] if start > 0 else []
+        right = [order[stop]] if stop < len(order) else []
+        local = left + idx + right
+        sub = np.zeros((k + 2, k + 2))
+        off = 0 if left else 1
+        sub[off:off + len(local), off:off + len(local)] = sim[np.ix_(local, local)]
+        self.start, self.stop = start, stop
+        self.sim = sub
+        self.labels = idx
+        # p[0] / p[-1] are the fixed context slots.
+        self.p = np.arange(k + 2)
+
+    def edges(self):
+        p = self.p
+        return self.sim[p[:-1], p[1:]]
+
+    def two_opt_sweep(self, deadline, time_fn):
+        moves = 0
+        m = len(self.p)
+        for i in range(1, m - 2):
+            if time_fn() > deadline:
+                break
+            p, S = self.p, self.sim
+            e = self.edges()
+            js = np.arange(i + 1, m - 1)
+            gain = (S[p[i - 1], p[js]] + S[p[i], p[js + 1]]
+                    - e[i - 1] - e[js])
+            best = int(np.argmax(gain))
+            if gain[best] > _EPS:
+                j = int(js[best])
+                self.p[i:j + 1] = self.p[i:j + 1][::-1]
+                moves += 1
+        return moves
+
+    def or_opt_sweep(self, deadline, time_fn):
+        moves = 0
+        m = len(self.p)
+        for length in range(1, _MAX_SEGMENT + 1):
+            i = 1
+            while i + length - 1 <= m - 2:
+                if time_fn() > deadline:
+                    return moves
+                if self._try_move(i, length):
+                    moves += 1
+                i += 1
+        return moves
+
+    def _try_move(self, i, length):
+        p, S = self.p, self.sim
+        m = len(p)
+        first, last = p[i], p[i + length - 1]
+        prev, nxt = p[i - 1], p[i + length]
+        removal_loss = S[prev, first] + S[last, nxt] - S[prev, nxt]
+        e = self.edges()
+        ks = np.concatenate([np.arange(0, i - 1), np.arange(i + length, m - 1)])
+        if ks.size == 0:
+            return False
+        xs, ys = p[ks], p[ks + 1]
+        forward = S[xs, first] + S[last, ys] - e[ks]
+        backward = S[xs, last] + S[first, ys] - e[ks]
+        gains = np.maximum(forward, backward) - removal_loss
+        best = int(np.argmax(gains))
+        if gains[best] <= _EPS:
+            return False
+        k = int(ks[best])
+        segment = p[i:i + length].copy()
+        if backward[best] > forward[best]:
+            segment = segment[::-1]
+        rest = np.concatenate([p[:i], p[i + length:]])
+        at = k + 1 if k < i else k + 1 - length
+        self.p = np.concatenate([rest[:at], segment, rest[at:]])
+        return True
+
+    def result(self):
+        return [self.labels[j - 1] for j in self.p[1:-1]]
+
+
+def refine_order(order, sim, roots_in_order, time_budget_ms, time_fn=time.perf_counter):
+    """Improve ``order`` (row indices into ``sim``) within each root block.
+
+    Runs 2-opt and Or-opt sweeps round-robin over the blocks until no move
+    improves the objective or ``time_budget_ms`` elapses. Returns
+    ``(new_order, stats)`` where ``stats`` has ``moves``, ``ms`` and the
+    objective ``before`` / ``after``.
+    """
+    order = list(order)
+    started = time_fn()
+    deadline = started + max(0.0, float(time_budget_ms)) / 1000.0
+    before = path_score(order, sim)
+    moves = 0
+    spans = [span for span in root_blocks(roots_in_order) if span[1] - span[0] >= 2]
+    active = list(spans)
+    while active and time_fn() <= deadline:
+        still_improving = []
+        for start, stop in active:
+            # Rebuild from the current order so neighbouring blocks' moves
+            # (which may change this block's context albums) are seen.
+            block = _Block(order, sim, start, stop)
+            made = block.two_opt_sweep(deadline, time_fn)
+            made += block.or_opt_sweep(deadline, time_fn)
+            if made:
+                order[start:stop] = block.result()
+                moves += made
+                still_improving.append((start, stop))
+            if time_fn() > deadline:
+                break
+        active = still_improving
+    stats = {
+        "moves": moves,
+        "ms": (time_fn() - started) * 1000.0,
+        "before": before,
+        "after": path_score(order, sim),
+    }
+    return order, stats
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""Fill the genre cache ahead of time, without the interactive session.
+
+Genre enrichment is the slow part of a run. ``prewarm.py`` resolves the genres
+of a library off-hours — from previous ``*_sorted_*.csv`` exports (they carry
+``Artist``, ``Album``, ``Album ID`` and the track id) or, without CSVs, from
+the service's liked songs — on a thread pool, writing each album to the cache
+as soon as it is resolved. It groups albums and builds cache keys exactly like
+the sorter, so a later ``sorter.py --cache-only`` run is served entirely from
+the cache.
+
+Albums already in the cache (including recent "not found" results) are
+skipped, so an interrupted prewarm resumes where it stopped when run again.
+
+Usage:
+    python prewarm.py --service spotify spotify_liked_sorted_2026-06-29.csv
+    python prewarm.py --service tidal --workers 8
+"""
+
+import argparse
+import configparser
+import csv
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from tqdm import tqdm
+
+
+def load_tracks(paths, track_type):
+    """Read sorted-CSV exports into ``track_type`` records."""
+    tracks = []
+    for path in paths:
+        with open(path, newline="", encoding="utf-8") as fh:
+            for row in csv.DictReader(fh):
+                track = track_type(
+                    row.get("Song") or "",
+                    row.get("Artist") or "",
+                    row.get("Album") or "",
+                    album_id=row.get("Album ID") or None,
+                    track_id=row.get(track_type.TRACK_ID_COLUMN) or None,
+                )
+                if "Is Local" in row:
+                    track.is_local = row["Is Local"].strip().lower() == "true"
+                tracks.append(track)
+    return tracks
+
+
+def prewarm(backend, config, cache, tracks, workers=4, progress=True):
+    """Resolve and cache the genres of every album in ``tracks`` missing from ``cache``.
+
+    Returns a summary dict (albums, cached, found, not_found, failed, seconds).
+    """
+    import sorter_core
+    from album_identity import album_identity
+    from negative_index import build_negative_index_from_config
+    from provider_metrics import ProviderMetrics
+    from tracks import dedupe_tracks, tracks_frame
+
+    tracks = dedupe_tracks(tracks)
+    resolution = sorter_core._resolution_from_config(config)
+    identity = album_identity(tracks_frame(tracks))
+    cache.prefetch(sorter_core._resolver_cache_key(k, resolution) for k in identity.cache_keys)
+    pending = [
+        g for g in range(len(identity))
+        if cache.get(sorter_core._resolver_cache_key(identity.cache_keys[g], resolution)) is None
+    ]
+    summary = {"albums": len(identity), "cached": len(identity) - len(pending),
+               "found": 0, "not_found": 0, "failed": 0, "seconds": 0.0}
+    print(f"🗃️  {summary['albums']} albums, {summary['cached']} already cached, "
+          f"{len(pending)} to resolve (resolution: {resolution}).")
+    if not pending:
+        return summary
+
+    metrics = ProviderMetrics()
+    breakers = sorter_core._breakers_from_config(config)
+    negatives = build_negative_index_from_config(config)
+    if negatives is not None:
+        # Albums that keep missing go last.
+        pending.sort(key=lambda g: negatives.misses(
+            sorter_core._resolver_cache_key(identity.cache_keys[g], resolution)))
+    resolve = sorter_core._make_genre_resolver(
+        backend, config, cache, resolution=resolution, metrics=metrics, breakers=breakers,
+        service=backend.key, negatives=negatives,
+    )
+    start = time.perf_counter()
+    backend.prefetch_genres([tracks[identity.first[g]] for g in pending], config)
+
+    def resolve_group(g):
+        row = identity.first[g]
+        track = tracks[row]
+        return resolve(track.song, track.artist, track.album, track.album_id, track.track_id,
+                       clean_name=identity.clean_names[row], cache_key=identity.cache_keys[g])
+
+    executor = ThreadPoolExecutor(max(1, workers), thread_name_prefix="prewarm")
+    futures = [executor.submit(resolve_group, g) for g in pending]
+    try:
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Prewarm",
+                           unit="album", disable=not progress):
+            try:
+                genres, _ = future.result()
+            except Exception as exc:
+                summary["failed"] += 1
+                print(f"⚠️ Lookup failed ({exc}).", file=sys.stderr)
+                continue
+            summary["found" if genres else "not_found"] += 1
+    except KeyboardInterrupt:
+        for future in futures:
+            future.cancel()
+        print("\n⏸️  Interrupted; run prewarm again to resume.", file=sys.stderr)
+        raise
+    finally:
+        executor.shutdown(wait=True)
+        backend.finish_genres()
+        cache.close()
+        if negatives is not None:
+            negatives.save()
+        summary["seconds"] = time.perf_counter() - start
+
+    print(f"\n✅ Prewarmed {summary['found'] + summary['not_found']} albums in "
+          f"{summary['seconds']:.0f}s: {summary['found']} with genres, "
+          f"{summary['not_found']} not found, {summary['failed']} failed.")
+    metrics.print_report()
+    if breakers is not None:
+        breakers.print_report()
+    return summary
+
+
+def main():
+    from backends import BACKENDS
+    from genre_cache import build_cache_from_config
+
+    parser = argparse.ArgumentParser(description="Fill the genre cache from a library export.")
+    parser.add_argument("csv", nargs="*",
+                        help="Sorted CSV exports to read albums from (default: fetch the "
+                             "service's liked songs).")
+    parser.add_argument("--service", choices=list(BACKENDS), required=True,
+                        help="Streaming service whose genre providers to use.")
+    parser.add_argument("--config", default="settings.ini", help="Path to settings.ini")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Albums resolved concurrently (default: 4).")
+    args = parser.parse_args()
+
+    config = configparser.ConfigParser()
+    config.read(args.config)
+    cache = build_cache_from_config(config)
+    if not cache.enabled:
+        print("Genre cache is disabled ([CACHE] backend = none); nothing to prewarm.")
+        return 1
+
+    backend = BACKENDS[args.service]()
+    backend.authenticate(config)
+    if args.csv:
+        tracks = load_tracks(args.csv, backend.track_type)
+    else:
+        tracks = backend.get_liked_songs()
+    prewarm(backend, config, cache, tracks, workers=args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+"""Per-provider call, yield, latency and traffic metrics for genre enrichment.
+
+The resolver wraps every provider lookup in :meth:`ProviderMetrics.measure`,
+which times it and classifies the result (non-empty, empty, exception). While
+a lookup runs it is the thread's *current provider*: the HTTP helpers report
+received bytes through :func:`count_response` (or :func:`response_hook` on a
+``requests`` session), and the helpers' catch-all ``except`` blocks report
+what they swallow through :func:`record_error`, so a provider that fails
+quietly no longer looks like one that simply found nothing.
+
+:meth:`ProviderMetrics.print_report` shows calls, yield, p50/p95/p99 latency,
+bytes and seconds spent per hit, and flags providers that are both slow and
+rarely useful; :meth:`ProviderMetrics.prometheus` renders the same data in
+the Prometheus text exposition format.
+"""
+
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# A provider answering fewer than LOW_YIELD of its calls with a p95 latency of
+# at least SLOW_P95 seconds is flagged in the report.
+LOW_YIELD = 0.10
+SLOW_P95 = 1.0
+QUANTILES = (0.5, 0.95, 0.99)
+
+_local = threading.local()
+
+
+class ProviderStats:
+    """Counters and latency samples for one provider."""
+
+    __slots__ = ("name", "calls", "successes", "empties", "exceptions", "bytes",
+                 "latencies", "last_error")
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.successes = 0
+        self.empties = 0
+        self.exceptions = 0
+        self.bytes = 0
+        self.latencies = []
+        self.last_error = None
+
+    @property
+    def yield_rate(self):
+        return self.successes / self.calls if self.calls else 0.0
+
+    @property
+    def total_seconds(self):
+        return sum(self.latencies)
+
+    def quantile(self, q):
+        """Nearest-rank latency quantile in seconds (0.0 without samples)."""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        rank = min(len(ordered), max(1, math.ceil(q * len(ordered))))
+        return ordered[rank - 1]
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "successes": self.successes,
+            "empties": self.empties,
+            "exceptions": self.exceptions,
+            "yield": self.yield_rate,
+            "bytes": self.bytes,
+            "seconds": self.total_seconds,
+            **{f"p{int(q * 100)}": self.quantile(q) for q in QUANTILES},
+            "last_error": self.last_error,
+        }
+
+
+class ProviderMetrics:
+    """Metrics for every provider called during one run."""
+
+    def __init__(self, clock=time.perf_counter):
+        self.providers = {}
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def stats(self, name):
+        with self._lock:
+            if name not in self.providers:
+                self.providers[name] = ProviderStats(name)
+            return self.providers[name]
+
+    def measure(self, name, lookup):
+        """Call ``lookup()`` as provider ``name`` and record the outcome."""
+        stats = self.stats(name)
+        previous = getattr(_local, "current", None)
+        _local.current = stats
+        _local.failed = False
+        start = self._clock()
+        try:
+            result = lookup()
+        except Exception as exc:
+            self._finish(stats, start, None, exc)
+            raise
+        finally:
+            _local.current = previous
+        self._finish(stats, start, result, None)
+        return result
+
+    def _finish(self, stats, start, result, exc):
+        elapsed = self._clock() - start
+        failed = exc is not None or getattr(_local, "failed", False)
+        _local.failed = False
+        with self._lock:
+            stats.calls += 1
+            stats.latencies.append(elapsed)
+            if result:
+                stats.successes += 1
+            elif failed:
+                stats.exceptions += 1
+            else:
+                stats.empties += 1
+            if exc is not None:
+                stats.last_error = f"{type(exc).__name__}: {exc}"
+
+    def report(self):
+        return {name: stats.as_dict() for name, stats in self.providers.items()}
+
+    def flagged(self):
+        """Providers with a low yield and a slow p95 (worth moving or disabling)."""
+        return [s.name for s in self.providers.values()
+                if s.calls and s.yield_rate < LOW_YIELD and s.quantile(0.95) >= SLOW_P95]
+
+    def print_report(self):
+        if not self.providers:
+            return
+        print("\n📡 Genre providers (yield = calls returning genres):")
+        width = max(len(name) for name in self.providers)
+        print(f"   {'provider':<{width}}  {'calls':>6} {'yield':>6} {'empty':>6} {'errors':>6} "
+              f"{'p50':>7} {'p95':>7} {'p99':>7} {'KB':>8} {'s/hit':>7}")
+        flagged = set(self.flagged())
+        for stats in self.providers.values():
+            per_hit = (f"{stats.total_seconds / stats.successes:7.2f}" if stats.successes
+                       else f"{'—':>7}")
+            flag = "  ⚠️ slow, low yield" if stats.name in flagged else ""
+            print(f"   {stats.name:<{width}}  {stats.calls:>6} {stats.yield_rate:>6.0%} "
+                  f"{stats.empties:>6} {stats.exceptions:>6} "
+                  f"{stats.quantile(0.5):>6.2f}s {stats.quantile(0.95):>6.2f}s "
+                  f"{stats.quantile(0.99):>6.2f}s {stats.bytes / 1024:>8.0f} {per_hit}{flag}")
+        for stats in self.providers.values():
+            if stats.last_error:
+                print(f"   Last {stats.name} error: {stats.last_error}")
+
+    def prometheus(self, prefix="genre_provider"):
+        """The metrics in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {prefix}_calls_total Provider lookups by outcome.",
+            f"# TYPE {prefix}_calls_total counter",
+        ]
+        for stats in self.providers.values():
+            label = _label(stats.name)
+            for outcome, value in (("success", stats.successes), ("empty", stats.empties),
+                                   ("exception", stats.exceptions)):
+                lines.append(f'{prefix}_calls_total{{provider="{label}",outcome="{outcome}"}} {value}')
+        lines += [
+            f"# HELP {prefix}_response_bytes_total Response bytes received per provider.",
+            f"# TYPE {prefix}_response_bytes_total counter",
+        ]
+        for stats in self.providers.values():
+            lines.append(f'{prefix}_response_bytes_total{{provider="{_label(stats.name)}"}} {stats.bytes}')
+        lines += [
+            f"# HELP {prefix}_latency_seconds Provider lookup latency.",
+            f"# TYPE {prefix}_latency_seconds summary",
+        ]
+        for stats in self.providers.values():
+            label = _label(stats.name)
+            for q in QUANTILES:
+                lines.append(f'{prefix}_latency_seconds{{provider="{label}",quantile="{q}"}} '
+                             f"{stats.quantile(q):.6f}")
+            lines.append(f'{prefix}_latency_seconds_sum{{provider="{label}"}} {stats.total_seconds:.6f}')
+            lines.append(f'{prefix}_latency_seconds_count{{provider="{label}"}} {stats.calls}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Atomically write :meth:`prometheus` to ``path`` (textfile collector)."""
+        directory = os.path.dirname(os.path.abspath(path))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                fh.write(self.prometheus())
+            os.replace(tmp, path)
+        except OSError as exc:
+            print(f"⚠️ Could not write provider metrics to {path} ({exc}).", file=sys.stderr)
+            return False
+        return True
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def count_response(response):
+    """Add a response's body size to the current provider (if any)."""
+    stats = getattr(_local, "current", None)
+    content = getattr(response, "content", None)
+    if stats is not None and isinstance(content, (bytes, bytearray)):
+        stats.bytes += len(content)
+    return response
+
+
+def response_hook(response, *args, **kwargs):
+    """``requests`` response hook form of :func:`count_response`."""
+    count_response(response)
+
+
+def record_error(exc):
+    """Note an exception a provider swallowed (it will count as an error, not an empty)."""
+    _local.failed = True
+    stats = getattr(_local, "current", None)
+    if stats is None:
+        return
+    stats.last_error = f"{type(exc).__name__}: {exc}"
+
+
+def clear_failure():
+    """Forget any error recorded so far on this thread."""
+    _local.failed = False
+
+
+def failure_recorded():
+    """Whether :func:`record_error` was called since the last reset."""
+    return getattr(_local, "failed", False)
@@ -0,0 +1,43 @@
+"""Client-side request rate limiting for the genre providers.
+
+Some providers enforce a hard request budget (Discogs allows 60 authenticated
+requests per minute). Going over it costs a 429 and a stall, so calls are
+paced locally with a sliding-window :class:`RateLimiter` shared by every
+lookup in the process.
+"""
+
+import threading
+import time
+from collections import deque
+
+
+class RateLimiter:
+    """Allow at most ``max_calls`` per ``period`` seconds (sliding window)."""
+
+    def __init__(self, max_calls, period=60.0, time_fn=time.monotonic, sleep_fn=time.sleep):
+        self.max_calls = int(max_calls)
+        self.period = float(period)
+        self._time = time_fn
+        self._sleep = sleep_fn
+        self._calls = deque()
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    def acquire(self):
+        """Block until a call is allowed, then record it."""
+        while True:
+            with self._lock:
+                now = self._time()
+                while self._calls and now - self._calls[0] >= self.period:
+                    self._calls.popleft()
+                if len(self._calls) < self.max_calls:
+                    self._calls.append(now)
+                    return
+                delay = self.period - (now - self._calls[0])
+            self.waited += delay
+            self._sleep(delay)
+
+    def pause(self, seconds):
+        """Back off after the server rejected a call (HTTP 429)."""
+        self.waited += seconds
+        self._sleep(seconds)
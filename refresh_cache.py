@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Refresh stale genre-cache entries off the critical path.
+
+Cache entries past ``[CACHE] ttl_days`` are still served for ``stale_days``
+(stale-while-revalidate, see :mod:`genre_cache`). This module re-resolves them:
+
+* during a run, :class:`StaleRefresher` re-resolves the stale albums that run
+  served on a few background threads while ordering and upload proceed;
+* between runs, ``refresh_cache.py`` re-resolves every stale entry stored for
+  a service (entries without a recorded lookup, written before entries kept
+  one, are left to expire).
+
+A refresh that finds genres overwrites the entry with a new TTL; one that finds
+nothing leaves the stale answer in place.
+
+Usage:
+    python refresh_cache.py --service spotify
+"""
+
+import argparse
+import configparser
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class StaleRefresher:
+    """Re-resolve stale albums on a small thread pool within a time budget."""
+
+    def __init__(self, resolve, workers=2, budget_s=None, clock=time.monotonic):
+        self.resolve = resolve
+        self.workers = max(1, int(workers))
+        self.budget_s = budget_s
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._executor = None
+        self._futures = []
+        self.deadline = None
+        self.refreshed = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def start(self, items):
+        """Queue ``items``: ``(cache_key, lookup)`` with ``lookup`` as stored in the cache."""
+        if self.budget_s is not None:
+            self.deadline = self._clock() + self.budget_s
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="cache-refresh")
+        self._futures = [self._executor.submit(self._refresh, key, lookup)
+                         for key, lookup in items]
+        return len(self._futures)
+
+    def _refresh(self, cache_key, lookup):
+        if self.deadline is not None and self._clock() >= self.deadline:
+            outcome = "skipped"
+        else:
+            try:
+                genres, _ = self.resolve(
+                    lookup.get("song"), lookup.get("artist"), lookup.get("album"),
+                    lookup.get("album_id"), lookup.get("track_id"),
+                    cache_key=cache_key, refresh=True,
+                )
+                outcome = "refreshed" if genres else "unchanged"
+            except Exception as exc:
+                print(f"⚠️ Could not refresh {cache_key} ({exc}).", file=sys.stderr)
+                outcome = "failed"
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def finish(self):
+        """Wait for the queued refreshes (the budget bounds the wait) and report."""
+        if self._executor is None:
+            return None
+        self._executor.shutdown(wait=True)
+        self._executor = None
+        total = len(self._futures)
+        print(f"\n♻️  Refreshed {self.refreshed}/{total} stale cache entr{'y' if total == 1 else 'ies'}"
+              f" ({self.unchanged} unchanged, {self.failed} failed"
+              f"{f', {self.skipped} left for next time' if self.skipped else ''}).")
+        return {"queued": total, "refreshed": self.refreshed, "unchanged": self.unchanged,
+                "failed": self.failed, "skipped": self.skipped}
+
+
+def stale_entries(cache, service):
+    """``(key, lookup)`` for every stale entry of ``cache`` resolved for ``service``."""
+    return [(key, record["lookup"]) for key, record in cache.entries()
+            if cache.is_stale(record) and (record.get("lookup") or {}).get("service") == service]
+
+
+def main():
+    from backends import BACKENDS
+    from genre_cache import build_cache_from_config
+    from provider_metrics import ProviderMetrics
+
+    parser = argparse.ArgumentParser(description="Re-resolve stale genre-cache entries.")
+    parser.add_argument("--service", choices=list(BACKENDS), required=True,
+                        help="Refresh the entries resolved for this streaming service.")
+    parser.add_argument("--config", default="settings.ini", help="Path to settings.ini")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent refreshes (default: 4).")
+    parser.add_argument("--limit", type=int, help="Refresh at most this many entries.")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the stale entries.")
+    args = parser.parse_args()
+
+    config = configparser.ConfigParser()
+    config.read(args.config)
+    cache = build_cache_from_config(config)
+    if not cache.enabled:
+        print("Genre cache is disabled; nothing to refresh.")
+        return 0
+    items = stale_entries(cache, args.service)
+    if args.limit is not None:
+        items = items[:args.limit]
+    print(f"🗃️  {len(items)} stale {args.service} entr{'y' if len(items) == 1 else 'ies'} "
+          f"in the {cache.backend} cache.")
+    if args.dry_run or not items:
+        return 0
+
+    import sorter_core
+
+    backend = BACKENDS[args.service]()
+    backend.authenticate(config)
+    metrics = ProviderMetrics()
+    resolvers = {
+        resolution: sorter_core._make_genre_resolver(
+            backend, config, cache, resolution=resolution, metrics=metrics, service=backend.key
+        )
+        for resolution in ("first_match", "consensus")
+    }
+
+    def resolve(*lookup, cache_key, refresh):
+        # Consensus entries carry a ":c" suffix; the resolver adds it back.
+        if cache_key.endswith(":c"):
+            return resolvers["consensus"](*lookup, cache_key=cache_key[:-2], refresh=refresh)
+        return resolvers["first_match"](*lookup, cache_key=cache_key, refresh=refresh)
+
+    refresher = StaleRefresher(resolve, workers=args.workers)
+    refresher.start(items)
+    try:
+        refresher.finish()
+    finally:
+        backend.finish_genres()
+        cache.close()
+    metrics.print_report()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""Memory-budgeted similarity buffers for the clustering stage.
+
+The ordering step works on dense ``n x n`` album-similarity matrices. With the
+default float64 path, ``sim_tags``, ``sim_roots``, their ``1 - sim`` distance
+copies and a densified MST all live at once, which runs into several GB for a
+15k-album library.
+
+When ``[CLUSTERING] memory_budget_mb`` is set, a :class:`SimilarityWorkspace`
+is used instead: similarities are computed in float32 row blocks straight into
+preallocated buffers, the distance matrix is a single scratch buffer reused
+across orderings, and any buffer that would push the resident total over the
+budget is spilled to a ``np.memmap`` scratch file.
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+from scipy import sparse
+
+MB = 1024 * 1024
+
+
+class SimilarityWorkspace:
+    """Allocates the ordering buffers within an optional memory budget.
+
+    Without a budget it is inert (``enabled`` is ``False``) and the pipeline
+    keeps its float64, allocate-as-you-go behaviour.
+    """
+
+    def __init__(self, budget_mb=None, scratch_dir=None, dtype=np.float32):
+        self.budget_mb = float(budget_mb) if budget_mb else None
+        self.budget = int(self.budget_mb * MB) if budget_mb else None
+        self.dtype = np.dtype(dtype) if self.budget else np.dtype(np.float64)
+        self.scratch_dir = scratch_dir
+        self.resident_bytes = 0
+        self.spilled_bytes = 0
+        self._files = []
+        self._scratch = None
+
+    @property
+    def enabled(self):
+        return self.budget is not None
+
+    # --- allocation -----------------------------------------------------------
+    def empty(self, shape):
+        """Return an uninitialised buffer, spilled to disk if over budget."""
+        nbytes = int(np.prod(shape)) * self.dtype.itemsize
+        if self.budget is not None and self.resident_bytes + nbytes > self.budget:
+            self.spilled_bytes += nbytes
+            return self._memmap(shape)
+        self.resident_bytes += nbytes
+        return np.empty(shape, dtype=self.dtype)
+
+    def scratch(self, shape):
+        """Return a view of the shared scratch buffer, growing it if needed.
+
+        The contents are only valid until the next ``scratch`` call, so callers
+        must be done with one view before asking for another.
+        """
+        size = int(np.prod(shape))
+        if self._scratch is None or self._scratch.size < size:
+            self.release(self._scratch)
+            self._scratch = None
+            self._scratch = self.empty((size,))
+        return self._scratch[:size].reshape(shape)
+
+    def release(self, buffer):
+        """Give ``buffer``'s bytes back to the budget; the caller drops it.
+
+        Spilled (memory-mapped) buffers never counted against the budget.
+        """
+        if buffer is None or isinstance(buffer, np.memmap):
+            return
+        self.resident_bytes = max(0, self.resident_bytes - buffer.nbytes)
+
+    def block_rows(self, n_cols):
+        """Rows per block so one temporary block stays within ~1/16 of budget."""
+        if not self.budget or n_cols <= 0:
+            return max(1, n_cols)
+        per_row = n_cols * self.dtype.itemsize
+        return int(max(1, min(n_cols, (self.budget // 16) // max(per_row, 1))))
+
+    def _memmap(self, shape):
+        directory = self.scratch_dir or tempfile.gettempdir()
+        os.makedirs(directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=directory, prefix="sim_", suffix=".dat")
+        os.close(fd)
+        self._files.append(path)
+        return np.memmap(path, dtype=self.dtype, mode="w+", shape=shape)
+
+    def close(self):
+        """Drop the scratch buffer and delete any spill files."""
+        self.release(self._scratch)
+        self._scratch = None
+        for path in self._files:
+            try:
+                os.remove(path)
+            except OSError as exc:
+                print(f"⚠️ Could not remove similarity scratch file ({exc}).",
+                      file=sys.stderr)
+        self._files = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def l2_normalize_rows(matrix, dtype):
+    if sparse.issparse(matrix):
+        matrix = sparse.csr_matrix(matrix, dtype=dtype)
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sparse.diags((1.0 / norms).astype(dtype)) @ matrix
+    matrix = np.asarray(matrix, dtype=dtype)
+    norms = np.linalg.norm(matrix, axis=1)
+    norms[norms == 0] = 1.0
+    return matrix / norms[:, None].astype(dtype)
+
+
+def blocked_cosine_similarity(matrix, workspace):
+    """Cosine similarity of the rows of ``matrix``, computed in row blocks.
+
+    The result lands in a single ``workspace`` buffer (float32 under a budget),
+    so no full-size temporaries are created beyond the output itself.
+    """
+    n = matrix.shape[0]
+    out = workspace.empty((n, n))
+    if n == 0:
+        return out
+    if matrix.shape[1] == 0:
+        out[:] = 0.0
+        return out
+    normed = l2_normalize_rows(matrix, workspace.dtype)
+    normed_t = normed.T.tocsr() if sparse.issparse(normed) else normed.T
+    step = workspace.block_rows(n)
+    for start in range(0, n, step):
+        stop = min(n, start + step)
+        block = normed[start:stop] @ normed_t
+        out[start:stop] = block.toarray() if sparse.issparse(block) else block
+    return out
+
+
+def distance_into(sim, workspace):
+    """Return ``1 - sim`` written blockwise into the shared scratch buffer."""
+    n = sim.shape[0]
+    dist = workspace.scratch((n, n))
+    step = workspace.block_rows(n)
+    for start in range(0, n, step):
+        stop = min(n, start + step)
+        np.subtract(1.0, sim[start:stop], out=dist[start:stop])
+    return dist
+
+
+def upper_triangle_quantile(sim, q, workspace):
+    """``np.quantile`` of the strict upper triangle without index arrays.
+
+    ``np.triu_indices_from`` allocates two int64 arrays of ``n^2 / 2`` each;
+    here the values are gathered row by row into the scratch buffer instead.
+    """
+    n = sim.shape[0]
+    count = n * (n - 1) // 2
+    values = workspace.scratch((count,))
+    pos = 0
+    for i in range(n - 1):
+        row = sim[i, i + 1:]
+        values[pos:pos + row.size] = row
+        pos += row.size
+    return float(np.quantile(values, q, overwrite_input=True))
+
+
+def prim_mst_edges(dist):
+    """Minimum spanning forest of a dense distance matrix, in O(n) memory.
+
+    Mirrors ``scipy.sparse.csgraph.minimum_spanning_tree`` semantics, where a
+    zero distance means "no edge", but never materialises a sparse copy of the
+    complete graph. Returns ``(u, v, weight)`` tuples with ``u < v``.
+    """
+    n = dist.shape[0]
+    if n < 2:
+        return []
+    in_tree = np.zeros(n, dtype=bool)
+    best = np.full(n, np.inf)
+    parent = np.full(n, -1)
+    edges = []
+    for _ in range(n):
+        candidates = np.where(in_tree, np.inf, best)
+        node = int(np.argmin(candidates))
+        if not np.isfinite(candidates[node]):
+            # Start a new tree (disconnected component or first pick).
+            node = int(np.argmin(in_tree))
+        elif parent[node] >= 0:
+            u, v = sorted((int(parent[node]), node))
+            edges.append((u, v, float(best[node])))
+        in_tree[node] = True
+        row = np.asarray(dist[node], dtype=np.float64)
+        row = np.where(row == 0, np.inf, row)
+        closer = (~in_tree) & (row < best)
+        best[closer] = row[closer]
+        parent[closer] = node
+    return sorted(edges)
@@ -0,0 +1,228 @@
+"""Persistent album-similarity store reused across runs.
+
+``sim_tags`` and ``sim_roots`` only depend on each pair of albums' tag lists,
+which come from the genre cache and rarely change between runs, yet both
+``n x n`` matrices used to be recomputed every time. This store keeps them on
+disk keyed by a content hash of every album's sorted tag list. On the next run
+the rows of unchanged albums are gathered from memory-mapped files (no full
+parse) and only the rows and columns of new or re-tagged albums are computed.
+
+Rows are stored in append-only blocks. Every stored album has a *slot*; a
+block holds the rows of a run of new slots, each over the columns of every
+slot up to its own (the similarities are symmetric, so a pair lives in the row
+of its later album). A run with new albums writes one new block with just
+their rows; nothing already on disk is rewritten. Albums that leave the
+library stay in their blocks as dead slots until more than ``STALE_FRACTION``
+of the slots are dead or unused, when the store is compacted into one block.
+
+Block files are named after the generation that wrote them and are never
+modified; ``index.json`` (replaced atomically, last) names the blocks that make
+up the store, so a crash mid-write leaves the previous store intact.
+
+The store is tied to a *version* hash of the root rules (``genre_roots.json``),
+``genre_root_weight`` and the matrix dtype; any change there starts it afresh.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from scipy import sparse
+
+from similarity import l2_normalize_rows
+
+INDEX_FILE = "index.json"
+MATRICES = ("sim_tags", "sim_roots")
+# Rewrite a store that has no new albums once this share of its rows is unused.
+STALE_FRACTION = 0.25
+
+
+def album_key(genre_list):
+    """Content hash of an album's tag list (order-insensitive)."""
+    payload = "\x1f".join(sorted(str(t) for t in genre_list or []))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def store_version(rules, root_weight, dtype):
+    """Hash of everything besides the tags that the similarities depend on."""
+    payload = json.dumps(
+        {"rules": list(rules or []), "root_weight": float(root_weight),
+         "dtype": np.dtype(dtype).str},
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class SimilarityStore:
+    """Directory holding ``index.json`` plus per-generation ``.npy`` row blocks."""
+
+    def __init__(self, directory):
+        self.directory = os.path.expanduser(directory)
+        self.reused_rows = 0
+        self.computed_rows = 0
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    @staticmethod
+    def _block_file(name, generation):
+        return f"{name}-{generation:06d}.npy"
+
+    def _load(self, version):
+        """Return ``(index, {matrix: [(start, stop, memmap), ...]})`` or ``(None, {})``."""
+        try:
+            with open(self._path(INDEX_FILE), "r", encoding="utf-8") as fh:
+                index = json.load(fh)
+            if index.get("version") != version or not index.get("keys"):
+                return None, {}
+            blocks = {name: [] for name in MATRICES}
+            for start, stop, generation in index["blocks"]:
+                for name in MATRICES:
+                    block = np.load(self._path(self._block_file(name, generation)),
+                                    mmap_mode="r")
+                    if block.shape != (stop - start, stop):
+                        return None, {}
+                    blocks[name].append((start, stop, block))
+        except (OSError, ValueError, AttributeError, KeyError, TypeError):
+            return None, {}
+        return index, blocks
+
+    def similarities(self, keys, features, version, workspace):
+        """Assemble ``{matrix: sim}`` for ``features`` (``{matrix: rows}``).
+
+        Pairs of stored albums are gathered from the row blocks; the other
+        rows are computed as cosine similarities against every album, in row
+        blocks sized by ``workspace``, and appended to the store as one new
+        block.
+        """
+        n = len(keys)
+        index, blocks = self._load(version)
+        slot_of = index["keys"] if index else {}
+        slot = np.array([slot_of.get(k, -1) for k in keys], dtype=np.int64)
+        known = np.flatnonzero(slot >= 0)
+        fresh = np.flatnonzero(slot < 0)
+        self.reused_rows, self.computed_rows = len(known), len(fresh)
+
+        result = {}
+        for name in MATRICES:
+            out = workspace.empty((n, n))
+            for start, stop, block in blocks.get(name, ()):
+                self._gather(out, block, start, stop, known, slot[known], workspace)
+            if len(fresh):
+                self._compute(out, features[name], fresh, workspace)
+            result[name] = out
+
+        # Slots of stored albums this run does not use; an append drops them.
+        slots = index["slots"] if index else 0
+        unused = slots - len(set(slot[known].tolist()))
+        if len(fresh) and unused <= STALE_FRACTION * (slots + len(fresh)):
+            self._append(index, keys, slot, fresh, result, version, workspace)
+        elif len(fresh) or unused > STALE_FRACTION * slots:
+            self._compact(index, keys, result, version, workspace)
+        return result
+
+    @staticmethod
+    def _gather(out, block, start, stop, known, known_slots, workspace):
+        """Copy every stored pair whose later album lives in ``block``."""
+        rows = np.flatnonzero((known_slots >= start) & (known_slots < stop))
+        cols = np.flatnonzero(known_slots < stop)
+        if not len(rows) or not len(cols):
+            return
+        col_slots = known_slots[cols]
+        step = workspace.block_rows(stop)
+        for i in range(0, len(rows), step):
+            chunk = rows[i:i + step]
+            values = np.take(block, known_slots[chunk] - start, axis=0)[:, col_slots]
+            out[np.ix_(known[chunk], known[cols])] = values
+            out[np.ix_(known[cols], known[chunk])] = values.T
+
+    @staticmethod
+    def _compute(out, rows, fresh, workspace):
+        n = out.shape[0]
+        if rows.shape[1] == 0:
+            out[fresh, :] = 0.0
+            out[:, fresh] = 0.0
+            return
+        normed = l2_normalize_rows(rows, workspace.dtype)
+        normed_t = normed.T.tocsr() if sparse.issparse(normed) else normed.T
+        step = workspace.block_rows(n)
+        for start in range(0, len(fresh), step):
+            idx = fresh[start:start + step]
+            block = normed[idx] @ normed_t
+            block = block.toarray() if sparse.issparse(block) else block
+            out[idx, :] = block
+            out[:, idx] = block.T
+
+    def _append(self, index, keys, slot, fresh, matrices, version, workspace):
+        """Write the fresh albums' rows as a new block after the stored slots."""
+        start = index["slots"] if index else 0
+        first = {}
+        for i in fresh:
+            first.setdefault(keys[i], i)
+        rows = np.array(list(first.values()), dtype=np.int64)
+        new_slot = {key: start + offset for offset, key in enumerate(first)}
+        slot = slot.copy()
+        for i in fresh:
+            slot[i] = new_slot[keys[i]]
+        stop = start + len(rows)
+        # Columns: one position per stored or new album present in this run;
+        # the columns of albums that left the library are dead and stay zero.
+        present = {}
+        for i, s in enumerate(slot.tolist()):
+            present.setdefault(s, i)
+        col_slots = np.array(list(present), dtype=np.int64)
+        col_pos = np.array(list(present.values()), dtype=np.int64)
+        generation = (index["generation"] if index else 0) + 1
+        keys_out = {keys[i]: s for s, i in present.items()}
+        blocks_out = list(index["blocks"]) if index else []
+        blocks_out.append([start, stop, generation])
+        self._write(generation, matrices, rows, col_slots, col_pos, (len(rows), stop),
+                    workspace, {"version": version, "generation": generation, "slots": stop,
+                                "keys": keys_out, "blocks": blocks_out})
+
+    def _compact(self, index, keys, matrices, version, workspace):
+        """Rewrite the store as one block holding just this run's albums."""
+        first = {}
+        for i, key in enumerate(keys):
+            first.setdefault(key, i)
+        pos = np.array(list(first.values()), dtype=np.int64)
+        n = len(pos)
+        generation = (index["generation"] if index else 0) + 1
+        self._write(generation, matrices, pos, np.arange(n), pos, (n, n), workspace,
+                    {"version": version, "generation": generation, "slots": n,
+                     "keys": {key: s for s, key in enumerate(first)},
+                     "blocks": [[0, n, generation]]})
+
+    def _write(self, generation, matrices, rows, col_slots, col_pos, shape, workspace, index):
+        """Write one block per matrix, then swap in ``index`` and drop old blocks."""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            for name, matrix in matrices.items():
+                path = self._path(self._block_file(name, generation))
+                block = np.lib.format.open_memmap(path, mode="w+", dtype=matrix.dtype,
+                                                  shape=shape)
+                step = workspace.block_rows(shape[1])
+                for i in range(0, len(rows), step):
+                    chunk = np.zeros((len(rows[i:i + step]), shape[1]), dtype=matrix.dtype)
+                    chunk[:, col_slots] = matrix[np.ix_(rows[i:i + step], col_pos)]
+                    block[i:i + step] = chunk
+                block.flush()
+                del block
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".json")
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump(index, fh)
+            os.replace(tmp, self._path(INDEX_FILE))
+        except OSError as exc:
+            print(f"⚠️ Could not write similarity store ({exc}).", file=sys.stderr)
+            return
+        live = {self._block_file(name, g) for _, _, g in index["blocks"] for name in MATRICES}
+        for entry in os.listdir(self.directory):
+            if entry.endswith(".npy") and entry not in live:
+                try:
+                    os.remove(self._path(entry))
+                except OSError:
+                    pass
@@ -11,8 +11,11 @@ __version__ = "2.0.0"
 import sys
 import argparse
 import configparser
+import contextlib
+from datetime import datetime
 
 from backends import BACKENDS
+from instrumentation import stage
 
 
 def choose_service(preselected=None):
@@ -36,6 +39,15 @@ def choose_service(preselected=None):
         print("Invalid choice. Please try again.")
 
 
+def _finish_profile(profiler):
+    profiler.print_summary()
+    path = profiler.write()
+    if path:
+        print(f"📁 Profile report saved to {path}")
+    for name, artifact in profiler.artifacts.items():
+        print(f"   {name}: {artifact}")
+
+
 def main():
     parser = argparse.ArgumentParser(description="Sort liked/favorite songs by genre similarity.")
     parser.add_argument(
@@ -54,19 +66,107 @@ def main():
         action="store_true",
         help="Disable the persistent genre cache entirely for this run.",
     )
+    parser.add_argument(
+        "--cache-only",
+        action="store_true",
+        help="Never call the genre providers; albums missing from the cache get no genre "
+             "(fill the cache beforehand with prewarm.py).",
+    )
+    parser.add_argument(
+        "--record-http",
+        metavar="DIR",
+        help="Record every HTTP response of this run into DIR (for offline replay).",
+    )
+    parser.add_argument(
+        "--replay-http",
+        metavar="DIR",
+        help="Run offline: answer all HTTP requests from the recordings in DIR.",
+    )
+    parser.add_argument(
+        "--replay-latency-ms",
+        type=float,
+        default=0.0,
+        help="With --replay-http: latency added to every replayed response.",
+    )
+    parser.add_argument(
+        "--replay-error-rate",
+        type=float,
+        default=0.0,
+        help="With --replay-http: fraction of requests answered with HTTP 503.",
+    )
+    parser.add_argument(
+        "--replay-429-rate",
+        type=float,
+        default=0.0,
+        help="With --replay-http: fraction of requests answered with HTTP 429.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Record wall/CPU time, peak memory and item counts per stage and write a JSON report.",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        default="profiles",
+        help="With --profile: directory for the report and profile dumps (default: profiles).",
+    )
+    parser.add_argument(
+        "--profile-ordering",
+        choices=("pstats", "collapsed", "both"),
+        help="With --profile: also dump the ordering stage as cProfile stats and/or "
+             "flame-graph collapsed stacks.",
+    )
     args = parser.parse_args()
+    if args.cache_only and (args.refresh_cache or args.no_cache):
+        parser.error("--cache-only cannot be combined with --refresh-cache or --no-cache.")
+    if args.record_http and args.replay_http:
+        parser.error("--record-http and --replay-http are mutually exclusive.")
 
     config = configparser.ConfigParser()
     config.read(args.config)
 
     service_key = choose_service(args.service)
-    backend = BACKENDS[service_key]()
 
-    backend.authenticate(config)
+    with contextlib.ExitStack() as stack:
+        if args.profile:
+            from instrumentation import Profiler
+            capture = {"both": ("pstats", "collapsed")}.get(
+                args.profile_ordering, (args.profile_ordering,) if args.profile_ordering else ()
+            )
+            profiler = stack.enter_context(Profiler(
+                output_dir=args.profile_dir,
+                prefix=f"profile_{service_key}_{datetime.now():%Y%m%d-%H%M%S}",
+                capture=capture,
+            ))
+            profiler.note("service", service_key)
+            profiler.note("version", __version__)
+            stack.callback(_finish_profile, profiler)
+
+        if args.record_http or args.replay_http:
+            import http_replay
+            if args.record_http:
+                stack.enter_context(http_replay.recording(args.record_http))
+                print(f"📼 Recording HTTP responses to {args.record_http}")
+            else:
+                replay_config = http_replay.ReplayConfig(
+                    latency_ms=args.replay_latency_ms,
+                    error_rate=args.replay_error_rate,
+                    rate_limit_rate=args.replay_429_rate,
+                )
+                server = stack.enter_context(
+                    http_replay.replaying(args.replay_http, replay_config)
+                )
+                stack.callback(lambda: print(f"📼 Replay: {server.stats}"))
+                print(f"📼 Replaying HTTP responses from {args.replay_http}")
+
+        backend = BACKENDS[service_key]()
+        with stage("auth"):
+            backend.authenticate(config)
 
-    # Import here so the heavy data-science stack only loads once a service is chosen.
-    import sorter_core
-    sorter_core.run(backend, config, refresh_cache=args.refresh_cache, no_cache=args.no_cache)
+        # Import here so the heavy data-science stack only loads once a service is chosen.
+        import sorter_core
+        sorter_core.run(backend, config, refresh_cache=args.refresh_cache, no_cache=args.no_cache,
+                        cache_only=args.cache_only)
 
 
 if __name__ == "__main__":
@@ -6,64 +6,89 @@ genre similarity (MST cut + silhouette search + greedy chaining), then creates
 the ordered playlist and writes a CSV export.
 """
 
+import functools
+import os
 import sys
+import tempfile
 import time
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 
-import pandas as pd
 import numpy as np
 import networkx as nx
-from sklearn.preprocessing import MultiLabelBinarizer
 from sklearn.metrics import silhouette_score
 from sklearn.metrics.pairwise import cosine_similarity
 from scipy.sparse.csgraph import minimum_spanning_tree
 from tqdm import tqdm
 
-from genre_helpers import clean_album_name, normalize_and_sort_genres
+from adaptive_order import AdaptiveOrder, ProviderHistory
+from album_identity import album_identity, cached_clean_album_name
+from circuit_breaker import DEFAULT_COOLDOWN_S, DEFAULT_FAILURES, BreakerBoard
 from genre_cache import build_cache_from_config, make_key
 from genre_normalization import (
     load_genre_roots,
     infer_root,
+    infer_roots_encoded,
     display_root,
-    genre_similarity_matrix,
+    encoded_root_features,
     avg_adjacent_overlap,
     count_fragmented_roots,
     merge_consensus,
 )
 from genre_overrides import load_overrides, lookup_override
+from instrumentation import active as active_profiler, note, stage
+from incremental_order import (
+    DEFAULT_DRIFT_THRESHOLD,
+    default_state_path,
+    load_order_state,
+    plan_incremental_order,
+    save_order_state,
+    state_baseline,
+)
+from negative_index import DEFAULT_DEFERRED_BUDGET_S, build_negative_index_from_config
+from order_refinement import refine_order
+from provider_metrics import ProviderMetrics
+from refresh_cache import StaleRefresher
+from similarity_store import SimilarityStore, album_key, store_version
+from similarity import (
+    MB,
+    SimilarityWorkspace,
+    blocked_cosine_similarity,
+    distance_into,
+    prim_mst_edges,
+    upper_triangle_quantile,
+)
+from tag_vocab import TagVocabulary
+from tracks import dedupe_tracks, tracks_frame
 
 
 # -----------------------------
 #  Source selection helpers
 # -----------------------------
-def _track_dedupe_key(row, backend):
-    return (
-        row.get(backend.track_id_col)
-        or f"{row.get('Song')}|{row.get('Artist')}|{row.get('Album')}|"
-           f"{row.get('Track Number')}|{row.get('Disc Number')}"
-    )
+def dedupe_rows(rows):
+    """Drop repeated track records (by service id, else descriptive fields)."""
+    with stage("dedupe") as s:
+        deduped = dedupe_tracks(rows)
+        s.items = len(rows)
+    return deduped
 
 
-def dedupe_rows(rows, backend):
-    seen = set()
-    deduped = []
-    for row in rows:
-        key = _track_dedupe_key(row, backend)
-        if key in seen:
-            continue
-        seen.add(key)
-        deduped.append(row)
-    return deduped
+def _fetch(name, fn, *args):
+    with stage(f"fetch.{name}") as s:
+        result = fn(*args)
+        s.items = len(result)
+    return result
 
 
 def _print_local_tracks_log(rows, source_label):
-    local_rows = [r for r in rows if r.get("Is Local")]
+    local_rows = [r for r in rows if r.is_local]
     if not local_rows:
         return
     print(f"📁 Local tracks found in {source_label}: {len(local_rows)}")
     for row in local_rows[:10]:
-        print(f"   • {row['Artist']} — {row['Song']} ({row['Album']})")
+        print(f"   • {row.artist} — {row.song} ({row.album})")
     if len(local_rows) > 10:
         print(f"   … and {len(local_rows) - 10} more local tracks.")
     print()
@@ -106,29 +131,29 @@ def _collect_source(backend):
     """Run the interactive source menu and return ``(slug, label, rows)``."""
     choice = _select_input_source(backend)
     if choice == "1":
-        rows = backend.get_liked_songs()
+        rows = _fetch("liked", backend.get_liked_songs)
         if backend.supports_local:
             _print_local_tracks_log(rows, backend.liked_label.lower())
-        return backend.liked_slug, backend.liked_label, dedupe_rows(rows, backend)
+        return backend.liked_slug, backend.liked_label, dedupe_rows(rows)
 
     if choice == "2":
-        playlists = backend.get_user_playlists()
+        playlists = _fetch("playlists", backend.get_user_playlists)
         selected = _choose_playlists(backend, playlists)
-        rows = dedupe_rows(backend.get_playlist_tracks(selected), backend)
+        rows = dedupe_rows(_fetch("playlist_tracks", backend.get_playlist_tracks, selected))
         if backend.supports_local:
             _print_local_tracks_log(rows, "selected playlists")
         print(f"🎉 Retrieved {len(rows)} unique songs from selected playlists!\n")
         label = "Playlists: " + ", ".join(backend.playlist_display(p)[0] for p in selected)
         return "selected_playlists", label, rows
 
-    playlists = backend.get_user_playlists()
+    playlists = _fetch("playlists", backend.get_user_playlists)
     selected = _choose_playlists(backend, playlists)[:1]
     selected_playlist = selected[0]
-    liked = backend.get_liked_songs()
+    liked = _fetch("liked", backend.get_liked_songs)
     if backend.supports_local:
         _print_local_tracks_log(liked, backend.liked_label.lower())
-    playlist_rows = backend.get_playlist_tracks([selected_playlist])
-    rows = dedupe_rows(liked + playlist_rows, backend)
+    playlist_rows = _fetch("playlist_tracks", backend.get_playlist_tracks, [selected_playlist])
+    rows = dedupe_rows(liked + playlist_rows)
     print(f"🎉 Combined source contains {len(rows)} unique songs.\n")
     label = f"{backend.liked_label} + {backend.playlist_display(selected_playlist)[0]}"
     return f"{backend.liked_slug}_plus_playlist", label, rows
@@ -137,44 +162,109 @@ def _collect_source(backend):
 # -----------------------------
 #  Genre enrichment
 # -----------------------------
+def _resolver_cache_key(base_key, resolution):
+    """Namespace the cache by resolution mode so the two strategies don't
+    serve each other's results."""
+    return base_key + (":c" if resolution == "consensus" else "")
+
+
+def _resolution_from_config(config):
+    resolution = config.get("GENRE", "resolution", fallback="first_match").strip().lower()
+    return resolution if resolution in ("first_match", "consensus") else "first_match"
+
+
+def _breakers_from_config(config):
+    """A :class:`BreakerBoard` from ``[GENRE] breaker_*`` (``None`` when disabled)."""
+    breaker_failures = int(config.get("GENRE", "breaker_failures", fallback=DEFAULT_FAILURES))
+    if breaker_failures <= 0:
+        return None
+    return BreakerBoard(
+        breaker_failures,
+        cooldown=float(config.get("GENRE", "breaker_cooldown_s", fallback=DEFAULT_COOLDOWN_S)),
+        slow_seconds=float(config.get("GENRE", "breaker_slow_s", fallback="0")),
+    )
+
+
+def _provider_lookup(source, lookup, metrics=None, breakers=None):
+    if breakers is not None:
+        lookup = functools.partial(breakers.call, source, lookup)
+    with stage(f"enrichment.provider.{source}"):
+        if metrics is None:
+            return lookup()
+        return metrics.measure(source, lookup)
+
+
 def _make_genre_resolver(backend, config, cache, overrides=None,
-                         resolution="first_match"):
+                         resolution="first_match", vocab=None, metrics=None,
+                         provider_order=None, breakers=None, service=None, cache_only=False,
+                         negatives=None):
     consensus = resolution == "consensus"
 
-    def get_best_genre(song_name, artist_name, album_name, album_id, track_id):
+    def get_best_genre(song_name, artist_name, album_name, album_id, track_id,
+                       clean_name=None, cache_key=None, refresh=False):
         # Manual overrides win over everything (providers and cache).
         override = lookup_override(overrides, artist_name, album_name)
         if override and override.get("tags"):
             return override["tags"], "Override"
-        # Namespace the cache by resolution mode so the two strategies don't
-        # serve each other's results.
-        cache_key = make_key(album_id, album_name, artist_name) + (":c" if consensus else "")
-        cached = cache.get(cache_key)
-        if cached is not None:
-            return cached
-        clean_name = clean_album_name(album_name or "")
+        if cache_key is None:
+            cache_key = make_key(album_id, album_name, artist_name)
+        cache_key = _resolver_cache_key(cache_key, resolution)
+        if not refresh:
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached
+        if cache_only:
+            return [], "None"
+        if clean_name is None:
+            clean_name = cached_clean_album_name(album_name or "")
         providers = backend.get_genre_providers(
             song_name, artist_name, album_name, clean_name, album_id, track_id, config
         )
+        lookup_args = {"service": service, "song": song_name, "artist": artist_name,
+                       "album": album_name, "album_id": album_id, "track_id": track_id}
+        skipped = []
+
+        def call(source, lookup):
+            # Ask the breaker right before the call: a half-open breaker grants
+            # a single probe, which must actually go out and report back.
+            if breakers is not None and not breakers.allow(source):
+                skipped.append(source)
+                return []
+            return _provider_lookup(source, lookup, metrics, breakers)
 
         if consensus:
             # Collect from ALL providers and merge by weighted vote.
             collected = [(source, tags) for source, lookup in providers
-                         for tags in [lookup()] if tags]
-            merged = merge_consensus(collected)
+                         for tags in [call(source, lookup)] if tags]
+            merged = merge_consensus(collected, vocab=vocab)
             if merged:
-                cache.set(cache_key, merged, "Consensus")
+                cache.set(cache_key, merged, "Consensus", lookup=lookup_args)
+                if negatives is not None:
+                    negatives.clear(cache_key)
                 return merged, "Consensus"
         else:
             # First provider that returns something wins.
+            if provider_order is not None:
+                providers = provider_order.order(providers)
             for source, lookup in providers:
-                genres = lookup()
+                genres = call(source, lookup)
                 if genres:
-                    cache.set(cache_key, genres, source)
+                    cache.set(cache_key, genres, source, lookup=lookup_args)
+                    if negatives is not None:
+                        negatives.clear(cache_key)
                     return genres, source
 
-        # Cache the negative result too (short TTL) so it is retried before long.
-        cache.set(cache_key, [], "None")
+        if refresh:
+            return [], "None"  # keep serving the stale answer rather than "not found"
+        # Cache the negative result too (short TTL) so it is retried before long;
+        # if a breaker skipped a provider, only until the breaker may close.
+        # Repeat misses back off exponentially.
+        ttl = None
+        if skipped:
+            ttl = breakers.retry_ttl
+        elif negatives is not None:
+            ttl = negatives.backoff_ttl(negatives.record_miss(cache_key), cache.negative_ttl)
+        cache.set(cache_key, [], "None", ttl=ttl)
         return [], "None"
 
     return get_best_genre
@@ -183,16 +273,41 @@ def _make_genre_resolver(backend, config, cache, overrides=None,
 # -----------------------------
 #  Clustering + ordering
 # -----------------------------
-def _order_from_similarity(names, sim, segmentation_strength, max_clusters):
+def _mst_graph(dist, workspace=None):
+    """MST of ``dist`` as a networkx graph (edges added in row-major order).
+
+    Builds the graph from the sparse tree directly instead of densifying it;
+    under a memory budget a dense Prim pass avoids scipy's sparse copy of the
+    complete graph.
+    """
+    G = nx.Graph()
+    G.add_nodes_from(range(dist.shape[0]))
+    if workspace is not None and workspace.enabled:
+        G.add_weighted_edges_from(prim_mst_edges(dist))
+        return G
+    tree = minimum_spanning_tree(dist).tocoo()
+    order = np.lexsort((tree.col, tree.row))
+    G.add_weighted_edges_from(
+        zip(tree.row[order].tolist(), tree.col[order].tolist(), tree.data[order].tolist())
+    )
+    return G
+
+
+def _order_from_similarity(names, sim, segmentation_strength, max_clusters,
+                           workspace=None):
     """Cluster (MST + silhouette) and greedily chain albums into one order.
 
     ``names`` are the album identifiers aligned to the rows/cols of ``sim``;
-    returns the album names in their final order.
+    returns the album names in their final order. With a budgeted
+    ``workspace`` the distance matrix reuses its shared scratch buffer.
     """
     n = len(names)
-    dist = 1.0 - sim
-    mst = minimum_spanning_tree(dist).toarray()
-    G = nx.from_numpy_array(mst)
+    budgeted = workspace is not None and workspace.enabled
+    dist = distance_into(sim, workspace) if budgeted else 1.0 - sim
+    # Rounding can leave ``1 - sim`` a hair below zero, which makes the
+    # precomputed silhouette reject the matrix; clip in place.
+    np.maximum(dist, 0.0, out=dist)
+    G = _mst_graph(dist, workspace)
 
     edges = sorted(G.edges(data=True), key=lambda x: x[2]["weight"], reverse=True)
     weights = np.array([w["weight"] for *_, w in edges]) if edges else np.array([0.0])
@@ -249,32 +364,40 @@ def _order_from_similarity(names, sim, segmentation_strength, max_clusters):
             )
             final_comps[best_i].add(idx)
 
-    reset_factor = (
-        float(np.quantile(sim[np.triu_indices_from(sim, k=1)], 0.35 + 0.3 * strength))
-        if len(sim) > 1 else 0.5
-    )
-
-    def greedy_chain(albums, sim_df, threshold_ratio):
-        chain, prev_sim = [], 1.0
-        sub = sim_df.loc[albums, albums]
-        start = sub.mean(axis=1).idxmax()
-        chain.append(start)
-        remaining = set(albums) - {start}
-        while remaining:
-            last = chain[-1]
-            sims = sim_df.loc[last, list(remaining)]
-            best, val = sims.idxmax(), sims.max()
+    # ``dist`` is no longer needed; under a budget its scratch buffer is
+    # reused to gather the upper triangle for the quantile.
+    del dist
+    reset_q = 0.35 + 0.3 * strength
+    if len(sim) <= 1:
+        reset_factor = 0.5
+    elif budgeted:
+        reset_factor = upper_triangle_quantile(sim, reset_q, workspace)
+    else:
+        reset_factor = float(np.quantile(sim[np.triu_indices_from(sim, k=1)], reset_q))
+
+    def greedy_chain(comp, threshold_ratio):
+        # Index-based so ties and resets follow component order rather than
+        # set/hash order: the chain is identical in every process.
+        idx = list(comp)
+        means = np.array([np.mean(sim[i, idx]) for i in idx])
+        start = int(np.argmax(means))
+        chain, prev_sim = [start], 1.0
+        remaining = np.ones(len(idx), dtype=bool)
+        remaining[start] = False
+        while remaining.any():
+            row = np.where(remaining, sim[idx[chain[-1]], idx], -np.inf)
+            best = int(np.argmax(row))
+            val = row[best]
             if val < prev_sim * threshold_ratio:
-                nxt = remaining.pop(); chain.append(nxt); prev_sim = 1.0
+                nxt = int(np.argmax(remaining))
+                chain.append(nxt); remaining[nxt] = False; prev_sim = 1.0
             else:
-                chain.append(best); remaining.remove(best); prev_sim = val
-        return chain
+                chain.append(best); remaining[best] = False; prev_sim = val
+        return [names[idx[i]] for i in chain]
 
-    album_similarity = pd.DataFrame(sim, index=names, columns=names)
     sorted_albums = []
     for comp in final_comps:
-        comp_names = [names[i] for i in comp]
-        sorted_albums.extend(greedy_chain(comp_names, album_similarity, reset_factor))
+        sorted_albums.extend(greedy_chain(comp, reset_factor))
     return sorted_albums
 
 
@@ -299,8 +422,134 @@ def _nearest_neighbor_order(labels, sim):
     return [labels[i] for i in order]
 
 
+def _micro_order_task(path, offset, k, dtype, sub_names, segmentation_strength,
+                      max_clusters, budget_mb, scratch_dir):
+    """Process-pool entry point: order one root family.
+
+    The family's similarity block is read from the packed, memory-mapped
+    scratch file written by the parent, so only that sub-matrix is paged in.
+    """
+    sub_sim = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(k, k))
+    with SimilarityWorkspace(budget_mb, scratch_dir) as workspace:
+        return _order_from_similarity(
+            sub_names, sub_sim, segmentation_strength, max_clusters, workspace
+        )
+
+
+def _family_rows(sim, idx, workspace):
+    """Yield ``(start, rows)``: ``sim[np.ix_(idx, idx)]`` gathered in row blocks.
+
+    Under a budget each block stays within the workspace's block size, so a
+    family covering most of the library never needs a second near-``n x n``
+    temporary.
+    """
+    idx = np.asarray(idx)
+    step = workspace.block_rows(len(idx)) if workspace is not None else len(idx)
+    for start in range(0, len(idx), step):
+        yield start, sim[np.ix_(idx[start:start + step], idx)]
+
+
+def _family_block(sim, idx, workspace):
+    """``sim[np.ix_(idx, idx)]`` in a ``workspace`` buffer (spilled if over budget)."""
+    if workspace is None:
+        return sim[np.ix_(idx, idx)]
+    block = workspace.empty((len(idx), len(idx)))
+    for start, rows in _family_rows(sim, idx, workspace):
+        block[start:start + len(rows)] = rows
+    return block
+
+
+def _worker_budget_mb(workspace, packed_bytes, workers):
+    """Each pool worker's share of the budget left by the parent and the packed file.
+
+    At least 1 MB, so a worker always has room for small families (larger
+    buffers spill to disk).
+    """
+    left = workspace.budget - workspace.resident_bytes - packed_bytes
+    return max(left / workers / MB, 1.0)
+
+
+def _parallel_micro_orders(names, sim_tags, groups, roots, segmentation_strength,
+                           max_clusters, workspace, workers):
+    """Run :func:`_order_from_similarity` for each root family in a process pool.
+
+    The per-family sub-matrices are packed, in budgeted row blocks, into one
+    memory-mapped file (in ``/dev/shm`` when available) that every worker maps
+    read-only. Results are
+    keyed by root, so the output is independent of completion order. Under a
+    budget, what the parent and the packed file don't use is split between the
+    workers.
+    """
+    dtype = np.dtype(sim_tags.dtype)
+    sizes = {r: len(groups[r]) ** 2 for r in roots}
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    fd, path = tempfile.mkstemp(dir=directory, prefix="micro_", suffix=".dat")
+    os.close(fd)
+    try:
+        packed = np.memmap(path, dtype=dtype, mode="w+", shape=(sum(sizes.values()),))
+        offsets, pos = {}, 0
+        for r in roots:
+            k = len(groups[r])
+            for start, rows in _family_rows(sim_tags, groups[r], workspace):
+                packed[pos + start * k:pos + (start + len(rows)) * k] = rows.ravel()
+            offsets[r] = pos * dtype.itemsize
+            pos += sizes[r]
+        packed.flush()
+        del packed
+
+        workers = min(workers, len(roots))
+        budgeted = workspace is not None and workspace.enabled
+        budget_mb = (_worker_budget_mb(workspace, pos * dtype.itemsize, workers)
+                     if budgeted else None)
+        scratch_dir = workspace.scratch_dir if budgeted else None
+        # Largest families first so the long tasks start early.
+        submit_order = sorted(roots, key=lambda r: -sizes[r])
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                r: pool.submit(
+                    _micro_order_task, path, offsets[r], len(groups[r]), dtype.str,
+                    [names[i] for i in groups[r]], segmentation_strength, max_clusters,
+                    budget_mb, scratch_dir,
+                )
+                for r in submit_order
+            }
+            return {r: futures[r].result() for r in roots}
+    finally:
+        os.remove(path)
+
+
+def _micro_orders(names, sim_tags, groups, segmentation_strength, max_clusters,
+                  workspace=None, workers=1):
+    """Order the albums inside each root family (full-tag similarity).
+
+    With ``workers > 1`` the independent families are dispatched to a process
+    pool; the result is identical to the serial loop.
+    """
+    micro = {r: [names[idx[0]]] for r, idx in groups.items() if len(idx) == 1}
+    multi = [r for r, idx in groups.items() if len(idx) > 1]
+    if workers > 1 and len(multi) > 1:
+        try:
+            micro.update(_parallel_micro_orders(
+                names, sim_tags, groups, multi, segmentation_strength, max_clusters,
+                workspace, workers,
+            ))
+            return micro
+        except (OSError, BrokenProcessPool) as exc:
+            print(f"⚠️ Parallel micro-ordering unavailable ({exc}); running serially.",
+                  file=sys.stderr)
+    for root in multi:
+        idx = groups[root]
+        block = _family_block(sim_tags, idx, workspace)
+        micro[root] = _order_from_similarity(
+            [names[i] for i in idx], block, segmentation_strength, max_clusters, workspace,
+        )
+        if workspace is not None:
+            workspace.release(block)
+    return micro
+
+
 def _two_level_order(names, M, sim_tags, tag_sets, roots,
-                     segmentation_strength, max_clusters):
+                     segmentation_strength, max_clusters, workspace=None, workers=1):
     """Order albums macro-by-root, micro-by-tags, with block orientation.
 
     1. Micro: within each root family, order albums by full-tag similarity using
@@ -321,7 +570,8 @@ def _two_level_order(names, M, sim_tags, tag_sets, roots,
 
     # Macro ordering of root families via tag-centroid similarity.
     if M.shape[1] > 0:
-        centroids = np.array([M[groups[r]].mean(axis=0) for r in root_labels])
+        centroids = np.array([np.asarray(M[groups[r]].mean(axis=0)).ravel()
+                              for r in root_labels])
         root_sim = cosine_similarity(centroids)
     else:
         root_sim = np.zeros((len(root_labels), len(root_labels)))
@@ -337,17 +587,9 @@ def _two_level_order(names, M, sim_tags, tag_sets, roots,
     macro = main_order + tail_order
 
     # Micro ordering inside each root family (full-tag similarity).
-    micro = {}
-    for root in root_labels:
-        idx = groups[root]
-        if len(idx) == 1:
-            micro[root] = [names[idx[0]]]
-        else:
-            sub_sim = sim_tags[np.ix_(idx, idx)]
-            sub_names = [names[i] for i in idx]
-            micro[root] = _order_from_similarity(
-                sub_names, sub_sim, segmentation_strength, max_clusters
-            )
+    micro = _micro_orders(
+        names, sim_tags, groups, segmentation_strength, max_clusters, workspace, workers
+    )
 
     name_to_set = dict(zip(names, tag_sets))
 
@@ -419,66 +661,241 @@ def _apply_artist_consistency(roots, artists, pinned):
     return roots
 
 
+def _similarity_matrices(codes, rules, root_weight, workspace, store=None):
+    """Return ``(M, sim_tags, sim_roots)`` for encoded albums.
+
+    ``M`` is the sparse album x tag one-hot; the similarities are computed
+    blockwise in float32 under a budget. With a
+    :class:`~similarity_store.SimilarityStore`, rows of albums whose tag lists
+    were seen last run are loaded from disk instead of recomputed.
+    """
+    n = len(codes)
+    M = codes.one_hot()
+    if store is not None:
+        workspace = workspace if workspace is not None else SimilarityWorkspace()
+        features = {
+            "sim_tags": M,
+            "sim_roots": encoded_root_features(codes, rules, root_weight,
+                                               dtype=workspace.dtype),
+        }
+        sims = store.similarities(
+            [album_key(g) for g in codes.display_lists()], features,
+            store_version(rules, root_weight, workspace.dtype), workspace,
+        )
+        return M, sims["sim_tags"], sims["sim_roots"]
+    if workspace is not None and workspace.enabled:
+        sim_tags = blocked_cosine_similarity(M, workspace)
+        features = encoded_root_features(codes, rules, root_weight, dtype=workspace.dtype)
+        return M, sim_tags, blocked_cosine_similarity(features, workspace)
+    features = encoded_root_features(codes, rules, root_weight)
+    sim_tags = cosine_similarity(M) if M.shape[1] else np.zeros((n, n))
+    sim_roots = cosine_similarity(features) if features.shape[1] else np.zeros((n, n))
+    return M, sim_tags, sim_roots
+
+
 def _order_albums(df, segmentation_strength, max_clusters, root_weight, rules,
-                  overrides=None, ordering_mode="two_level", artist_consistency=False):
+                  overrides=None, ordering_mode="two_level", artist_consistency=False,
+                  workspace=None, workers=1, refine_ms=0, previous_state=None,
+                  drift_threshold=DEFAULT_DRIFT_THRESHOLD, similarity_store=None,
+                  vocab=None):
     unique_albums_df = df.drop_duplicates(subset=["Unique Album"]).copy()
     raw_lists = [g if isinstance(g, list) else [] for g in unique_albums_df["Album Genre"]]
-    genre_sorted = normalize_and_sort_genres(raw_lists)
-    unique_albums_df["Sorted Genres"] = [", ".join(sub) for sub in genre_sorted]
+    # Tags are normalized once into the run vocabulary; from here on albums are
+    # rows of tag ids (broad -> niche) rather than lists of strings.
+    with stage("ordering.encode") as s:
+        codes = (vocab if vocab is not None else TagVocabulary()).encode_albums(raw_lists)
+        unique_albums_df["Sorted Genres"] = [", ".join(sub) for sub in codes.display_lists()]
+        norm_sets = codes.norm_sets()
+        # Normalized tags for the incremental-order state (display names may
+        # contain commas, so they can't be recovered from "Sorted Genres").
+        unique_albums_df["Tags"] = [sorted(tags) for tags in norm_sets]
+        s.items = len(codes)
 
     names = list(unique_albums_df["Unique Album"])
     artists = list(unique_albums_df["Artist"])
     albums = list(unique_albums_df["Album"])
-    tag_sets = [{t.strip().lower() for t in sub if t.strip()} for sub in genre_sorted]
-    pinned = []
-    roots = []
-    for i in range(len(genre_sorted)):
-        override = lookup_override(overrides, artists[i], albums[i])
-        forced = bool(override and override.get("root"))
-        pinned.append(forced)
-        roots.append(override["root"] if forced
-                     else infer_root(genre_sorted[i], rules))
-    if artist_consistency:
-        roots = _apply_artist_consistency(roots, artists, pinned)
+    tag_sets = codes.id_sets()
+    with stage("ordering.roots"):
+        inferred = infer_roots_encoded(codes, rules)
+        pinned = []
+        roots = []
+        for i in range(len(codes)):
+            override = lookup_override(overrides, artists[i], albums[i])
+            forced = bool(override and override.get("root"))
+            pinned.append(forced)
+            roots.append(override["root"] if forced else inferred[i])
+        if artist_consistency:
+            roots = _apply_artist_consistency(roots, artists, pinned)
     unique_albums_df["Root Genre"] = [display_root(r) for r in roots]
     tag_sets_by_name = dict(zip(names, tag_sets))
     root_by_name = dict(zip(names, roots))
 
+    rebuild_stats = None
+    if previous_state is not None:
+        # Incremental mode: splice additions/removals into the stored order
+        # and skip the full similarity + clustering pass entirely.
+        with stage("ordering.incremental"):
+            planned, rebuild_stats = plan_incremental_order(
+                previous_state, names, norm_sets, list(unique_albums_df["Root Genre"]),
+                drift_threshold,
+            )
+        if planned is not None:
+            metrics = {"incremental": {
+                **_ordering_metric(planned, tag_sets_by_name, root_by_name), **rebuild_stats,
+            }}
+            return _ordering_frame(unique_albums_df, planned), metrics
+
     # Per-tag one-hot (shared by legacy ordering and the two-level micro/macro
     # steps) and the root-weighted similarity used by the single-pass "roots".
-    M = MultiLabelBinarizer().fit_transform(genre_sorted)
-    sim_tags = cosine_similarity(M) if M.shape[1] else np.zeros((len(names), len(names)))
-    sim_roots = genre_similarity_matrix(genre_sorted, rules, root_weight)
-
-    orders = {
-        "legacy": _order_from_similarity(names, sim_tags, segmentation_strength, max_clusters),
-        "roots": _order_from_similarity(names, sim_roots, segmentation_strength, max_clusters),
-        "two_level": _two_level_order(
-            names, M, sim_tags, tag_sets, roots, segmentation_strength, max_clusters
-        ),
-    }
-    metrics = {m: _ordering_metric(o, tag_sets_by_name, root_by_name) for m, o in orders.items()}
+    with stage("ordering.similarity", items=len(names)):
+        M, sim_tags, sim_roots = _similarity_matrices(
+            codes, rules, root_weight, workspace, similarity_store
+        )
+
+    orders = {}
+    with stage("ordering.legacy"):
+        orders["legacy"] = _order_from_similarity(
+            names, sim_tags, segmentation_strength, max_clusters, workspace
+        )
+    with stage("ordering.roots_order"):
+        orders["roots"] = _order_from_similarity(
+            names, sim_roots, segmentation_strength, max_clusters, workspace
+        )
+    with stage("ordering.two_level"):
+        orders["two_level"] = _two_level_order(
+            names, M, sim_tags, tag_sets, roots, segmentation_strength, max_clusters,
+            workspace, workers
+        )
+    with stage("ordering.metrics"):
+        metrics = {m: _ordering_metric(o, tag_sets_by_name, root_by_name)
+                   for m, o in orders.items()}
 
     if ordering_mode not in orders:
         ordering_mode = "two_level"
     chosen = orders[ordering_mode]
 
+    if refine_ms and refine_ms > 0 and len(chosen) > 2:
+        # Post-optimise the chosen order on the similarity it was built from;
+        # moves stay inside root runs, so contiguity is untouched.
+        objective = sim_roots if ordering_mode == "roots" else sim_tags
+        position = {name: i for i, name in enumerate(names)}
+        with stage("ordering.refine"):
+            refined, stats = refine_order(
+                [position[name] for name in chosen], objective,
+                [root_by_name[name] for name in chosen], refine_ms,
+            )
+        chosen = [names[i] for i in refined]
+        after = _ordering_metric(chosen, tag_sets_by_name, root_by_name)
+        stats["overlap_before"] = metrics[ordering_mode]["overlap"]
+        stats["overlap_after"] = after["overlap"]
+        metrics[ordering_mode]["refine"] = stats
+    if rebuild_stats is not None:
+        metrics[ordering_mode]["rebuild"] = rebuild_stats
+    if workspace is not None and workspace.enabled:
+        workspace.release(sim_tags)
+        workspace.release(sim_roots)
+
+    return _ordering_frame(unique_albums_df, chosen), metrics
+
+
+def _ordering_frame(unique_albums_df, chosen):
     sort_index = {name: i for i, name in enumerate(chosen)}
     unique_albums_df["Sort Order"] = unique_albums_df["Unique Album"].map(sort_index)
     unique_albums_df = unique_albums_df.sort_values("Sort Order")
-    ordering = unique_albums_df[["Unique Album", "Sort Order", "Sorted Genres", "Root Genre"]]
-    return ordering, metrics
+    columns = ["Unique Album", "Sort Order", "Sorted Genres", "Root Genre"]
+    if "Tags" in unique_albums_df:  # normalized tags, for the incremental-order state
+        columns.append("Tags")
+    return unique_albums_df[columns]
 
 
 # -----------------------------
 #  Top-level entry point
 # -----------------------------
-def run(backend, config, refresh_cache=False, no_cache=False):
-    """Run the full pipeline for an authenticated backend."""
-    source_slug, source_label, songs_data = _collect_source(backend)
+def _print_ordering_report(metrics, ordering_mode, peak_bytes, memory_budget_mb,
+                           spilled_bytes, traced=True):
+    print("\n📊 Genre ordering (higher adjacent overlap / lower fragmentation is better):")
+    if "incremental" in metrics:
+        inc = metrics["incremental"]
+        print(f"   Incremental update: +{inc['added']} / -{inc['removed']} albums "
+              f"(drift {inc['drift']:.3f})")
+        print(f"   Adjacent tag overlap (Jaccard): {inc['overlap']:.3f}  "
+              f"fragmented root families: {inc['fragmented']}")
+        print(f"   Active ordering mode: {ordering_mode} (incremental)")
+    else:
+        legacy, roots, two = metrics["legacy"], metrics["roots"], metrics["two_level"]
+        print(f"   Adjacent tag overlap (Jaccard): legacy {legacy['overlap']:.3f}  "
+              f"roots {roots['overlap']:.3f}  two_level {two['overlap']:.3f}")
+        print(f"   Fragmented root families:       legacy {legacy['fragmented']}  "
+              f"roots {roots['fragmented']}  two_level {two['fragmented']}")
+        print(f"   Active ordering mode: {ordering_mode}")
+        rebuild = metrics[ordering_mode].get("rebuild")
+        if rebuild:
+            print(f"   Full rebuild: drift {rebuild['drift']:.3f} since the stored order "
+                  f"(+{rebuild['added']} / -{rebuild['removed']} albums)")
+        refine = metrics[ordering_mode].get("refine")
+        if refine:
+            print(f"   Local-search refinement ({refine['moves']} moves, {refine['ms']:.0f} ms): "
+                  f"adjacent overlap {refine['overlap_before']:.3f} → "
+                  f"{refine['overlap_after']:.3f} "
+                  f"({refine['overlap_after'] - refine['overlap_before']:+.3f})")
+    budget_note = (
+        f" (budget {memory_budget_mb:.0f} MB, {spilled_bytes / MB:.0f} MB spilled to disk)"
+        if memory_budget_mb else ""
+    )
+    if peak_bytes is None:
+        if budget_note:
+            print(f"   Memory{budget_note}")
+    elif traced:
+        print(f"   Ordering peak memory: {peak_bytes / MB:.1f} MB{budget_note}")
+    else:
+        print(f"   Peak memory (process RSS): {peak_bytes / MB:.1f} MB{budget_note}")
+
+
+def _peak_rss_bytes():
+    """Peak resident set size of the process so far (``None`` where unavailable)."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux reports KiB
+
+
+def _ordering_peak_memory():
+    """``(peak_bytes, traced)`` for the ordering stage that just ran.
 
-    df = pd.DataFrame(songs_data)
-    if df.empty:
+    ``tracemalloc`` slows the ordering stage down about threefold, so the
+    traced peak is only available from the profiler's ``ordering`` record
+    (``--profile``, which folds nested stages into it); otherwise the
+    process's peak RSS is reported.
+    """
+    profiler = active_profiler()
+    record = profiler.records.get("ordering") if profiler is not None else None
+    if record is not None and record.peak_bytes is not None:
+        return record.peak_bytes, True
+    return _peak_rss_bytes(), False
+
+
+def _publish_provider_stats(provider_metrics, breakers, provider_order, prometheus_file):
+    """Record the run's provider calls: profile notes, adaptive history, Prometheus."""
+    note("providers", provider_metrics.report())
+    if breakers is not None:
+        note("breakers", breakers.report())
+    if provider_order is not None:
+        note("adaptive_order", provider_order.finish(provider_metrics))
+    if prometheus_file:
+        provider_metrics.write_prometheus(os.path.expanduser(prometheus_file))
+
+
+def run(backend, config, refresh_cache=False, no_cache=False, cache_only=False):
+    """Run the full pipeline for an authenticated backend.
+
+    With ``cache_only`` no provider is called: albums missing from the genre
+    cache (see ``prewarm.py``) are left without a genre.
+    """
+    source_slug, source_label, tracks = _collect_source(backend)
+
+    if not tracks:
         print("No tracks found for the selected source. Nothing to sort.")
         sys.exit(0)
 
@@ -487,98 +904,226 @@ def run(backend, config, refresh_cache=False, no_cache=False):
     if overrides:
         print(f"🛠️  Loaded {len(overrides)} manual genre override(s).")
 
-    resolution = config.get("GENRE", "resolution", fallback="first_match").strip().lower()
-    if resolution not in ("first_match", "consensus"):
-        resolution = "first_match"
+    resolution = _resolution_from_config(config)
 
     cache = build_cache_from_config(config, refresh=refresh_cache, disabled=no_cache)
     if cache.enabled:
-        mode = " (refresh)" if refresh_cache else ""
-        print(f"🗃️  Genre cache: {cache.backend}{mode}")
+        mode = " (refresh)" if refresh_cache else " (cache only)" if cache_only else ""
+        shared = f" + shared {cache.shared.url}" if cache.shared is not None else ""
+        print(f"🗃️  Genre cache: {cache.backend}{shared}{mode}")
     print(f"🔎 Fetching genres for songs (resolution: {resolution})...")
-    get_best_genre = _make_genre_resolver(backend, config, cache, overrides, resolution)
-    album_genres, album_genre_sources = [], []
+    # One vocabulary per run: every distinct tag is normalized exactly once and
+    # shared by the consensus merge and the ordering stage.
+    vocab = TagVocabulary()
+    provider_metrics = ProviderMetrics()
+    provider_order = None
+    if resolution == "first_match" and config.getboolean("GENRE", "adaptive_order",
+                                                         fallback=False):
+        provider_order = AdaptiveOrder(
+            ProviderHistory(config.get("GENRE", "adaptive_stats_file", fallback=None) or None,
+                            scope=backend.key),
+            quality_ratio=float(config.get("GENRE", "adaptive_quality_ratio", fallback="1.0")),
+        )
+    breakers = _breakers_from_config(config)
+    negatives = build_negative_index_from_config(config, disabled=not cache.enabled or cache_only)
+    get_best_genre = _make_genre_resolver(backend, config, cache, overrides, resolution, vocab,
+                                          provider_metrics, provider_order, breakers,
+                                          service=backend.key, cache_only=cache_only,
+                                          negatives=negatives)
+    # The only DataFrame of the run, built column-wise; its index is the
+    # position in ``tracks``. Album identity (cleaned names, Unique Album,
+    # cache keys) is computed once per distinct album, and the resolver runs
+    # once per (Album ID, Album, Artist) group instead of once per track.
+    with stage("album_identity", items=len(tracks)):
+        df = tracks_frame(tracks)
+        identity = album_identity(df)
+    note("tracks", len(tracks))
+    note("albums", len(identity))
+    group_genres = [None] * len(identity)
+    group_sources = [None] * len(identity)
+
+    def resolve_group(g):
+        row = identity.first[g]
+        track = tracks[row]
+        group_genres[g], group_sources[g] = get_best_genre(
+            track.song, track.artist, track.album, track.album_id, track.track_id,
+            clean_name=identity.clean_names[row], cache_key=identity.cache_keys[g],
+        )
+
     try:
-        for row in tqdm(df.to_dict("records"), total=len(df), desc="Genres", unit="track"):
-            genres, source = get_best_genre(
-                row.get("Song"),
-                row.get("Artist"),
-                row.get("Album"),
-                row.get("Album ID"),
-                row.get(backend.track_id_col),
-            )
-            album_genres.append(genres)
-            album_genre_sources.append(source)
+        # Read local misses through the shared cache in batches, then let the
+        # backend bulk-load provider data for the albums that will actually
+        # hit the providers (cache misses only).
+        cache.prefetch(_resolver_cache_key(k, resolution) for k in identity.cache_keys)
+        pending = [
+            g for g in range(len(identity))
+            if cache.get(_resolver_cache_key(identity.cache_keys[g], resolution)) is None
+        ]
+        if pending and not cache_only:
+            with stage("enrichment.prefetch", items=len(pending)):
+                backend.prefetch_genres([tracks[identity.first[g]] for g in pending], config)
+        # Albums that missed on several previous runs go last, on their own budget.
+        deferred = []
+        if negatives is not None:
+            misses = {g: negatives.misses(_resolver_cache_key(identity.cache_keys[g], resolution))
+                      for g in pending}
+            deferred = sorted((g for g in pending if misses[g] >= negatives.defer_after > 0),
+                              key=misses.get)
+        deferred_set = set(deferred)
+        with stage("enrichment.resolve", items=len(identity) - len(deferred)):
+            for g in tqdm([g for g in range(len(identity)) if g not in deferred_set],
+                          desc="Genres", unit="album"):
+                resolve_group(g)
+        if deferred:
+            budget = float(config.get("CACHE", "deferred_budget_s",
+                                      fallback=DEFAULT_DEFERRED_BUDGET_S))
+            postponed = 0
+            with stage("enrichment.deferred", items=len(deferred)):
+                deadline = time.perf_counter() + budget
+                for g in tqdm(deferred, desc="Repeat misses", unit="album"):
+                    if time.perf_counter() >= deadline:
+                        group_genres[g], group_sources[g] = [], "None"
+                        postponed += 1
+                        continue
+                    resolve_group(g)
+            print(f"🕳️  {len(deferred)} album(s) that found no genre on earlier runs were "
+                  f"tried last ({postponed} postponed to a later run).")
+            note("deferred", {"albums": len(deferred), "postponed": postponed})
     finally:
-        cache.close()
-    df["Album Genre"] = album_genres
-    df["source"] = album_genre_sources
-
-    # Unique identifier - group by normalized album name + primary artist so
-    # that multiple Tidal editions/IDs of the same album are treated as one
-    # album. Keep the raw Album ID for various-artist releases (compilations /
-    # soundtracks) so they are not split apart by their per-track artists.
-    _clean_name = df["Album"].fillna("").map(clean_album_name).str.casefold().str.strip()
-    _artist_key = df["Artist"].fillna("").str.casefold().str.strip()
-    _name_key = _clean_name + " \u2014 " + _artist_key
-    _artists_per_album = df.groupby("Album ID")["Artist"].transform("nunique")
-    df["Unique Album"] = _name_key.where(
-        df["Album ID"].isna() | (_artists_per_album <= 1),
-        df["Album ID"].astype("string"),
-    )
-
-    segmentation_strength = float(config.get("CLUSTERING", "segmentation_strength", fallback="0.6"))
-    max_clusters = int(config.get("CLUSTERING", "max_clusters", fallback="10"))
-    root_weight = float(config.get("CLUSTERING", "genre_root_weight", fallback="2.0"))
-    roots_file = config.get("CLUSTERING", "genre_roots_file", fallback=None) or None
-    rules = load_genre_roots(roots_file)
-    ordering_mode = config.get("CLUSTERING", "ordering_mode", fallback="two_level").strip().lower()
-    if ordering_mode not in ORDERING_MODES:
-        ordering_mode = "two_level"
-    artist_consistency = config.getboolean(
-        "CLUSTERING", "artist_root_consistency", fallback=False
-    )
-    ordering, metrics = _order_albums(
-        df, segmentation_strength, max_clusters, root_weight, rules, overrides,
-        ordering_mode, artist_consistency
-    )
-
-    legacy, roots, two = metrics["legacy"], metrics["roots"], metrics["two_level"]
-    print("\n📊 Genre ordering (higher adjacent overlap / lower fragmentation is better):")
-    print(f"   Adjacent tag overlap (Jaccard): legacy {legacy['overlap']:.3f}  "
-          f"roots {roots['overlap']:.3f}  two_level {two['overlap']:.3f}")
-    print(f"   Fragmented root families:       legacy {legacy['fragmented']}  "
-          f"roots {roots['fragmented']}  two_level {two['fragmented']}")
-    print(f"   Active ordering mode: {ordering_mode}")
-
-    final_df = (
-        pd.merge(df, ordering, on="Unique Album", how="left")
-        .sort_values(["Sort Order", "Disc Number", "Track Number"])
-    )
-    final_df["Album Genre"] = final_df["Sorted Genres"]
-    final_df.drop(columns=["Sorted Genres"], inplace=True)
-
-    # -----------------------------
-    #  Create playlist & save CSV
-    # -----------------------------
-    current_date = datetime.today().strftime('%Y-%m-%d')
-    playlist_name = f"liked songs sorted {current_date}"
-    playlist_description = (
-        f"Playlist created by {backend.display_name} Sorter from "
-        f"{source_label.lower()} using album genre similarity."
-    )
-
-    handle = backend.create_playlist(playlist_name, playlist_description)
-    print(f"\n🎯 Created playlist: {playlist_name}")
-
-    uploaded, local_count = backend.add_tracks(handle, final_df.to_dict("records"))
+        with stage("enrichment.finish"):
+            backend.finish_genres()
+            cache.close()
+            if negatives is not None:
+                negatives.save()
+    provider_metrics.print_report()
+    if breakers is not None:
+        breakers.print_report()
+    prometheus_file = config.get("METRICS", "prometheus_file", fallback=None) or None
+    # Stale-while-revalidate: the stale entries served above are re-resolved
+    # in the background while ordering and upload run.
+    refresher = None
+    refresh_workers = int(config.get("CACHE", "refresh_workers", fallback="2"))
+    stale = []
+    for g in range(len(identity)):
+        if _resolver_cache_key(identity.cache_keys[g], resolution) in cache.stale:
+            track = tracks[identity.first[g]]
+            stale.append((identity.cache_keys[g], {
+                "song": track.song, "artist": track.artist, "album": track.album,
+                "album_id": track.album_id, "track_id": track.track_id,
+            }))
+    if stale and refresh_workers > 0 and not cache_only:
+        refresher = StaleRefresher(
+            get_best_genre, refresh_workers,
+            budget_s=float(config.get("CACHE", "refresh_budget_s", fallback="300")),
+        )
+        refresher.start(stale)
+        print(f"♻️  Refreshing {len(stale)} stale cache entries in the background.")
+    else:
+        _publish_provider_stats(provider_metrics, breakers, provider_order, prometheus_file)
+    try:
+        df["Album Genre"] = [group_genres[g] for g in identity.group]
+        df["source"] = [group_sources[g] for g in identity.group]
+        df["Unique Album"] = identity.unique_album
 
-    csv_filename = f"{backend.key}_{source_slug}_sorted_{current_date}.csv"
-    final_df.to_csv(csv_filename, index=False)
-    print(f"\n📁 Sorted songs saved to CSV: {csv_filename}")
-    if local_count:
-        print(
-            f"\n⚠️ {local_count} local track(s) were kept in the CSV/sorting output "
-            f"but could not be added to the playlist through the {backend.display_name} API."
+        segmentation_strength = float(
+            config.get("CLUSTERING", "segmentation_strength", fallback="0.6")
+        )
+        max_clusters = int(config.get("CLUSTERING", "max_clusters", fallback="10"))
+        root_weight = float(config.get("CLUSTERING", "genre_root_weight", fallback="2.0"))
+        roots_file = config.get("CLUSTERING", "genre_roots_file", fallback=None) or None
+        rules = load_genre_roots(roots_file)
+        ordering_mode = (
+            config.get("CLUSTERING", "ordering_mode", fallback="two_level").strip().lower()
         )
-    print(f"\n✅ Playlist '{playlist_name}' created successfully with {uploaded} tracks!")
+        if ordering_mode not in ORDERING_MODES:
+            ordering_mode = "two_level"
+        artist_consistency = config.getboolean(
+            "CLUSTERING", "artist_root_consistency", fallback=False
+        )
+        memory_budget_mb = float(config.get("CLUSTERING", "memory_budget_mb", fallback="0") or 0)
+        scratch_dir = config.get("CLUSTERING", "scratch_dir", fallback=None) or None
+        workers = int(config.get("CLUSTERING", "workers", fallback="1") or 1)
+        refine_ms = float(config.get("CLUSTERING", "refine_ms", fallback="0") or 0)
+        if workers <= 0:
+            workers = os.cpu_count() or 1
+        incremental = config.getboolean("CLUSTERING", "incremental", fallback=False)
+        state_path = (config.get("CLUSTERING", "state_file", fallback=None)
+                      or default_state_path(backend.key, source_slug))
+        drift_threshold = float(config.get(
+            "CLUSTERING", "drift_threshold", fallback=str(DEFAULT_DRIFT_THRESHOLD)
+        ))
+        store_dir = config.get("CLUSTERING", "similarity_store", fallback=None) or None
+        similarity_store = SimilarityStore(store_dir) if store_dir else None
+        previous_state = load_order_state(state_path) if incremental else None
+        if previous_state is not None and previous_state.get("mode") != ordering_mode:
+            previous_state = None  # ordering mode changed: rebuild from scratch
+        with SimilarityWorkspace(memory_budget_mb or None, scratch_dir) as workspace, \
+                stage("ordering", capture=True):
+            ordering, metrics = _order_albums(
+                df, segmentation_strength, max_clusters, root_weight, rules,
+                overrides, ordering_mode, artist_consistency, workspace, workers, refine_ms,
+                previous_state, drift_threshold, similarity_store, vocab,
+            )
+            spilled_bytes = workspace.spilled_bytes
+        peak_bytes, traced = _ordering_peak_memory()
+        note("ordering_mode", ordering_mode)
+        note("ordering_metrics", metrics)
+
+        if incremental:
+            # Drift is measured against the last full rebuild, which an
+            # incremental update carries forward.
+            baseline = state_baseline(previous_state) if "incremental" in metrics else None
+            save_order_state(state_path, ordering, ordering_mode, baseline)
+        ordering = ordering.drop(columns=["Tags"])
+        _print_ordering_report(metrics, ordering_mode, peak_bytes, memory_budget_mb, spilled_bytes,
+                               traced)
+        if similarity_store is not None and "incremental" not in metrics:
+            print(f"   Similarity store: {similarity_store.reused_rows} album rows reused, "
+                  f"{similarity_store.computed_rows} computed")
+
+        final_df = (
+            df.join(ordering.set_index("Unique Album"), on="Unique Album")
+            .sort_values(["Sort Order", "Disc Number", "Track Number"])
+        )
+        final_df["Album Genre"] = final_df["Sorted Genres"]
+        final_df.drop(columns=["Sorted Genres"], inplace=True)
+
+        # -----------------------------
+        #  Create playlist & save CSV
+        # -----------------------------
+        current_date = datetime.today().strftime('%Y-%m-%d')
+        playlist_name = f"liked songs sorted {current_date}"
+        playlist_description = (
+            f"Playlist created by {backend.display_name} Sorter from "
+            f"{source_label.lower()} using album genre similarity."
+        )
+
+        with stage("upload") as s:
+            handle = backend.create_playlist(playlist_name, playlist_description)
+            print(f"\n🎯 Created playlist: {playlist_name}")
+            uploaded, local_count = backend.add_tracks(handle, [tracks[i] for i in final_df.index])
+            s.items = uploaded
+
+        csv_filename = f"{backend.key}_{source_slug}_sorted_{current_date}.csv"
+        with stage("csv_export", items=len(final_df)):
+            final_df.to_csv(csv_filename, index=False)
+        print(f"\n📁 Sorted songs saved to CSV: {csv_filename}")
+        if local_count:
+            print(
+                f"\n⚠️ {local_count} local track(s) were kept in the CSV/sorting output "
+                f"but could not be added to the playlist through the {backend.display_name} API."
+            )
+        print(f"\n✅ Playlist '{playlist_name}' created successfully with {uploaded} tracks!")
+    finally:
+        # Runs even when ordering or upload fails, so the refresh threads
+        # stop calling providers and what they resolved is still flushed.
+        if refresher is not None:
+            with stage("cache_refresh"):
+                note("cache_refresh", refresher.finish())
+                backend.finish_genres()
+                cache.close()
+                if negatives is not None:
+                    negatives.save()
+            # The refresh called providers too: report and record those calls.
+            provider_metrics.print_report()
+            _publish_provider_stats(provider_metrics, breakers, provider_order, prometheus_file)
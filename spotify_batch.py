@@ -0,0 +1,281 @@
+"""Batched Spotify genre lookups.
+
+``get_spotify_album_info`` and ``get_spotify_track_artist_genres`` cost one
+request for the album/track plus one per artist, issued one album at a time.
+Spotify also exposes bulk endpoints (``albums``: 20 ids, ``tracks``: 50,
+``artists``: 50 per call). :class:`SpotifyGenreTable` collects every album and
+track id that still needs a lookup, resolves them with those bulk endpoints up
+front, and then answers the per-album provider calls from memory, which turns
+roughly ``3N`` requests into about ``N / 20``.
+
+Ids missing from the table (not prefetched, or a bulk call failed) fall back to
+the original per-item helpers, so results are the same either way.
+
+Tidal runs have no Spotify ids at all, so :class:`SpotifyCrossLookup` first
+maps names to ids: one artist search per *distinct* artist (which also yields
+the artist's genres), one page of that artist's discography to match album
+names locally, and a persistent match file so later runs skip both steps. The
+matched ids are then resolved through the same bulk table.
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+from genre_helpers import (
+    clean_album_name,
+    clean_tags,
+    get_spotify_album_info,
+    get_spotify_track_artist_genres,
+)
+
+ALBUM_BATCH = 20
+TRACK_BATCH = 50
+ARTIST_BATCH = 50
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class SpotifyGenreTable:
+    """Prefetched album / track / artist metadata for genre lookups."""
+
+    def __init__(self, sp):
+        self.sp = sp
+        self.albums = {}        # album id -> (album genres, [artist ids])
+        self.tracks = {}        # track id -> [artist ids]
+        self.artists = {}       # artist id -> genres
+        self.requests = 0
+
+    # --- prefetch -------------------------------------------------------------
+    def prefetch(self, album_ids=(), track_ids=(), artist_ids=()):
+        """Resolve ``album_ids`` and ``track_ids`` (and their artists) in bulk."""
+        albums = [a for a in dict.fromkeys(album_ids) if a and a not in self.albums]
+        tracks = [t for t in dict.fromkeys(track_ids) if t and t not in self.tracks]
+        for chunk in _chunks(albums, ALBUM_BATCH):
+            for item in self._bulk("albums", chunk):
+                self.albums[item["id"]] = (
+                    list(item.get("genres") or []),
+                    [a.get("id") for a in item.get("artists") or []],
+                )
+        for chunk in _chunks(tracks, TRACK_BATCH):
+            for item in self._bulk("tracks", chunk):
+                self.tracks[item["id"]] = [a.get("id") for a in item.get("artists") or []]
+
+        # Artists are only needed for albums without album-level genres and
+        # for track lookups.
+        wanted = list(artist_ids)
+        wanted += [art for genres, arts in self.albums.values() if not genres for art in arts]
+        wanted += [art for arts in self.tracks.values() for art in arts]
+        artists = [a for a in dict.fromkeys(wanted) if a and a not in self.artists]
+        for chunk in _chunks(artists, ARTIST_BATCH):
+            for item in self._bulk("artists", chunk):
+                self.artists[item["id"]] = list(item.get("genres") or [])
+
+    def _bulk(self, endpoint, ids):
+        """Call ``sp.<endpoint>(ids)`` and return its non-empty items."""
+        self.requests += 1
+        try:
+            payload = getattr(self.sp, endpoint)(ids) or {}
+        except Exception as exc:
+            print(f"⚠️ Spotify bulk {endpoint} lookup failed ({exc}); "
+                  "falling back to single lookups.", file=sys.stderr)
+            return []
+        return [item for item in payload.get(endpoint) or [] if item and item.get("id")]
+
+    def _artist_genres(self, artist_ids):
+        if any(a not in self.artists for a in artist_ids):
+            return None
+        return [g for a in artist_ids for g in self.artists[a]]
+
+    # --- lookups ----------------------------------------------------------------
+    def album_genres(self, album_id):
+        """Same result as :func:`genre_helpers.get_spotify_album_info`."""
+        entry = self.albums.get(album_id)
+        if entry is not None:
+            genres, artist_ids = entry
+            genres = clean_tags(genres)
+            if genres:
+                return genres
+            from_artists = self._artist_genres(artist_ids)
+            if from_artists is not None:
+                return clean_tags(from_artists)
+        return get_spotify_album_info(self.sp, album_id)
+
+    def track_artist_genres(self, track_id):
+        """Same result as :func:`genre_helpers.get_spotify_track_artist_genres`."""
+        artist_ids = self.tracks.get(track_id)
+        if artist_ids is not None:
+            genres = self._artist_genres(artist_ids)
+            if genres is not None:
+                return clean_tags(genres)
+        return get_spotify_track_artist_genres(self.sp, track_id)
+
+
+# -----------------------------------------------------------------------------
+#  Name-based cross-lookup (Tidal)
+# -----------------------------------------------------------------------------
+def default_match_path():
+    return os.path.join(
+        os.path.expanduser("~"), ".cache", "likes_songs_sorter", "spotify_matches.json"
+    )
+
+
+def _name_key(value):
+    return " ".join(str(value or "").strip().casefold().split())
+
+
+def _album_match_key(album_name, artist_name):
+    return f"{_name_key(album_name)}|{_name_key(artist_name)}"
+
+
+class SpotifyCrossLookup:
+    """Spotify genres for tracks known only by album / artist name.
+
+    Serves the ``Spotify Album`` and ``Spotify Artist`` providers of Tidal
+    runs with the same results as ``get_spotify_album_search_info`` and
+    ``get_spotify_artist_genres``, but shares searches across albums and
+    persists name -> id matches in ``match_path``.
+    """
+
+    def __init__(self, sp, match_path=None):
+        self.sp = sp
+        self.table = SpotifyGenreTable(sp)
+        self.match_path = os.path.expanduser(match_path or default_match_path())
+        self.album_ids = {}     # album|artist key -> Spotify album id (None: no match)
+        self.artist_ids = {}    # artist name key -> Spotify artist id (None: no match)
+        self.searches = 0
+        self._dirty = False
+        self._load()
+
+    # --- persistence ------------------------------------------------------------
+    def _load(self):
+        try:
+            with open(self.match_path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict):
+            # Only positive matches are persisted; misses are retried next run.
+            self.album_ids.update({k: v for k, v in (data.get("albums") or {}).items() if v})
+            self.artist_ids.update({k: v for k, v in (data.get("artists") or {}).items() if v})
+
+    def save(self):
+        """Write the positive name -> id matches back to ``match_path``."""
+        if not self._dirty:
+            return
+        data = {
+            "albums": {k: v for k, v in self.album_ids.items() if v},
+            "artists": {k: v for k, v in self.artist_ids.items() if v},
+        }
+        try:
+            directory = os.path.dirname(self.match_path) or "."
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump(data, fh)
+            os.replace(tmp, self.match_path)
+            self._dirty = False
+        except OSError as exc:
+            print(f"⚠️ Could not write Spotify match file ({exc}).", file=sys.stderr)
+
+    # --- prefetch -------------------------------------------------------------
+    def prefetch(self, pairs):
+        """Resolve ``(album_name, artist_name)`` pairs to ids, then bulk-load them."""
+        pairs = list(dict.fromkeys((album, artist) for album, artist in pairs))
+        for artist in dict.fromkeys(artist for _, artist in pairs):
+            if _name_key(artist) not in self.artist_ids:
+                self._search_artist(artist)
+
+        # Match albums against one page of each artist's discography.
+        by_artist = {}
+        for album, artist in pairs:
+            if _album_match_key(album, artist) not in self.album_ids:
+                by_artist.setdefault(artist, []).append(album)
+        for artist, albums in by_artist.items():
+            artist_id = self.artist_ids.get(_name_key(artist))
+            if not artist_id:
+                continue
+            catalogue = self._artist_albums(artist_id)
+            for album in albums:
+                album_id = catalogue.get(_name_key(clean_album_name(album or "")))
+                if album_id:
+                    self.album_ids[_album_match_key(album, artist)] = album_id
+                    self._dirty = True
+
+        album_ids = [self.album_ids.get(_album_match_key(a, r)) for a, r in pairs]
+        artist_ids = [self.artist_ids.get(_name_key(r)) for _, r in pairs]
+        self.table.prefetch(
+            [a for a in album_ids if a],
+            artist_ids=[a for a in artist_ids if a and a not in self.table.artists],
+        )
+        self.save()
+
+    def _search_artist(self, artist_name):
+        """One ``artist:`` search; records the id and genres of the top hit."""
+        key = _name_key(artist_name)
+        self.searches += 1
+        try:
+            res = self.sp.search(q=f"artist:{artist_name}", type="artist", limit=1)
+            items = res.get("artists", {}).get("items", [])
+        except Exception:
+            items = []  # remembered as a miss for this run, like an empty result
+        if not items or not items[0].get("id"):
+            self.artist_ids[key] = None
+            return None
+        top = items[0]
+        self.artist_ids[key] = top["id"]
+        self.table.artists[top["id"]] = list(top.get("genres") or [])
+        self._dirty = True
+        return top["id"]
+
+    def _artist_albums(self, artist_id):
+        """Cleaned album name -> id for the first page of an artist's releases."""
+        self.searches += 1
+        try:
+            res = self.sp.artist_albums(artist_id, limit=50) or {}
+        except Exception:
+            return {}
+        catalogue = {}
+        for item in res.get("items") or []:
+            if item and item.get("id"):
+                catalogue.setdefault(_name_key(clean_album_name(item.get("name") or "")),
+                                     item["id"])
+        return catalogue
+
+    # --- lookups ----------------------------------------------------------------
+    def album_genres(self, album_name, artist_name):
+        """Same result as :func:`genre_helpers.get_spotify_album_search_info`."""
+        key = _album_match_key(album_name, artist_name)
+        album_id = self.album_ids.get(key)
+        if key not in self.album_ids:
+            self.searches += 1
+            try:
+                query = f'album:"{album_name}" artist:"{artist_name}"'
+                res = self.sp.search(q=query, type="album", limit=1)
+                items = res.get("albums", {}).get("items", [])
+            except Exception:
+                return []
+            album_id = items[0].get("id") if items else None
+            self.album_ids[key] = album_id
+            self._dirty = self._dirty or bool(album_id)
+        if not album_id:
+            return []
+        return self.table.album_genres(album_id)
+
+    def artist_genres(self, artist_name):
+        """Same result as :func:`genre_helpers.get_spotify_artist_genres`."""
+        key = _name_key(artist_name)
+        artist_id = self.artist_ids.get(key)
+        if key not in self.artist_ids:
+            artist_id = self._search_artist(artist_name)
+        if not artist_id:
+            return []
+        genres = self.table.artists.get(artist_id)
+        if genres is None:
+            self.table.prefetch(artist_ids=[artist_id])
+            genres = self.table.artists.get(artist_id, [])
+        return clean_tags(genres)
@@ -0,0 +1,108 @@
+"""Interned genre-tag vocabulary and integer-encoded album tag lists.
+
+Genres used to travel through the pipeline as lists of strings that were
+re-normalized at every stage (title-cased for display, lower-cased again for
+root inference, tag sets and consensus merging). A :class:`TagVocabulary` is
+built once per run instead: every raw tag is normalized once, mapped to an
+integer id, and keeps a single display form. Albums are then carried as CSR
+rows of tag ids (:class:`AlbumTags`), which the one-hot matrix, root inference,
+similarity features and Jaccard metrics all consume directly.
+"""
+
+import numpy as np
+from scipy import sparse
+
+from genre_normalization import normalize_tag
+
+
+class TagVocabulary:
+    """Normalized tag -> int id, with a display form per id."""
+
+    def __init__(self):
+        self.ids = {}
+        self.norm = []
+        self.display = []
+        self._raw = {}
+
+    def __len__(self):
+        return len(self.norm)
+
+    def intern(self, tag):
+        """Return the id of ``tag`` (``None`` for blank tags)."""
+        try:
+            return self._raw[tag]
+        except (KeyError, TypeError):
+            pass
+        key = normalize_tag(tag)
+        if not key:
+            tag_id = None
+        else:
+            tag_id = self.ids.get(key)
+            if tag_id is None:
+                tag_id = len(self.norm)
+                self.ids[key] = tag_id
+                self.norm.append(key)
+                self.display.append(key.title())
+        try:
+            self._raw[tag] = tag_id
+        except TypeError:
+            pass
+        return tag_id
+
+    def encode_albums(self, genre_lists):
+        """Encode per-album tag lists as :class:`AlbumTags`.
+
+        Tags are de-duplicated per album and sorted by descending global
+        frequency across the albums (broad -> niche, stable for ties), the
+        same order ``normalize_and_sort_genres`` produces.
+        """
+        rows = []
+        for sub in genre_lists:
+            row, seen = [], set()
+            for tag in sub or []:
+                tag_id = self.intern(tag)
+                if tag_id is not None and tag_id not in seen:
+                    seen.add(tag_id)
+                    row.append(tag_id)
+            rows.append(row)
+        flat = [tag_id for row in rows for tag_id in row]
+        counts = np.bincount(np.asarray(flat, dtype=np.int64), minlength=len(self))
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        indices = []
+        for i, row in enumerate(rows):
+            indices.extend(sorted(row, key=lambda t: -counts[t]))
+            indptr[i + 1] = len(indices)
+        return AlbumTags(self, indptr, np.asarray(indices, dtype=np.int32))
+
+
+class AlbumTags:
+    """Albums as CSR rows of tag ids into a :class:`TagVocabulary`."""
+
+    def __init__(self, vocab, indptr, indices):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def ids(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def id_sets(self):
+        return [frozenset(self.ids(i).tolist()) for i in range(len(self))]
+
+    def norm_sets(self):
+        norm = self.vocab.norm
+        return [{norm[t] for t in self.ids(i)} for i in range(len(self))]
+
+    def display_lists(self):
+        display = self.vocab.display
+        return [[display[t] for t in self.ids(i)] for i in range(len(self))]
+
+    def one_hot(self, dtype=np.float64):
+        """Sparse album x tag indicator matrix (replaces MultiLabelBinarizer)."""
+        data = np.ones(len(self.indices), dtype=dtype)
+        return sparse.csr_matrix(
+            (data, self.indices, self.indptr), shape=(len(self), len(self.vocab))
+        )
@@ -0,0 +1,112 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from adaptive_order import AdaptiveOrder, ProviderHistory, expected_cost, plan_order
+from provider_metrics import ProviderMetrics
+
+
+def _estimates(table):
+    return lambda name: table[name]
+
+
+class PlanOrderTest(unittest.TestCase):
+    def setUp(self):
+        self.weights = {"Discogs": 3.0, "LastFM Album": 2.0, "MusicBrainz": 2.0,
+                        "Wikipedia": 1.5, "iTunes": 1.0}
+        # (yield, mean latency)
+        self.table = {"Discogs": (0.6, 0.5), "LastFM Album": (0.5, 0.2),
+                      "MusicBrainz": (0.6, 0.2), "Wikipedia": (0.02, 3.0), "iTunes": (0.5, 0.1)}
+
+    def test_orders_by_cost_per_answer_without_overtaking_better_sources(self):
+        chain = ["Discogs", "Wikipedia", "LastFM Album", "MusicBrainz", "iTunes"]
+        plan = plan_order(chain, _estimates(self.table), self.weights, quality_ratio=1.0)
+        # Discogs keeps the lead (highest weight x yield); MusicBrainz may pass its
+        # equal-weight peer; iTunes (weight 1.0, yield 0.5) may pass Wikipedia
+        # (1.5, but almost never answers), yet not the LastFM Album it trails.
+        self.assertEqual(plan, ["Discogs", "MusicBrainz", "LastFM Album", "iTunes", "Wikipedia"])
+        estimate = _estimates(self.table)
+        self.assertLess(expected_cost(plan, estimate), expected_cost(chain, estimate))
+
+    def test_slow_high_weight_provider_that_rarely_answers_is_demoted(self):
+        self.table["Discogs"] = (0.03, 2.5)
+        chain = ["Discogs", "LastFM Album", "MusicBrainz", "iTunes"]
+        plan = plan_order(chain, _estimates(self.table), self.weights, quality_ratio=1.0)
+        self.assertEqual(plan, ["MusicBrainz", "LastFM Album", "iTunes", "Discogs"])
+
+        self.table["Discogs"] = (0.45, 2.5)  # answers about as often: keeps its place
+        plan = plan_order(chain, _estimates(self.table), self.weights, quality_ratio=1.0)
+        self.assertEqual(plan[0], "Discogs")
+
+    def test_lower_quality_ratio_allows_more_reordering(self):
+        chain = ["Discogs", "Wikipedia", "LastFM Album", "MusicBrainz", "iTunes"]
+        plan = plan_order(chain, _estimates(self.table), self.weights, quality_ratio=0.0)
+        self.assertEqual(plan[0], "iTunes")
+        self.assertEqual(plan[-1], "Wikipedia")
+
+    def test_unknown_providers_use_the_prior(self):
+        history = ProviderHistory(os.path.join(tempfile.mkdtemp(), "stats.json"))
+        self.assertEqual(history.estimate("Nobody"), (0.5, 1.0))
+
+
+class AdaptiveOrderTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "stats.json")
+
+    def _run(self, order, outcomes, latency):
+        """Resolve one album per entry of ``outcomes``; returns call counts and metrics."""
+        import sorter_core
+        from genre_cache import GenreCache
+
+        names = ("Discogs", "Wikipedia", "LastFM Album")
+        calls = dict.fromkeys(names, 0)
+
+        def provider(name, tags):
+            def lookup():
+                calls[name] += 1
+                return tags
+            return lookup
+
+        backend = MagicMock()
+        metrics = ProviderMetrics()
+        resolve = sorter_core._make_genre_resolver(
+            backend, {}, GenreCache(backend="none"), metrics=metrics, provider_order=order
+        )
+        for i, outcome in enumerate(outcomes):
+            backend.get_genre_providers.return_value = [
+                (name, provider(name, outcome.get(name, []))) for name in names
+            ]
+            resolve("s", "Artist", f"Album {i}", f"al{i}", None)
+        for stats in metrics.providers.values():
+            stats.latencies = [latency[stats.name]] * stats.calls
+        return calls, metrics
+
+    def test_learns_across_runs_and_persists_per_backend(self):
+        outcomes = [{"LastFM Album": ["Rock"]} if i % 10 else {"Discogs": ["Jazz"]}
+                    for i in range(50)]
+        latency = {"Discogs": 0.3, "Wikipedia": 3.0, "LastFM Album": 0.2}
+        weights = {"Discogs": 3.0, "Wikipedia": 1.5, "LastFM Album": 2.0}
+
+        first = AdaptiveOrder(ProviderHistory(self.path, scope="tidal"), weights=weights)
+        calls, metrics = self._run(first, outcomes, latency)
+        self.assertEqual(calls["Wikipedia"], 45)  # no history yet: static order
+        first.finish(metrics)
+
+        second = AdaptiveOrder(ProviderHistory(self.path, scope="tidal"), weights=weights)
+        calls, metrics = self._run(second, outcomes, latency)
+        self.assertEqual(calls["Wikipedia"], 0)  # now tried last
+        # Discogs outweighs LastFM Album but answers 1 album in 10: it goes second.
+        self.assertEqual(calls["Discogs"], 5)
+        report = second.finish(metrics)
+        self.assertEqual(report["order"], ["LastFM Album", "Discogs", "Wikipedia"])
+        self.assertLess(report["adaptive_s"], report["static_s"])
+
+        other = ProviderHistory(self.path, scope="spotify")
+        self.assertEqual(other.providers, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
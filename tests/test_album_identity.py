@@ -0,0 +1,74 @@
+import random
+import unittest
+
+import pandas as pd
+
+from album_identity import album_identity
+from genre_cache import make_key
+from genre_helpers import clean_album_name
+
+
+def reference_unique_album(df):
+    """The original per-row pandas computation."""
+    clean = df["Album"].fillna("").map(clean_album_name).str.casefold().str.strip()
+    artist = df["Artist"].fillna("").str.casefold().str.strip()
+    name_key = clean + " — " + artist
+    per_album = df.groupby("Album ID")["Artist"].transform("nunique")
+    return list(name_key.where(
+        df["Album ID"].isna() | (per_album <= 1), df["Album ID"].astype("string"),
+    ))
+
+
+def _frame(rng, n):
+    albums = ["OK Computer", "OK Computer (Deluxe Edition)", "Kid A", "Now 42",
+              "Blue (Remastered)", "blue", None]
+    artists = ["Radiohead", "radiohead ", "Joni Mitchell", "Various", "Björk"]
+    rows = []
+    for _ in range(n):
+        album = rng.choice(albums)
+        rows.append({
+            "Album": album,
+            "Artist": rng.choice(artists),
+            "Album ID": rng.choice([None, "a1", "a2", f"id-{album}"]),
+        })
+    return pd.DataFrame(rows)
+
+
+class AlbumIdentityTest(unittest.TestCase):
+    def test_matches_reference_computation(self):
+        rng = random.Random(7)
+        for n in (1, 5, 40, 300):
+            df = _frame(rng, n)
+            self.assertEqual(list(album_identity(df).unique_album), reference_unique_album(df))
+
+    def test_compilation_keeps_album_id(self):
+        df = pd.DataFrame({
+            "Album": ["Now 42", "Now 42", "Kid A"],
+            "Artist": ["A", "B", "Radiohead"],
+            "Album ID": ["c1", "c1", "k1"],
+        })
+        self.assertEqual(list(album_identity(df).unique_album),
+                         ["c1", "c1", "kid a — radiohead"])
+
+    def test_lookup_groups_and_cache_keys(self):
+        df = pd.DataFrame({
+            "Album": ["Kid A (Deluxe Edition)", "Kid A (Deluxe Edition)", "Blue", "Blue"],
+            "Artist": ["Radiohead", "Radiohead", "Joni Mitchell", "Joni Mitchell"],
+            "Album ID": ["k1", "k1", None, None],
+        })
+        identity = album_identity(df)
+        self.assertEqual(list(identity.group), [0, 0, 1, 1])
+        self.assertEqual(list(identity.first), [0, 2])
+        self.assertEqual(identity.cache_keys, [
+            make_key("k1", "Kid A (Deluxe Edition)", "Radiohead"),
+            make_key(None, "Blue", "Joni Mitchell"),
+        ])
+        self.assertEqual(identity.clean_names[0], "Kid A")
+
+    def test_empty_frame(self):
+        df = pd.DataFrame({"Album": [], "Artist": [], "Album ID": []})
+        self.assertEqual(len(album_identity(df)), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+from benchmarks.compare import compare_reports
+from benchmarks.run import run_benchmarks
+from benchmarks.synthetic import synthetic_library
+from tracks import dedupe_tracks
+
+
+class SyntheticLibraryTest(unittest.TestCase):
+    def test_deterministic_and_sized(self):
+        first = synthetic_library(2000, seed=3)
+        second = synthetic_library(2000, seed=3)
+        self.assertEqual(len(first), 2000)
+        self.assertEqual([t.track_id for t in first], [t.track_id for t in second])
+        self.assertNotEqual([t.track_id for t in first],
+                            [t.track_id for t in synthetic_library(2000, seed=4)])
+
+    def test_realistic_shape(self):
+        tracks = synthetic_library(5000, seed=1)
+        unique = dedupe_tracks(tracks)
+        self.assertEqual(len(tracks) - len(unique), 100)  # 2% liked twice
+        albums = {t.album_id for t in unique}
+        self.assertTrue(250 < len(albums) < 1000)
+        self.assertTrue(any("Deluxe" in t.album or "Remaster" in t.album for t in unique))
+        self.assertTrue(any(t.genres == [] for t in unique))
+        tags = {tag for t in unique for tag in t.genres}
+        self.assertGreater(len(tags), 50)
+
+
+class BenchmarkRunTest(unittest.TestCase):
+    def test_report_has_every_stage(self):
+        report = run_benchmarks(sizes=[300], repeat=1, providers=5, log=lambda *_: None)
+        result = report["results"]["300"]
+        self.assertEqual(set(result["stages"]), {
+            "dedupe", "frame", "album_identity", "encode", "root_inference", "similarity",
+            "order_legacy", "order_roots", "order_two_level", "metrics", "csv_export",
+        })
+        self.assertEqual(set(result["quality"]), {"legacy", "roots", "two_level"})
+        wiki = result["providers"]["wikipedia"]
+        self.assertEqual(wiki["requests"], 5)
+        self.assertEqual(wiki["replay"]["misses"], 0)
+        self.assertEqual((wiki["prefetched"]["requests"], wiki["prefetched"]["found"]),
+                         (1, wiki["found"]))
+        if "html_baseline" in wiki:  # needs beautifulsoup4
+            self.assertEqual(wiki["html_baseline"]["found"], wiki["found"])
+            self.assertGreater(wiki["baseline_ratio"]["bytes"], 10)
+
+    def test_compare_flags_regressions_above_noise(self):
+        base = {"results": {"1000": {"stages": {
+            "similarity": {"wall_s": 1.0}, "dedupe": {"wall_s": 0.001},
+        }}}}
+        new = {"results": {"1000": {"stages": {
+            "similarity": {"wall_s": 1.5}, "dedupe": {"wall_s": 0.004},
+        }}}}
+        rows = {row[1]: row for row in compare_reports(base, new, threshold=0.2)}
+        self.assertTrue(rows["similarity"][5])
+        self.assertFalse(rows["dedupe"][5])  # 4x slower but below the noise floor
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+import fnmatch
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import cache_admin
+from cache_admin import FileStore, cache_stats, iter_json_object
+from genre_cache import STATS_KEY, GenreCache, make_key
+
+DAY = 86400
+
+
+class FakeRedis:
+    """In-memory stand-in for the redis client calls the admin tool makes."""
+
+    def __init__(self):
+        self.store, self.expiry, self.hashes = {}, {}, {}
+
+    def ping(self):
+        return True
+
+    def scan_iter(self, match="*", count=None):
+        return [k for k in list(self.store) if fnmatch.fnmatch(k, match)]
+
+    def mget(self, keys):
+        return [self.store.get(k) for k in keys]
+
+    def set(self, key, value, ex=None):
+        self.store[key] = value
+        self.expiry[key] = ex
+
+    def delete(self, *keys):
+        for key in keys:
+            self.store.pop(key, None)
+
+    def hgetall(self, key):
+        return self.hashes.get(key, {})
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def execute(self):
+        return []
+
+
+class IterJsonObjectTest(unittest.TestCase):
+    def test_streams_the_same_items_as_json_load(self):
+        data = {"genre:album:1": {"genre": ["Rock", 'Prog "Rock" {x}'], "source": "Discogs"},
+                "genre:name:a|b": {"genre": [], "source": "None", "ts": 5, "ttl": 60},
+                "empty": {}}
+        text = json.dumps(data, indent=1)
+        for chunk_size in (1, 3, 7, 4096):
+            self.assertEqual(dict(iter_json_object(io.StringIO(text), chunk_size)), data)
+        self.assertEqual(list(iter_json_object(io.StringIO(" { } "))), [])
+        with self.assertRaises(ValueError):
+            list(iter_json_object(io.StringIO('{"a": 1 "b": 2}'), 2))
+
+
+class CacheAdminTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.path = os.path.join(self.dir, "genre_cache.json")
+        self.now = 100 * DAY
+        cache = GenreCache(backend="file", file_path=self.path, ttl_days=10, stale_days=5,
+                           negative_ttl_hours=1, ttl_jitter=0, time_fn=lambda: self.clock)
+        self.clock = self.now - 12 * DAY  # written 12 days ago: stale
+        cache.set(make_key("old", "A", "B"), ["Rock"], "Discogs")
+        self.clock = self.now - 20 * DAY  # past ttl + grace: expired
+        cache.set(make_key("gone", "A", "B"), ["Jazz"], "Discogs")
+        self.clock = self.now - 60
+        cache.set(make_key("neg", "A", "B"), [], "None")
+        for i in range(3):
+            cache.set(make_key(f"new{i}", "A", "B"), ["Pop"], "LastFM Album")
+        cache.close()
+        self.clock = self.now
+        reader = GenreCache(backend="file", file_path=self.path, time_fn=lambda: self.clock)
+        reader.get(make_key("new0", "A", "B"))
+        reader.get(make_key("missing", "A", "B"))
+        reader.close()
+
+    def test_stats(self):
+        stats = cache_stats(FileStore(self.path), now=self.now)
+        self.assertEqual(stats["entries"], 6)
+        self.assertEqual((stats["negative"], stats["stale"], stats["expired"]), (1, 1, 1))
+        self.assertEqual(stats["sources"], {"LastFM Album": 3, "Discogs": 2, "None": 1})
+        self.assertEqual(stats["ages"], {"< 1 day": 4, "< 30 days": 2})
+        self.assertEqual(stats["lookups"], 2)
+        self.assertAlmostEqual(stats["hit_ratio"], 0.5)
+
+    def test_sweep_and_compact_rewrite_the_file(self):
+        with patch("cache_admin.time.time", return_value=self.now):
+            cache_admin.main(["--store", f"file:{self.path}", "sweep"])
+            keys = [k for k, _ in FileStore(self.path).records()]
+            self.assertEqual(len(keys), 5)
+            self.assertNotIn("genre:album:gone", keys)
+            cache_admin.main(["--store", f"file:{self.path}", "compact", "--drop-negative"])
+        store = FileStore(self.path)
+        self.assertEqual(len(list(store.records())), 4)
+        self.assertEqual(store.counters(), {"hits": 1, "misses": 1})
+        reloaded = GenreCache(backend="file", file_path=self.path, time_fn=lambda: self.now)
+        self.assertEqual(reloaded.get("genre:album:new1"), (["Pop"], "LastFM Album"))
+
+    def test_export_import_and_migrate(self):
+        snapshot = os.path.join(self.dir, "snap.jsonl.gz")
+        target = os.path.join(self.dir, "copy.json")
+        with patch("cache_admin.time.time", return_value=self.now):
+            cache_admin.main(["--store", f"file:{self.path}", "export", snapshot])
+            cache_admin.main(["--store", f"file:{target}", "import", snapshot])
+            with self.assertRaises(SystemExit):  # refuses to replace a non-empty file
+                cache_admin.main(["--store", f"file:{target}", "import", snapshot])
+        self.assertEqual(sorted(k for k, _ in FileStore(target).records()),
+                         sorted(k for k, _ in FileStore(self.path).records()
+                                if k != "genre:album:gone"))
+
+        db = os.path.join(self.dir, "cache.sqlite3")
+        with patch("cache_admin.time.time", return_value=self.now):
+            cache_admin.main(["--store", f"file:{self.path}", "migrate", "--to", f"sqlite:{db}"])
+        sqlite_stats = cache_stats(cache_admin.open_store(f"sqlite:{db}"), now=self.now)
+        self.assertEqual((sqlite_stats["entries"], sqlite_stats["stale"]), (5, 1))
+        served = GenreCache(backend="sqlite", file_path=db, time_fn=lambda: self.now)
+        self.assertEqual(served.get("genre:album:old"), (["Rock"], "Discogs"))
+        self.assertIn("genre:album:old", served.stale)
+        with patch("cache_admin.time.time", return_value=self.now + 3 * DAY):
+            cache_admin.main(["--store", f"sqlite:{db}", "sweep"])
+        self.assertEqual(len(list(cache_admin.open_store(f"sqlite:{db}").records())), 3)
+
+        fake = FakeRedis()
+        with patch("redis.from_url", return_value=fake), \
+                patch("cache_admin.time.time", return_value=self.now):
+            cache_admin.main(["--store", f"file:{self.path}", "migrate",
+                              "--to", "redis://localhost:6379/0"])
+        self.assertEqual(len(fake.store), 5)
+        self.assertEqual(fake.expiry["genre:album:old"], 3 * DAY)  # remaining until hard expiry
+        self.assertNotIn(STATS_KEY, fake.store)
+        with patch("redis.from_url", return_value=fake):
+            redis_stats = cache_stats(cache_admin.open_store("redis://localhost:6379/0"),
+                                      now=self.now)
+        self.assertEqual(redis_stats["entries"], 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
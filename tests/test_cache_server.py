@@ -0,0 +1,132 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stderr
+from unittest.mock import MagicMock
+
+import requests
+
+from cache_server import MAX_BATCH, CacheServer, SharedCacheClient, shared_key
+from genre_cache import GenreCache, make_key
+
+
+class CacheServerTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1_000_000
+        self.server = CacheServer(clock=lambda: self.now).start()
+        self.addCleanup(self.server.stop)
+
+    def client(self, user):
+        return SharedCacheClient(self.server.base_url, user)
+
+    def test_found_genres_are_shared_and_negatives_stay_per_user(self):
+        alice, bob = self.client("alice"), self.client("bob")
+        found = {"genre": ["Rock"], "source": "MusicBrainz", "ts": self.now, "ttl": 3600}
+        missing = {"genre": [], "source": "None", "ts": self.now, "ttl": 60}
+        self.assertEqual(alice.set_many([("genre:album:a", found), ("genre:album:b", missing)]), 2)
+
+        self.assertEqual(bob.get_many(["genre:album:a", "genre:album:b"]),
+                         {"genre:album:a": found})
+        self.assertEqual(set(alice.get_many(["genre:album:a", "genre:album:b"])),
+                         {"genre:album:a", "genre:album:b"})
+        stats = requests.get(self.server.base_url + "/v1/stats").json()
+        self.assertEqual(stats["entries"], 1)
+        self.assertEqual(stats["users"]["bob"],
+                         {"gets": 2, "hits": 1, "hits_from_others": 1, "sets": 0})
+
+        self.now += 3601
+        self.assertEqual(bob.get_many(["genre:album:a"]), {})
+
+    def test_newer_records_win_and_negatives_never_replace_genres(self):
+        self.server.share_negative = True
+        alice = self.client("alice")
+        alice.set_many([("k", {"genre": ["Jazz"], "source": "iTunes", "ts": self.now, "ttl": 99})])
+        alice.set_many([("k", {"genre": ["Pop"], "source": "iTunes", "ts": self.now - 5,
+                               "ttl": 99})])
+        alice.set_many([("k", {"genre": [], "source": "None", "ts": self.now + 5, "ttl": 99})])
+        self.assertEqual(self.client("bob").get_many(["k"])["k"]["genre"], ["Jazz"])
+
+    def test_rejects_raw_keys_and_oversized_batches(self):
+        url = self.server.base_url + "/v1/get"
+        raw = requests.post(url, json={"user": "alice", "keys": [make_key("a1", "A", "B")]})
+        self.assertEqual(raw.status_code, 400)
+        keys = [shared_key(str(i)) for i in range(MAX_BATCH + 1)]
+        self.assertEqual(requests.post(url, json={"user": "alice", "keys": keys}).status_code, 413)
+        self.assertEqual(requests.post(url, json={"keys": []}).status_code, 400)
+
+
+class SharedGenreCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.server = CacheServer(os.path.join(self.tmp.name, "shared.sqlite3")).start()
+        self.addCleanup(self.server.stop)
+
+    def cache(self, user):
+        return GenreCache(backend="file", file_path=os.path.join(self.tmp.name, f"{user}.json"),
+                          shared=SharedCacheClient(self.server.base_url, user))
+
+    def test_one_users_enrichment_warms_another_users_cache(self):
+        import sorter_core
+
+        provider = MagicMock(return_value=["Trip Hop"])
+        backend = MagicMock()
+        backend.get_genre_providers.return_value = [("MusicBrainz", provider)]
+        alice = self.cache("alice")
+        sorter_core._make_genre_resolver(backend, {}, alice)("s", "Massive Attack",
+                                                             "Mezzanine", "al1", None)
+        alice.close()  # flushes the write-back
+
+        bob = self.cache("bob")
+        self.assertEqual(bob.prefetch(["genre:album:al1", "genre:album:al2"]), 1)
+        resolve = sorter_core._make_genre_resolver(backend, {}, bob)
+        self.assertEqual(resolve("s", "Massive Attack", "Mezzanine", "al1", None),
+                         (["Trip Hop"], "MusicBrainz"))
+        self.assertEqual((provider.call_count, bob.shared_hits), (1, 1))
+        bob.close()
+        with open(os.path.join(self.tmp.name, "bob.json"), encoding="utf-8") as fh:
+            self.assertEqual(json.load(fh)["genre:album:al1"]["genre"], ["Trip Hop"])
+
+    def test_shared_reads_carry_no_per_user_fields(self):
+        alice = self.cache("alice")
+        alice.set("genre:album:al1", ["Rock"], "iTunes", lookup={
+            "service": "spotify", "song": "Secret Song", "artist": "A", "album": "B",
+            "album_id": "al1", "track_id": "trk123"})
+        alice.close()
+        # A client that sends more than it should is trimmed by the server too.
+        SharedCacheClient(self.server.base_url, "mallory").set_many([("genre:album:al2", {
+            "genre": ["Jazz"], "source": "iTunes", "ts": 1, "ttl": 10 ** 12,
+            "lookup": {"song": "Other Secret"}})])
+
+        found = SharedCacheClient(self.server.base_url, "bob").get_many(
+            ["genre:album:al1", "genre:album:al2"])
+        self.assertEqual(set(found), {"genre:album:al1", "genre:album:al2"})
+        for record in found.values():
+            self.assertLessEqual(set(record), {"genre", "source", "ts", "ttl", "grace"})
+
+    def test_unreachable_server_disables_the_client(self):
+        gone = CacheServer().start()
+        gone.stop()
+        client = SharedCacheClient(gone.base_url, "alice", timeout=0.5)
+        cache = GenreCache(backend="none", shared=client)
+        stderr = io.StringIO()
+        with redirect_stderr(stderr):
+            self.assertIsNone(cache.get("genre:album:a"))
+            cache.set("genre:album:a", ["Rock"], "iTunes")
+            cache.close()
+        self.assertFalse(client.available)
+        self.assertEqual(cache.get("genre:album:a"), (["Rock"], "iTunes"))
+        self.assertEqual(stderr.getvalue().count("Shared genre cache unavailable"), 1)
+
+    def test_miss_is_read_through_once(self):
+        bob = self.cache("bob")
+        bob.shared.get_many = MagicMock(wraps=bob.shared.get_many)
+        self.assertIsNone(bob.get("genre:album:x"))
+        self.assertIsNone(bob.get("genre:album:x"))
+        self.assertEqual(bob.shared.get_many.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import genre_helpers
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, BreakerBoard, CircuitBreaker
+from genre_cache import GenreCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def test_opens_after_consecutive_failures_and_probes_after_cooldown(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker("musicbrainz.org", failure_threshold=3, cooldown=60, clock=clock)
+        for ok in (False, False, True, False, False):
+            self.assertTrue(breaker.allow())
+            breaker.record(ok)
+        self.assertEqual(breaker.state, CLOSED)  # the success reset the streak
+        breaker.record(False)
+        self.assertEqual(breaker.state, OPEN)
+        self.assertFalse(breaker.allow())
+
+        clock.now = 60
+        self.assertTrue(breaker.allow())  # the single half-open probe
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertFalse(breaker.allow())
+        breaker.record(False)  # probe failed: another full cool-down
+        self.assertEqual((breaker.state, breaker.trips), (OPEN, 2))
+        clock.now = 100
+        self.assertFalse(breaker.allow())
+        clock.now = 120
+        self.assertTrue(breaker.allow())
+        breaker.record(True)
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertTrue(breaker.allow())
+
+    def test_swallowed_errors_and_slow_calls_count_as_failures(self):
+        clock = FakeClock()
+        board = BreakerBoard(failure_threshold=2, cooldown=60, slow_seconds=3.0, clock=clock)
+        with patch("genre_helpers.requests.get", side_effect=TimeoutError("timed out")):
+            for _ in range(2):
+                result = board.call(
+                    "iTunes", lambda: genre_helpers.get_itunes_album_info("Kid A", "Radiohead")
+                )
+                self.assertEqual(result, [])
+        self.assertFalse(board.allow("iTunes"))
+
+        def slow():
+            clock.now += 4.0
+            return ["Rock"]
+
+        for _ in range(2):
+            board.call("Wikipedia", slow)
+        self.assertFalse(board.allow("Wikipedia"))
+        self.assertTrue(board.allow("Discogs"))
+
+    def test_providers_on_one_host_share_a_breaker(self):
+        board = BreakerBoard(failure_threshold=1, clock=FakeClock())
+        with self.assertRaises(RuntimeError):
+            board.call("LastFM Album", MagicMock(side_effect=RuntimeError("503")))
+        self.assertFalse(board.allow("LastFM Track"))
+        self.assertEqual(board.report()["skipped"], {"LastFM Track": 1})
+
+
+class ResolverBreakerTest(unittest.TestCase):
+    def test_open_breaker_skips_provider_and_shortens_negative_ttl(self):
+        import sorter_core
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        cache = GenreCache(backend="file", file_path=os.path.join(tmp.name, "cache.json"),
+                           negative_ttl_hours=6, time_fn=lambda: 0)
+        down = MagicMock(side_effect=RuntimeError("connection reset"))
+        empty = MagicMock(return_value=[])
+        backend = MagicMock()
+        backend.get_genre_providers.return_value = [("MusicBrainz", down), ("iTunes", empty)]
+        board = BreakerBoard(failure_threshold=2, cooldown=120, clock=FakeClock())
+        resolve = sorter_core._make_genre_resolver(backend, {}, cache, breakers=board)
+
+        for i in range(2):
+            with self.assertRaises(RuntimeError):
+                resolve("s", "Artist", f"Album {i}", f"al{i}", None)
+        self.assertEqual(resolve("s", "Artist", "Album 2", "al2", None), ([], "None"))
+        self.assertEqual(down.call_count, 2)  # the open breaker skipped the third call
+        self.assertEqual(cache._file_data["genre:album:al2"]["ttl"], 120)
+
+        backend.get_genre_providers.return_value = [("iTunes", empty)]
+        resolve("s", "Artist", "Album 3", "al3", None)
+        self.assertEqual(cache._file_data["genre:album:al3"]["ttl"], 6 * 3600)
+
+    def test_half_open_probe_is_not_spent_when_an_earlier_provider_answers(self):
+        import sorter_core
+
+        clock = FakeClock()
+        board = BreakerBoard(failure_threshold=1, cooldown=60, clock=clock)
+        with self.assertRaises(RuntimeError):
+            board.call("iTunes", MagicMock(side_effect=RuntimeError("503")))
+        clock.now = 60  # past the cool-down: iTunes may be probed once
+
+        answers, empty, later = (MagicMock(return_value=g) for g in (["Rock"], [], ["Jazz"]))
+        backend = MagicMock()
+        backend.get_genre_providers.return_value = [("MusicBrainz", answers), ("iTunes", later)]
+        resolve = sorter_core._make_genre_resolver(backend, {}, GenreCache(backend="none"),
+                                                   breakers=board)
+        self.assertEqual(resolve("s", "Artist", "Album 1", "al1", None), (["Rock"], "MusicBrainz"))
+        self.assertEqual(board.breaker("iTunes").state, OPEN)  # the probe is still available
+
+        backend.get_genre_providers.return_value = [("MusicBrainz", empty), ("iTunes", later)]
+        self.assertEqual(resolve("s", "Artist", "Album 2", "al2", None), (["Jazz"], "iTunes"))
+        self.assertEqual(board.breaker("iTunes").state, CLOSED)
+        self.assertEqual(board.report()["skipped"], {})
+
+
+if __name__ == "__main__":
+    unittest.main()
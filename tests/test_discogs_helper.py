@@ -0,0 +1,86 @@
+import unittest
+from unittest.mock import Mock, patch
+
+import genre_helpers
+from genre_helpers import get_discogs_album_info
+from rate_limit import RateLimiter
+
+
+def _response(payload, status=200, headers=None):
+    response = Mock()
+    response.status_code = status
+    response.headers = headers or {}
+    response.json.return_value = payload
+    return response
+
+
+class DiscogsHelperTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = [0.0]
+        self.sleeps = []
+
+        def sleep(seconds):
+            self.sleeps.append(seconds)
+            self.clock[0] += seconds
+
+        limiter = RateLimiter(60, 60.0, time_fn=lambda: self.clock[0], sleep_fn=sleep)
+        patches = [
+            patch.object(genre_helpers, "DISCOGS_LIMITER", limiter),
+            patch.object(genre_helpers, "_discogs_masters", {}),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_uses_search_payload_without_master_fetch(self):
+        search = {"results": [
+            {"title": "Radiohead - Kid A", "master_id": 21501,
+             "genre": ["Electronic", "Rock"], "style": ["Experimental"]},
+        ]}
+        with patch("genre_helpers.requests.get", return_value=_response(search)) as get:
+            genres = get_discogs_album_info("Kid A", "Radiohead", "k")
+        self.assertEqual(genres, ["Electronic", "Rock", "Experimental"])
+        get.assert_called_once()
+
+    def test_best_title_match_wins_over_result_order(self):
+        search = {"results": [
+            {"title": "Someone Else - Other Album", "genre": ["Pop"]},
+            {"title": "Radiohead - Kid A", "genre": ["Rock"]},
+        ]}
+        with patch("genre_helpers.requests.get", return_value=_response(search)):
+            self.assertEqual(get_discogs_album_info("Kid A", "Radiohead", "k"), ["Rock"])
+
+    def test_master_fetched_only_when_payload_lacks_tags_and_cached(self):
+        search = {"results": [{"title": "Radiohead - Kid A", "master_id": 7}]}
+        master = {"genres": ["Rock"], "styles": ["Art Rock"]}
+
+        def fake_get(url, params=None, timeout=None):
+            return _response(master if "/masters/" in url else search)
+
+        with patch("genre_helpers.requests.get", side_effect=fake_get) as get:
+            first = get_discogs_album_info("Kid A", "Radiohead", "k")
+            second = get_discogs_album_info("Kid A", "Radiohead", "k")
+        self.assertEqual(first, ["Rock", "Art Rock"])
+        self.assertEqual(second, first)
+        # Two searches, one master fetch (second one served from the cache).
+        self.assertEqual(get.call_count, 3)
+
+    def test_backs_off_on_429(self):
+        search = {"results": [{"title": "Radiohead - Kid A", "genre": ["Rock"]}]}
+        responses = [_response({}, 429, {"Retry-After": "3"}), _response(search)]
+        with patch("genre_helpers.requests.get", side_effect=responses):
+            self.assertEqual(get_discogs_album_info("Kid A", "Radiohead", "k"), ["Rock"])
+        self.assertEqual(self.sleeps, [3.0])
+
+    def test_rate_limiter_paces_calls(self):
+        calls = 0
+        limiter = genre_helpers.DISCOGS_LIMITER
+        for _ in range(61):
+            limiter.acquire()
+            calls += 1
+        self.assertEqual(calls, 61)
+        self.assertEqual(self.sleeps, [60.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
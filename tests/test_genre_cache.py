@@ -4,7 +4,7 @@ import tempfile
 import unittest
 from unittest.mock import MagicMock, patch
 
-from genre_cache import GenreCache, make_key
+from genre_cache import GenreCache, LRUCache, make_key
 
 
 class FakeRedis:
@@ -83,6 +83,105 @@ class FileCacheTest(unittest.TestCase):
         self.assertEqual(verify.get(key), (["Bebop"], "MusicBrainz"))
 
 
+class StaleWhileRevalidateTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "genre_cache.json")
+        self.addCleanup(self.tmp.cleanup)
+        self.clock = [0.0]
+
+    def _cache(self, **kwargs):
+        return GenreCache(backend="file", file_path=self.path, ttl_days=10, stale_days=5,
+                          time_fn=lambda: self.clock[0], **kwargs)
+
+    def test_soft_expired_entries_are_served_and_marked_stale(self):
+        cache = self._cache(ttl_jitter=0)
+        key = make_key("alb", "A", "Artist")
+        cache.set(key, ["Rock"], "Discogs", lookup={"album": "A", "artist": "Artist"})
+        cache.close()
+
+        self.clock[0] = 9 * 86400
+        fresh = self._cache()
+        self.assertEqual(fresh.get(key), (["Rock"], "Discogs"))
+        self.assertEqual(fresh.stale, {})
+
+        self.clock[0] = 12 * 86400
+        stale = self._cache()
+        self.assertEqual(stale.get(key), (["Rock"], "Discogs"))
+        self.assertEqual(stale.stale, {key: {"album": "A", "artist": "Artist"}})
+        self.assertEqual([k for k, _ in stale.entries()], [key])
+        stale.set(key, ["Rock", "Art Rock"], "Discogs")
+        self.assertEqual(stale.stale, {})
+
+        self.clock[0] = 12 * 86400 + 16 * 86400
+        self.assertIsNone(self._cache().get(key))  # past ttl + stale_days
+
+    def test_ttl_jitter_spreads_expiries(self):
+        import random
+
+        cache = self._cache(ttl_jitter=0.1, rng=random.Random(7))
+        for i in range(50):
+            cache.set(make_key(f"alb{i}", "A", "Artist"), ["Rock"], "Discogs")
+        ttls = {record["ttl"] for record in cache._file_data.values()}
+        self.assertGreater(len(ttls), 40)
+        self.assertTrue(all(9 * 86400 <= ttl <= 11 * 86400 for ttl in ttls))
+
+
+class LRUCacheTest(unittest.TestCase):
+    def test_evicts_least_recently_used_by_count(self):
+        lru = LRUCache(max_entries=2)
+        lru["a"], lru["b"] = 1, 2
+        self.assertEqual(lru.get("a"), 1)  # "a" is now the most recent
+        lru["c"] = 3
+        self.assertNotIn("b", lru)
+        self.assertEqual((len(lru), lru.evictions), (2, 1))
+
+    def test_evicts_by_size(self):
+        lru = LRUCache(max_bytes=100, sizeof=lambda key, value: len(value))
+        lru["a"] = "x" * 40
+        lru["b"] = "x" * 40
+        lru["a"] = "x" * 50  # replacing re-accounts the entry
+        self.assertEqual(lru.bytes, 90)
+        lru["c"] = "x" * 30
+        self.assertEqual(set(lru._data), {"a", "c"})
+        self.assertEqual(lru.bytes, 80)
+
+
+class SqliteCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "genre_cache.sqlite3")
+        self.addCleanup(self.tmp.cleanup)
+        self.clock = [1000.0]
+
+    def _cache(self, **kwargs):
+        return GenreCache(backend="sqlite", file_path=self.path, negative_ttl_hours=1,
+                          time_fn=lambda: self.clock[0], **kwargs)
+
+    def test_roundtrip_expiry_and_entries(self):
+        cache = self._cache()
+        self.assertEqual(cache.backend, "sqlite")
+        cache.set(make_key("alb1", "A", "Artist"), ["Rock"], "Discogs")
+        cache.set(make_key("alb2", "A", "Artist"), [], "None")
+        cache.close()
+
+        fresh = self._cache()
+        self.assertEqual(fresh.get("genre:album:alb1"), (["Rock"], "Discogs"))
+        self.assertEqual(fresh.get("genre:album:alb2"), ([], "None"))
+        self.clock[0] += 3601
+        later = self._cache()
+        self.assertIsNone(later.get("genre:album:alb2"))
+        self.assertEqual([k for k, _ in later.entries()], ["genre:album:alb1"])
+
+    def test_bounded_l1_falls_back_to_the_store(self):
+        cache = self._cache(l1_max_entries=10)
+        for i in range(50):
+            cache.set(make_key(f"alb{i}", "A", "Artist"), [f"Genre {i}"], "Discogs")
+        self.assertEqual(len(cache._mem), 10)
+        self.assertEqual(cache.get("genre:album:alb0"), (["Genre 0"], "Discogs"))
+        self.assertEqual(cache.hits, 1)
+
+
 class RedisCacheTest(unittest.TestCase):
     def test_uses_redis_when_reachable(self):
         fake = FakeRedis()
@@ -96,17 +195,40 @@ class RedisCacheTest(unittest.TestCase):
             cache2 = GenreCache(backend="redis")
         self.assertEqual(cache2.get(key), (["Rock"], "Discogs"))
 
-    def test_falls_back_to_file_when_redis_down(self):
+    def test_falls_back_to_sqlite_when_redis_down(self):
         tmp = tempfile.TemporaryDirectory()
         self.addCleanup(tmp.cleanup)
         path = os.path.join(tmp.name, "c.json")
         with patch("redis.from_url", side_effect=ConnectionError("nope")):
             cache = GenreCache(backend="redis", file_path=path)
-        self.assertEqual(cache.backend, "file")
+        self.assertEqual(cache.backend, "sqlite")
         key = make_key("alb", "A", "Artist")
         cache.set(key, ["Rock"], "Discogs")
         cache.close()
-        self.assertTrue(os.path.exists(path))
+        self.assertTrue(os.path.exists(os.path.join(tmp.name, "c.sqlite3")))
+        self.assertFalse(os.path.exists(path))
+
+    def test_fallback_migrates_an_existing_json_cache_once(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "c.json")
+        old = GenreCache(backend="file", file_path=path, time_fn=lambda: 1000)
+        old.set(make_key("alb1", "A", "Artist"), ["Jazz"], "iTunes")
+        old.set(make_key("alb2", "B", "Artist"), [], "None", ttl=10)  # expired by now
+        old.close()
+
+        with patch("redis.from_url", side_effect=ConnectionError("nope")):
+            cache = GenreCache(backend="redis", file_path=path, time_fn=lambda: 2000)
+        self.assertEqual(cache.get(make_key("alb1", "A", "Artist")), (["Jazz"], "iTunes"))
+        self.assertIsNone(cache.get(make_key("alb2", "B", "Artist")))
+        cache.set(make_key("alb1", "A", "Artist"), ["Bebop"], "Discogs")
+        cache.close()
+
+        with patch("redis.from_url", side_effect=ConnectionError("nope")):
+            cache = GenreCache(backend="redis", file_path=path, time_fn=lambda: 2000)
+        # Not migrated again: the newer record is kept.
+        self.assertEqual(cache.get(make_key("alb1", "A", "Artist")), (["Bebop"], "Discogs"))
+        cache.close()
 
 
 class NoCacheTest(unittest.TestCase):
@@ -0,0 +1,94 @@
+import random
+import unittest
+
+from genre_normalization import GenreRoots, infer_root, load_genre_roots, root_of
+
+
+# Reference implementation: the original rules x tags x keywords scan.
+def _norm(tag):
+    return " ".join(str(tag or "").strip().lower().split())
+
+
+def reference_root_of(tag, rules):
+    t = _norm(tag)
+    if not t:
+        return "unknown"
+    for rule in rules:
+        if any(kw in t for kw in rule["keywords"]):
+            return rule["root"]
+    return t.split()[0]
+
+
+def reference_infer_root(genre_list, rules):
+    norm_tags = [_norm(t) for t in (genre_list or []) if _norm(t)]
+    if not norm_tags:
+        return "unknown"
+    for rule in rules:
+        for tag in norm_tags:
+            if any(kw in tag for kw in rule["keywords"]):
+                return rule["root"]
+    return norm_tags[-1]
+
+
+def _random_tag(rng, keywords):
+    parts = []
+    for _ in range(rng.randint(1, 3)):
+        roll = rng.random()
+        if roll < 0.5:
+            kw = rng.choice(keywords)
+            # Cut keywords so partial / overlapping fragments are exercised too.
+            start = rng.randint(0, max(0, len(kw) - 2)) if rng.random() < 0.3 else 0
+            parts.append(kw[start:])
+        elif roll < 0.8:
+            parts.append("".join(rng.choice("abcdeilmnoprstu-& ") for _ in range(rng.randint(1, 8))))
+        else:
+            parts.append(rng.choice(["Pop", "ROCK", "  Indie ", "Post-Punk", "R&B", "Nu Metal"]))
+    return rng.choice([" ", "", "-"]).join(parts)
+
+
+class CompiledMatcherPropertyTest(unittest.TestCase):
+    def _check(self, rules, seed, samples=3000):
+        rng = random.Random(seed)
+        plain = [dict(r) for r in rules]
+        compiled = rules if isinstance(rules, GenreRoots) else GenreRoots(rules)
+        keywords = [k for r in plain for k in r["keywords"]] or ["x"]
+        for _ in range(samples):
+            tags = [_random_tag(rng, keywords) for _ in range(rng.randint(0, 4))]
+            for tag in tags:
+                self.assertEqual(root_of(tag, compiled), reference_root_of(tag, plain), tag)
+            self.assertEqual(infer_root(tags, compiled), reference_infer_root(tags, plain), tags)
+
+    def test_default_rules_match_reference(self):
+        self._check(load_genre_roots(), seed=1)
+
+    def test_overlapping_keywords_respect_rule_priority(self):
+        rules = [
+            {"root": "core", "keywords": ["metalcore", "core"]},
+            {"root": "metal", "keywords": ["metal", "heavy"]},
+            {"root": "rock", "keywords": ["rock", "metal"]},  # duplicate keyword, lower priority
+            {"root": "short", "keywords": ["e", "ro"]},
+        ]
+        self._check(rules, seed=2)
+        compiled = GenreRoots(rules)
+        self.assertEqual(root_of("Heavy Metalcore", compiled), "core")
+        self.assertEqual(infer_root(["Rock", "Heavy"], compiled), "metal")
+
+    def test_empty_rules_fall_back(self):
+        self._check([], seed=3, samples=200)
+
+    def test_memoizes_each_distinct_tag_once(self):
+        compiled = load_genre_roots()
+        root_of("Pop Punk", compiled)
+        root_of("pop   punk", compiled)
+        infer_root(["Pop Punk", "Emo"], compiled)
+        self.assertEqual(set(compiled._memo), {"pop punk", "emo"})
+
+    def test_is_still_a_list_of_rules(self):
+        rules = load_genre_roots()
+        self.assertIsInstance(rules, list)
+        self.assertEqual(rules[0]["root"], "metal")
+        self.assertEqual(load_genre_roots("/nonexistent.json"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
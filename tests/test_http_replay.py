@@ -0,0 +1,137 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from http_replay import CassetteStore, ReplayConfig, recording, replaying, request_key
+from wikipedia_lookup import WIKI_API, WikipediaGenreLookup
+
+
+class _Origin(BaseHTTPRequestHandler):
+    """Stand-in for a live service: echoes the path and query back as JSON."""
+
+    def do_GET(self):
+        body = json.dumps({"path": self.path}).encode()
+        if self.path.startswith("/api/token"):
+            body = json.dumps({"access_token": "live-access", "token_type": "Bearer",
+                               "refresh_token": "live-refresh", "expires_in": 3600}).encode()
+        elif self.path.startswith("/v1/me"):
+            body = json.dumps({"id": "u1", "email": "someone@example.com",
+                               "images": [{"display_name": "Someone"}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HttpReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = self.tmp.name
+
+    def _origin(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _Origin)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+    def test_request_key_ignores_secrets_and_param_order(self):
+        a, canonical = request_key("GET", "https://api.x/search?q=a&token=s1&type=release")
+        b, _ = request_key("get", "https://api.x/search?type=release&token=s2&q=a")
+        self.assertEqual(a, b)
+        self.assertNotIn("token", canonical)
+
+    def test_record_then_replay_offline(self):
+        origin, base = self._origin()
+        with recording(self.dir) as store:
+            live = requests.get(f"{base}/search", params={"q": "kid a", "api_key": "secret"})
+        origin.shutdown()
+        origin.server_close()
+        self.assertEqual(len(store), 1)
+        files = os.listdir(self.dir)
+        self.assertEqual(len(files), 1)
+        with open(os.path.join(self.dir, files[0]), encoding="utf-8") as fh:
+            (entry,) = json.load(fh).values()
+        self.assertNotIn("secret", entry["request"])
+
+        with replaying(self.dir) as server:
+            replayed = requests.get(f"{base}/search", params={"q": "kid a", "api_key": "other"})
+            missing = requests.get(f"{base}/search", params={"q": "ok computer"})
+        self.assertEqual(replayed.status_code, 200)
+        self.assertEqual(replayed.json(), live.json())
+        self.assertEqual(missing.status_code, 404)
+        self.assertEqual(server.stats["hits"], 1)
+        self.assertEqual(server.stats["misses"], 1)
+
+    def test_token_and_profile_fields_never_reach_disk(self):
+        origin, base = self._origin()
+        with recording(self.dir):
+            token = requests.get(f"{base}/api/token").json()
+            requests.get(f"{base}/v1/me")
+        origin.shutdown()
+        origin.server_close()
+        self.assertEqual(token["access_token"], "live-access")  # the caller sees the real one
+        (name,) = os.listdir(self.dir)
+        with open(os.path.join(self.dir, name), encoding="utf-8") as fh:
+            on_disk = fh.read()
+        for secret in ("live-access", "live-refresh", "someone@example.com", "Someone"):
+            self.assertNotIn(secret, on_disk)
+        with replaying(self.dir):
+            replayed = requests.get(f"{base}/api/token").json()
+        self.assertEqual(replayed, {"access_token": "REDACTED", "token_type": "Bearer",
+                                    "refresh_token": "REDACTED", "expires_in": 3600})
+
+    def test_injected_latency_and_faults(self):
+        store = CassetteStore(self.dir)
+        store.put("GET", "https://api.example/x", None, 200, {}, b"{}")
+        store.save()
+        with replaying(self.dir, ReplayConfig(latency_ms=50)) as server:
+            start = time.perf_counter()
+            requests.get("https://api.example/x")
+            self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+
+        config = ReplayConfig(rate_limit_rate=1.0, retry_after=7)
+        with replaying(self.dir, config) as server:
+            resp = requests.get("https://api.example/x")
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(resp.headers["Retry-After"], "7")
+        self.assertEqual(server.stats["rate_limited"], 1)
+
+        config = ReplayConfig(per_host={"api.example": {"error_rate": 1.0}})
+        with replaying(self.dir, config):
+            self.assertEqual(requests.get("https://api.example/x").status_code, 503)
+
+    def test_providers_run_against_cassettes(self):
+        page = {"query": {"pages": [{
+            "index": 1, "title": "Kid A",
+            "revisions": [{"slots": {"main": {"content":
+                "{{Infobox album\n| artist = [[Radiohead]]\n| genre = [[Electronica]]\n}}"}}}],
+        }]}}
+        lookup = WikipediaGenreLookup()
+        store = CassetteStore(self.dir)
+        url = requests.Request("GET", WIKI_API, params={
+            "action": "query", "format": "json", "formatversion": "2",
+            "prop": "revisions", "rvprop": "content", "rvslots": "main",
+            "rvsection": "0", "redirects": "1", "generator": "search",
+            "gsrsearch": "Kid A Radiohead album", "gsrlimit": "3",
+        }).prepare().url
+        store.put("GET", url, None, 200, {"Content-Type": "application/json"},
+                  json.dumps(page).encode())
+        store.save()
+        with replaying(self.dir) as server:
+            self.assertEqual(lookup.album_genres("Kid A", "Radiohead"), ["Electronica"])
+        self.assertEqual(server.stats["hits"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
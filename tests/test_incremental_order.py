@@ -0,0 +1,127 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+import sorter_core
+from genre_normalization import load_genre_roots, count_fragmented_roots
+from incremental_order import (
+    load_order_state,
+    plan_incremental_order,
+    save_order_state,
+    state_baseline,
+)
+
+
+def _df(albums):
+    return pd.DataFrame([
+        {"Unique Album": u, "Album": u, "Artist": u, "Album Genre": g, "Album ID": u}
+        for u, g in albums
+    ])
+
+
+BASE = [
+    ("a", ["Pop Punk", "Emo"]), ("b", ["Bebop", "Jazz"]), ("c", ["Skate Punk"]),
+    ("d", ["Deep House", "Electronic"]), ("e", ["Hardcore Punk"]),
+    ("f", ["Swing", "Jazz"]), ("g", ["Techno"]), ("h", ["Melodic Hardcore"]),
+]
+
+
+class PlanIncrementalTest(unittest.TestCase):
+    def setUp(self):
+        self.state = {"version": 1, "mode": "two_level", "albums": [
+            {"album": "p1", "root": "Punk", "tags": ["pop punk"]},
+            {"album": "p2", "root": "Punk", "tags": ["skate punk"]},
+            {"album": "j1", "root": "Jazz", "tags": ["bebop", "jazz"]},
+            {"album": "j2", "root": "Jazz", "tags": ["swing", "jazz"]},
+        ]}
+
+    def _current(self, extra=(), drop=()):
+        albums = [(a["album"], a["root"], set(a["tags"])) for a in self.state["albums"]
+                  if a["album"] not in drop]
+        albums.extend(extra)
+        names, roots, tags = zip(*albums)
+        return list(names), list(tags), list(roots)
+
+    def test_new_album_lands_in_its_family_block(self):
+        names, tags, roots = self._current(extra=[("j3", "Jazz", {"swing", "big band"})])
+        order, stats = plan_incremental_order(self.state, names, tags, roots, 0.5)
+        self.assertEqual(order[:3], ["p1", "p2", "j1"])
+        self.assertEqual(set(order[2:]), {"j1", "j2", "j3"})
+        self.assertEqual(order.index("j3"), order.index("j2") + 1)  # next to its swing sibling
+        self.assertEqual(stats["added"], 1)
+
+    def test_removed_album_leaves_rest_untouched(self):
+        names, tags, roots = self._current(drop={"p2"})
+        order, stats = plan_incremental_order(self.state, names, tags, roots, 0.5)
+        self.assertEqual(order, ["p1", "j1", "j2"])
+        self.assertEqual(stats["removed"], 1)
+
+    def test_new_family_opens_block_at_a_seam(self):
+        names, tags, roots = self._current(extra=[("t1", "Electronic", {"techno"})])
+        order, _ = plan_incremental_order(self.state, names, tags, roots, 0.5)
+        roots_by = dict(zip(names, roots))
+        self.assertEqual(count_fragmented_roots([roots_by[n] for n in order]), 0)
+
+    def test_drift_over_threshold_requests_rebuild(self):
+        names, tags, roots = self._current(extra=[("x1", "Rock", {"rock"}),
+                                                  ("x2", "Rock", {"indie rock"})])
+        order, stats = plan_incremental_order(self.state, names, tags, roots, 0.25)
+        self.assertIsNone(order)
+        self.assertAlmostEqual(stats["drift"], 0.5)
+
+    def test_drift_accumulates_since_the_last_full_rebuild(self):
+        baseline = state_baseline(self.state)
+        # An earlier incremental run already added j3 (1/4 drift, under the threshold).
+        self.state["albums"].append({"album": "j3", "root": "Jazz", "tags": ["big band"]})
+        self.state["baseline"] = baseline
+        names, tags, roots = self._current(extra=[("j4", "Jazz", {"cool jazz"})])
+        order, stats = plan_incremental_order(self.state, names, tags, roots, 0.25)
+        self.assertIsNone(order)  # 1/5 against the stored order, but 2/4 since the rebuild
+        self.assertEqual((stats["added"], stats["drift"]), (1, 0.5))
+
+
+class IncrementalPipelineTest(unittest.TestCase):
+    def test_roundtrip_keeps_previous_positions(self):
+        rules = load_genre_roots()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "state.json")
+
+        ordering, _ = sorter_core._order_albums(_df(BASE), 0.6, 10, 2.0, rules)
+        save_order_state(path, ordering, "two_level")
+        before = list(ordering.sort_values("Sort Order")["Unique Album"])
+
+        state = load_order_state(path)
+        self.assertEqual(state["mode"], "two_level")
+        grown = BASE + [("i", ["Crust Punk"])]
+        ordering2, metrics = sorter_core._order_albums(
+            _df(grown), 0.6, 10, 2.0, rules, previous_state=state, drift_threshold=0.5
+        )
+        after = list(ordering2.sort_values("Sort Order")["Unique Album"])
+        self.assertEqual([n for n in after if n != "i"], before)
+        self.assertEqual(set(metrics), {"incremental"})
+        self.assertEqual(metrics["incremental"]["fragmented"], 0)
+
+    def test_tags_with_commas_match_on_the_next_run(self):
+        rules = load_genre_roots()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "state.json")
+        albums = BASE + [("w", ["Folk, World, & Country", "Folk"])]
+        ordering, _ = sorter_core._order_albums(_df(albums), 0.6, 10, 2.0, rules)
+        save_order_state(path, ordering, "two_level")
+
+        _, metrics = sorter_core._order_albums(
+            _df(albums), 0.6, 10, 2.0, rules, previous_state=load_order_state(path)
+        )
+        inc = metrics["incremental"]
+        self.assertEqual((inc["added"], inc["removed"], inc["drift"]), (0, 0, 0.0))
+
+    def test_missing_state_file_is_none(self):
+        self.assertIsNone(load_order_state("/nonexistent/state.json"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import json
+import os
+import pstats
+import tempfile
+import time
+import unittest
+
+import instrumentation
+from instrumentation import Profiler, stage
+
+
+def _busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(100))
+
+
+class InstrumentationTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_stage_is_noop_without_profiler(self):
+        self.assertIsNone(instrumentation.active())
+        with stage("anything") as s:
+            s.items = 3
+        instrumentation.note("ignored", 1)
+
+    def test_records_time_items_calls_and_nested_peak(self):
+        with Profiler(output_dir=self.tmp.name) as profiler:
+            with stage("ordering"):
+                with stage("ordering.similarity", items=5):
+                    block = bytearray(4 * 1024 * 1024)
+                    del block
+                _busy(0.01)
+            for _ in range(3):
+                with stage("provider") as s:
+                    s.items = 2
+        self.assertIsNone(instrumentation.active())
+        records = profiler.records
+        self.assertEqual(list(records), ["ordering", "ordering.similarity", "provider"])
+        outer, inner = records["ordering"], records["ordering.similarity"]
+        self.assertGreaterEqual(outer.wall_s, inner.wall_s + 0.01)
+        self.assertGreater(outer.cpu_s, 0)
+        self.assertGreaterEqual(inner.peak_bytes, 4 * 1024 * 1024)
+        # The child's allocation counts toward the parent's peak.
+        self.assertGreaterEqual(outer.peak_bytes, inner.peak_bytes)
+        self.assertEqual(inner.items, 5)
+        self.assertEqual((records["provider"].calls, records["provider"].items), (3, 6))
+
+    def test_ordering_peak_comes_from_the_profiler_record(self):
+        import sorter_core
+
+        with Profiler(output_dir=self.tmp.name):
+            with stage("ordering"):
+                with stage("ordering.similarity"):
+                    block = bytearray(8 * 1024 * 1024)
+                    del block
+                with stage("ordering.legacy"):
+                    pass  # nested stages reset tracemalloc's own peak
+            peak, traced = sorter_core._ordering_peak_memory()
+        self.assertTrue(traced)
+        self.assertGreaterEqual(peak, 8 * 1024 * 1024)
+        _, traced = sorter_core._ordering_peak_memory()
+        self.assertFalse(traced)  # no profiler: process RSS
+
+    def test_report_and_capture_artifacts(self):
+        profiler = Profiler(output_dir=self.tmp.name, prefix="run",
+                            capture=("pstats", "collapsed"), sample_interval=0.001)
+        with profiler:
+            instrumentation.note("tracks", 10)
+            with stage("ordering", capture=True):
+                _busy(0.05)
+            with stage("csv_export"):
+                pass
+        path = profiler.write()
+        with open(path, encoding="utf-8") as fh:
+            report = json.load(fh)
+        self.assertEqual([s["name"] for s in report["stages"]], ["ordering", "csv_export"])
+        self.assertEqual(report["notes"], {"tracks": 10})
+        self.assertEqual(set(report["artifacts"]), {"ordering.pstats", "ordering.collapsed"})
+        stats = pstats.Stats(report["artifacts"]["ordering.pstats"])
+        self.assertTrue(any(func[2] == "_busy" for func in stats.stats))
+        with open(report["artifacts"]["ordering.collapsed"], encoding="utf-8") as fh:
+            lines = fh.read().splitlines()
+        self.assertTrue(lines)
+        self.assertTrue(any("test_instrumentation.py:_busy" in line for line in lines))
+        stack, count = lines[0].rsplit(" ", 1)
+        self.assertGreater(int(count), 0)
+        self.assertTrue(os.path.exists(os.path.join(self.tmp.name, "run.json")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from scipy.sparse.csgraph import minimum_spanning_tree
+from sklearn.metrics.pairwise import cosine_similarity
+
+import sorter_core
+from genre_normalization import load_genre_roots, count_fragmented_roots, infer_root
+from similarity import (
+    SimilarityWorkspace,
+    blocked_cosine_similarity,
+    prim_mst_edges,
+    upper_triangle_quantile,
+)
+
+
+class BlockedSimilarityTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.X = (rng.random((40, 12)) > 0.7).astype(float)
+        self.X[3] = 0.0  # an album without tags
+
+    def test_matches_sklearn_in_float32(self):
+        with SimilarityWorkspace(budget_mb=1) as ws:
+            sim = blocked_cosine_similarity(self.X, ws)
+            self.assertEqual(sim.dtype, np.float32)
+            np.testing.assert_allclose(sim, cosine_similarity(self.X), atol=1e-6)
+
+    def test_spills_to_memmap_when_over_budget(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        # 40x40 float32 = 6.4 KB; a ~5 KB budget forces the spill.
+        with SimilarityWorkspace(budget_mb=0.005, scratch_dir=tmp.name) as ws:
+            sim = blocked_cosine_similarity(self.X, ws)
+            self.assertIsInstance(sim, np.memmap)
+            self.assertGreater(ws.spilled_bytes, 0)
+            self.assertTrue(os.listdir(tmp.name))
+            np.testing.assert_allclose(sim, cosine_similarity(self.X), atol=1e-6)
+        self.assertEqual(os.listdir(tmp.name), [])  # scratch files removed
+
+    def test_regrown_and_released_buffers_leave_the_budget(self):
+        # 1 KB budget: a 200-float scratch (800 B) regrown to 250 floats (1000 B)
+        # only fits because the old one is given back first.
+        with SimilarityWorkspace(budget_mb=1 / 1024) as ws:
+            ws.scratch((200,))
+            grown = ws.scratch((250,))
+            self.assertNotIsInstance(grown, np.memmap)
+            self.assertEqual((ws.resident_bytes, ws.spilled_bytes), (1000, 0))
+            ws.close()
+            self.assertEqual(ws.resident_bytes, 0)
+            buf = ws.empty((250,))
+            ws.release(buf)
+            self.assertNotIsInstance(ws.empty((250,)), np.memmap)
+
+    def test_upper_triangle_quantile(self):
+        sim = cosine_similarity(self.X)
+        expected = np.quantile(sim[np.triu_indices_from(sim, k=1)], 0.5)
+        with SimilarityWorkspace(budget_mb=1, dtype=np.float64) as ws:
+            self.assertAlmostEqual(upper_triangle_quantile(sim, 0.5, ws), expected)
+
+    def test_prim_matches_scipy_tree_weight(self):
+        dist = 1.0 - cosine_similarity(self.X)
+        np.fill_diagonal(dist, 0.0)
+        edges = prim_mst_edges(dist)
+        self.assertAlmostEqual(
+            sum(w for *_, w in edges), minimum_spanning_tree(dist).sum(), places=6
+        )
+
+
+class BudgetedOrderingTest(unittest.TestCase):
+    def test_budgeted_two_level_keeps_families_contiguous(self):
+        rules = load_genre_roots()
+        albums = [
+            ("a", ["Pop Punk", "Emo"]), ("b", ["Bebop", "Jazz"]), ("c", ["Skate Punk"]),
+            ("d", ["Deep House", "Electronic"]), ("e", ["Hardcore Punk"]),
+            ("f", ["Swing", "Jazz"]), ("g", ["Techno"]), ("h", ["Melodic Hardcore"]),
+        ]
+        df = pd.DataFrame([
+            {"Unique Album": u, "Album": u, "Artist": u, "Album Genre": g, "Album ID": u}
+            for u, g in albums
+        ])
+        with SimilarityWorkspace(budget_mb=1) as ws:
+            ordering, metrics = sorter_core._order_albums(
+                df, 0.6, 10, 2.0, rules, ordering_mode="two_level", workspace=ws
+            )
+        names = list(ordering.sort_values("Sort Order")["Unique Album"])
+        self.assertEqual(sorted(names), sorted(u for u, _ in albums))
+        by_uid = {u: infer_root(g, rules) for u, g in albums}
+        self.assertEqual(count_fragmented_roots([by_uid[n] for n in names]), 0)
+        self.assertEqual(set(metrics), {"legacy", "roots", "two_level"})
+
+
+if __name__ == "__main__":
+    unittest.main()
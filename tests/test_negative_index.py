@@ -0,0 +1,117 @@
+import configparser
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from genre_cache import GenreCache
+from negative_index import NegativeIndex
+
+
+class NegativeIndexTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.path = os.path.join(self.dir, "negative_index.npz")
+        self.now = [1_000_000.0]
+
+    def _index(self, **kwargs):
+        return NegativeIndex(self.path, clock=lambda: self.now[0], **kwargs)
+
+    def test_counts_back_off_and_persist(self):
+        index = self._index(max_backoff_days=1)
+        for expected in (1, 2, 3):
+            self.assertEqual(index.record_miss("genre:album:x"), expected)
+        index.record_miss("genre:album:y")
+        self.assertEqual([index.backoff_ttl(m, 3600) for m in (1, 2, 3, 10)],
+                         [3600, 7200, 14400, 86400])
+        index.save()
+
+        reloaded = self._index()
+        self.assertEqual((reloaded.misses("genre:album:x"), len(reloaded)), (3, 2))
+        self.assertTrue(reloaded.is_deferred("genre:album:x"))
+        reloaded.clear("genre:album:x")
+        reloaded.save()
+        self.assertEqual(self._index().misses("genre:album:x"), 0)
+        self.assertLess(os.path.getsize(self.path), 1024)
+
+        self.now[0] += 3 * 86400  # idle past twice the max backoff: dropped on save
+        stale = self._index(max_backoff_days=1)
+        stale.record_miss("genre:album:z")
+        stale.save()
+        self.assertEqual(self._index().misses("genre:album:y"), 0)
+
+    def test_resolver_extends_negative_ttl_and_clears_on_success(self):
+        import sorter_core
+
+        answer = []
+        backend = MagicMock()
+        backend.get_genre_providers.return_value = [("Discogs", lambda: list(answer))]
+        index = self._index()
+        for _ in range(3):
+            self.now[0] += 30 * 86400  # the previous negative entry has expired
+            cache = GenreCache(backend="file", file_path=os.path.join(self.dir, "c.json"),
+                               negative_ttl_hours=6, time_fn=lambda: self.now[0])
+            resolve = sorter_core._make_genre_resolver(backend, {}, cache, negatives=index)
+            self.assertEqual(resolve("s", "Artist", "Obscure", "al1", None), ([], "None"))
+        self.assertEqual(index.misses("genre:album:al1"), 3)
+        self.assertEqual(cache._file_data["genre:album:al1"]["ttl"], 4 * 6 * 3600)
+        answer.append("Drone")
+        resolve("s", "Artist", "Obscure", "al1", None, refresh=True)
+        self.assertEqual(index.misses("genre:album:al1"), 0)
+
+
+class DeferredEnrichmentTest(unittest.TestCase):
+    def test_repeat_misses_are_resolved_last_within_their_budget(self):
+        import sorter_core
+        from tracks import SpotifyTrack
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        index_path = os.path.join(tmp.name, "negative_index.npz")
+        seeded = NegativeIndex(index_path)
+        for _ in range(2):
+            seeded.record_miss("genre:album:al2")
+            seeded.record_miss("genre:album:al3")
+        seeded.record_miss("genre:album:al3")
+        seeded.save()
+
+        order = []
+        backend = MagicMock(key="spotify", liked_slug="liked", display_name="Fake",
+                            supports_local=False)
+        backend.get_liked_songs.return_value = [
+            SpotifyTrack(f"S{i}", f"Artist {i}", f"Album {i}", album_id=f"al{i}",
+                         track_number=1, disc_number=1, track_id=f"t{i}")
+            for i in range(5)
+        ]
+        backend.get_genre_providers.side_effect = (
+            lambda song, artist, album, clean, album_id, *rest:
+            [("Discogs", lambda: order.append(album_id) or ([] if album_id in ("al2", "al3")
+                                                             else ["Rock"]))]
+        )
+        backend.add_tracks.return_value = (5, 0)
+        config = configparser.ConfigParser()
+        config.read_string(
+            "[GENRE]\n[CLUSTERING]\n[CACHE]\nbackend = file\n"
+            f"file_path = {os.path.join(tmp.name, 'c.json')}\n"
+            f"negative_index_file = {index_path}\nrefresh_workers = 0\n"
+        )
+        cwd = os.getcwd()
+        os.chdir(tmp.name)
+        self.addCleanup(os.chdir, cwd)
+        with unittest.mock.patch("builtins.input", return_value="1"):
+            sorter_core.run(backend, config)
+        self.assertEqual(order, ["al0", "al1", "al4", "al2", "al3"])  # fewest misses first
+        self.assertEqual(NegativeIndex(index_path).misses("genre:album:al3"), 4)
+
+        order.clear()
+        config.set("CACHE", "deferred_budget_s", "0")
+        config.set("CACHE", "file_path", os.path.join(tmp.name, "empty.json"))
+        with unittest.mock.patch("builtins.input", return_value="1"):
+            sorter_core.run(backend, config)
+        self.assertNotIn("al2", order)  # no budget left: postponed, not looked up
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+import sorter_core
+from genre_normalization import load_genre_roots, count_fragmented_roots
+from order_refinement import path_score, refine_order, root_blocks
+
+
+def _line_similarity(n):
+    """Albums on a line: similarity decays with distance, so 0..n-1 is optimal."""
+    pos = np.arange(n)
+    return 1.0 / (1.0 + np.abs(pos[:, None] - pos[None, :]))
+
+
+class RefineOrderTest(unittest.TestCase):
+    def test_root_blocks(self):
+        self.assertEqual(root_blocks(["a", "a", "b", "c", "c"]), [(0, 2), (2, 3), (3, 5)])
+
+    def test_recovers_scrambled_block(self):
+        sim = _line_similarity(8)
+        scrambled = [0, 5, 2, 7, 1, 4, 6, 3]
+        refined, stats = refine_order(scrambled, sim, ["x"] * 8, time_budget_ms=2000)
+        self.assertGreater(stats["after"], stats["before"])
+        self.assertAlmostEqual(stats["after"], path_score(refined, sim))
+        self.assertIn(refined, ([0, 1, 2, 3, 4, 5, 6, 7], [7, 6, 5, 4, 3, 2, 1, 0]))
+
+    def test_moves_stay_inside_root_blocks(self):
+        sim = _line_similarity(10)
+        order = [3, 0, 2, 1, 4, 9, 6, 8, 5, 7]
+        roots = ["a"] * 4 + ["b"] + ["c"] * 5
+        refined, _ = refine_order(order, sim, roots, time_budget_ms=2000)
+        self.assertEqual(sorted(refined[:4]), [0, 1, 2, 3])
+        self.assertEqual(refined[4], 4)
+        self.assertEqual(sorted(refined[5:]), [5, 6, 7, 8, 9])
+
+    def test_zero_budget_is_a_no_op(self):
+        sim = _line_similarity(6)
+        order = [5, 0, 3, 1, 4, 2]
+        refined, stats = refine_order(order, sim, ["x"] * 6, time_budget_ms=0,
+                                      time_fn=iter(range(0, 100, 1)).__next__)
+        self.assertEqual(refined, order)
+        self.assertEqual(stats["moves"], 0)
+
+
+class RefinePipelineTest(unittest.TestCase):
+    def test_two_level_refinement_reports_gain_and_keeps_contiguity(self):
+        rules = load_genre_roots()
+        albums = [
+            ("a", ["Pop Punk", "Emo"]), ("b", ["Bebop", "Jazz"]), ("c", ["Skate Punk", "Punk"]),
+            ("d", ["Deep House", "Electronic"]), ("e", ["Hardcore Punk", "Punk"]),
+            ("f", ["Swing", "Jazz"]), ("g", ["Techno", "Electronic"]), ("h", ["Emo", "Punk"]),
+        ]
+        df = pd.DataFrame([
+            {"Unique Album": u, "Album": u, "Artist": u, "Album Genre": g, "Album ID": u}
+            for u, g in albums
+        ])
+        ordering, metrics = sorter_core._order_albums(
+            df, 0.6, 10, 2.0, rules, ordering_mode="two_level", refine_ms=500
+        )
+        refine = metrics["two_level"]["refine"]
+        self.assertGreaterEqual(refine["after"], refine["before"])
+        self.assertIn("overlap_after", refine)
+        roots = dict(zip(ordering["Unique Album"], ordering["Root Genre"]))
+        names = list(ordering.sort_values("Sort Order")["Unique Album"])
+        self.assertEqual(count_fragmented_roots([roots[n] for n in names]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import random
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+import sorter_core
+from genre_normalization import load_genre_roots
+from similarity import SimilarityWorkspace
+
+
+def _library(n_albums=60, seed=3):
+    rules = load_genre_roots()
+    rng = random.Random(seed)
+    families = [r["keywords"] for r in rules[:8]]
+    rows = []
+    for i in range(n_albums):
+        words = rng.choice(families)
+        tags = [k.title() for k in rng.sample(words, min(len(words), rng.randint(1, 3)))]
+        rows.append({"Unique Album": f"alb{i}", "Album": f"alb{i}", "Artist": f"art{i % 17}",
+                     "Album Genre": tags, "Album ID": f"alb{i}"})
+    return pd.DataFrame(rows), rules
+
+
+class ParallelMicroOrderTest(unittest.TestCase):
+    def _names(self, df, rules, workers, workspace=None):
+        ordering, _ = sorter_core._order_albums(
+            df, 0.6, 10, 2.0, rules, ordering_mode="two_level",
+            workspace=workspace, workers=workers,
+        )
+        return list(ordering.sort_values("Sort Order")["Unique Album"])
+
+    def test_pool_output_identical_to_serial(self):
+        df, rules = _library()
+        self.assertEqual(self._names(df, rules, 1), self._names(df, rules, 3))
+
+    def test_pool_output_identical_under_memory_budget(self):
+        df, rules = _library(seed=11)
+        with SimilarityWorkspace(budget_mb=1) as ws:
+            serial = self._names(df, rules, 1, ws)
+        with SimilarityWorkspace(budget_mb=1) as ws:
+            pooled = self._names(df, rules, 2, ws)
+        self.assertEqual(serial, pooled)
+
+    def test_workers_share_what_the_parent_and_packed_file_leave(self):
+        MB = 1024 * 1024
+        with SimilarityWorkspace(budget_mb=100) as ws:
+            ws.empty((20 * MB // 4,))  # 20 MB of float32 held by the parent
+            self.assertAlmostEqual(sorter_core._worker_budget_mb(ws, 20 * MB, 4), 15.0)
+            self.assertEqual(sorter_core._worker_budget_mb(ws, 90 * MB, 4), 1.0)
+
+    def test_dominant_family_is_copied_within_the_budget(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        X = (np.random.default_rng(5).random((60, 10)) > 0.6).astype(np.float32)
+        norms = np.linalg.norm(X, axis=1, keepdims=True)
+        sim = (X / np.where(norms == 0, 1, norms)) @ (X / np.where(norms == 0, 1, norms)).T
+        names = [f"alb{i}" for i in range(60)]
+        groups = {"big": list(range(56)), "small": list(range(56, 60))}
+        # The 56x56 float32 family block (12.5 KB) is over a 5 KB budget.
+        with SimilarityWorkspace(budget_mb=0.005, scratch_dir=tmp.name) as ws:
+            self.assertLess(ws.block_rows(56), 56)
+            block = sorter_core._family_block(sim, groups["big"], ws)
+            self.assertIsInstance(block, np.memmap)
+            np.testing.assert_array_equal(block, sim[np.ix_(groups["big"], groups["big"])])
+            serial = sorter_core._micro_orders(names, sim, groups, 0.6, 10, ws)
+            pooled = sorter_core._micro_orders(names, sim, groups, 0.6, 10, ws, workers=2)
+        self.assertEqual(serial, pooled)
+        self.assertEqual(set(serial["big"]), set(names[:56]))
+
+    def test_micro_orders_fall_back_to_serial(self):
+        names = ["a", "b", "c", "d"]
+        sim = np.eye(4)
+        groups = {"x": [0, 1], "y": [2, 3]}
+        with patch.object(
+            sorter_core, "_parallel_micro_orders", side_effect=OSError("no shm")
+        ):
+            micro = sorter_core._micro_orders(names, sim, groups, 0.6, 10, workers=4)
+        self.assertEqual(sorted(micro["x"]), ["a", "b"])
+        self.assertEqual(sorted(micro["y"]), ["c", "d"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import configparser
+import csv
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from genre_cache import GenreCache
+from prewarm import load_tracks, prewarm
+from tracks import SpotifyTrack
+
+
+def _write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        writer = csv.DictWriter(fh, ["Song", "Artist", "Album", "Album ID", "Spotify Track ID",
+                                     "Is Local", "Album Genre"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+class PrewarmTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.csv = os.path.join(self.dir, "spotify_liked_sorted_2026-06-29.csv")
+        _write_csv(self.csv, [
+            {"Song": f"S{i}", "Artist": f"Artist {i % 3}", "Album": f"Album {i % 6}",
+             "Album ID": f"al{i % 6}", "Spotify Track ID": f"t{i}", "Is Local": "False",
+             "Album Genre": "['Rock']"}
+            for i in range(30)
+        ])
+        self.config = configparser.ConfigParser()
+        self.config.read_string("[GENRE]\n[CACHE]\nnegative_index_file = "
+                                + os.path.join(self.dir, "negative_index.npz"))
+        self.lock = threading.Lock()
+        self.calls = []
+
+        def providers(song, artist, album, clean_album, album_id, track_id, config):
+            def lookup():
+                with self.lock:
+                    self.calls.append(album_id)
+                return [] if album_id == "al5" else ["Rock"]
+            return [("Discogs", lookup)]
+
+        self.backend = MagicMock(key="spotify", track_type=SpotifyTrack)
+        self.backend.get_genre_providers.side_effect = providers
+
+    def _cache(self):
+        return GenreCache(backend="file", file_path=os.path.join(self.dir, "c.json"))
+
+    def test_load_tracks_reads_sorted_csv_exports(self):
+        tracks = load_tracks([self.csv], SpotifyTrack)
+        self.assertEqual(len(tracks), 30)
+        self.assertEqual((tracks[7].album, tracks[7].album_id, tracks[7].track_id, tracks[7].is_local),
+                         ("Album 1", "al1", "t7", False))
+
+    def test_fills_cache_in_parallel_and_resumes(self):
+        tracks = load_tracks([self.csv], SpotifyTrack)
+        cache = self._cache()
+        cache.set("genre:album:al0", ["Jazz"], "LastFM Album")  # left by an interrupted run
+        summary = prewarm(self.backend, self.config, cache, tracks, workers=3, progress=False)
+        self.assertEqual((summary["albums"], summary["cached"]), (6, 1))
+        self.assertEqual((summary["found"], summary["not_found"]), (4, 1))
+        self.assertEqual(sorted(self.calls), ["al1", "al2", "al3", "al4", "al5"])
+        self.backend.prefetch_genres.assert_called_once()
+
+        again = prewarm(self.backend, self.config, self._cache(), tracks, progress=False)
+        self.assertEqual(again["cached"], 6)
+        self.assertEqual(len(self.calls), 5)
+
+        import sorter_core
+        resolve = sorter_core._make_genre_resolver(self.backend, {}, self._cache(),
+                                                   cache_only=True)
+        self.assertEqual(resolve("S1", "Artist 1", "Album 1", "al1", "t1"), (["Rock"], "Discogs"))
+        self.assertEqual(resolve("S9", "Nobody", "Unknown", "zz", "t99"), ([], "None"))
+        self.assertEqual(len(self.calls), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
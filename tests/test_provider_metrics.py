@@ -0,0 +1,105 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import genre_helpers
+from provider_metrics import ProviderMetrics
+
+
+def _clock(steps):
+    """Fake clock advancing by the next value of ``steps`` on every second read."""
+    state = {"now": 0.0, "reads": 0, "steps": list(steps)}
+
+    def now():
+        state["reads"] += 1
+        if state["reads"] % 2 == 0:
+            state["now"] += state["steps"].pop(0)
+        return state["now"]
+
+    return now
+
+
+class ProviderMetricsTest(unittest.TestCase):
+    def test_classifies_outcomes_and_latency_quantiles(self):
+        metrics = ProviderMetrics(clock=_clock([0.1] * 98 + [3.0, 5.0]))
+        for i in range(100):
+            metrics.measure("Wikipedia", lambda i=i: ["Rock"] if i < 2 else [])
+        stats = metrics.providers["Wikipedia"]
+        self.assertEqual((stats.calls, stats.successes, stats.empties), (100, 2, 98))
+        self.assertAlmostEqual(stats.quantile(0.5), 0.1)
+        self.assertAlmostEqual(stats.quantile(0.99), 3.0)
+        self.assertEqual(metrics.flagged(), [])  # p95 is fast
+        slow = ProviderMetrics(clock=_clock([3.0] * 50))
+        for i in range(50):
+            slow.measure("Wikipedia", lambda i=i: ["Rock"] if i == 0 else [])
+        self.assertEqual(slow.flagged(), ["Wikipedia"])  # 2% yield, 3 s p95
+
+    def test_swallowed_errors_and_bytes_are_attributed(self):
+        metrics = ProviderMetrics()
+        ok = MagicMock(status_code=200, content=b"x" * 300)
+        ok.json.return_value = {"results": []}
+        with patch("genre_helpers.requests.get", return_value=ok):
+            result = metrics.measure(
+                "iTunes", lambda: genre_helpers.get_itunes_album_info("Kid A", "Radiohead")
+            )
+        self.assertEqual(result, [])
+        with patch("genre_helpers.requests.get", side_effect=ConnectionError("down")):
+            metrics.measure(
+                "iTunes", lambda: genre_helpers.get_itunes_album_info("Kid A", "Radiohead")
+            )
+        throttled = MagicMock(status_code=503, content=b"{}")
+        throttled.json.return_value = {}
+        with patch("genre_helpers.requests.get", return_value=throttled):
+            metrics.measure(
+                "MusicBrainz", lambda: genre_helpers.get_musicbrainz_album_info("Kid A", "Radiohead")
+            )
+        itunes, mb = metrics.providers["iTunes"], metrics.providers["MusicBrainz"]
+        self.assertEqual((itunes.empties, itunes.exceptions, itunes.bytes), (1, 1, 300))
+        self.assertIn("ConnectionError", itunes.last_error)
+        self.assertEqual((mb.empties, mb.exceptions), (0, 1))
+
+    def test_raised_exceptions_are_counted_and_propagate(self):
+        metrics = ProviderMetrics()
+
+        def boom():
+            raise RuntimeError("bad payload")
+
+        with self.assertRaises(RuntimeError):
+            metrics.measure("Discogs", boom)
+        self.assertEqual(metrics.providers["Discogs"].exceptions, 1)
+
+    def test_prometheus_text(self):
+        metrics = ProviderMetrics(clock=_clock([0.5, 1.5]))
+        metrics.measure("LastFM Album", lambda: ["Jazz"])
+        metrics.measure("LastFM Album", lambda: [])
+        text = metrics.prometheus()
+        self.assertIn("# TYPE genre_provider_calls_total counter", text)
+        self.assertIn('genre_provider_calls_total{provider="LastFM Album",outcome="success"} 1', text)
+        self.assertIn('genre_provider_calls_total{provider="LastFM Album",outcome="empty"} 1', text)
+        self.assertIn('genre_provider_latency_seconds{provider="LastFM Album",quantile="0.5"} 0.500000',
+                      text)
+        self.assertIn('genre_provider_latency_seconds_count{provider="LastFM Album"} 2', text)
+        self.assertTrue(text.endswith("\n"))
+
+    def test_resolver_records_every_provider_tried(self):
+        import sorter_core
+        from genre_cache import GenreCache
+
+        backend = MagicMock()
+        backend.get_genre_providers.return_value = [
+            ("Discogs", MagicMock(return_value=[])),
+            ("LastFM Album", MagicMock(return_value=["Shoegaze"])),
+            ("iTunes", MagicMock(return_value=["Rock"])),
+        ]
+        metrics = ProviderMetrics()
+        resolve = sorter_core._make_genre_resolver(
+            backend, {}, GenreCache(backend="none"), metrics=metrics
+        )
+        self.assertEqual(resolve("s", "Artist", "Album", "alb", None), (["Shoegaze"], "LastFM Album"))
+        report = metrics.report()
+        self.assertEqual(report["Discogs"]["empties"], 1)
+        self.assertEqual(report["LastFM Album"]["successes"], 1)
+        self.assertNotIn("iTunes", report)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import configparser
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from genre_cache import GenreCache, make_key
+from refresh_cache import StaleRefresher, stale_entries
+
+
+class StaleRefresherTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "c.json")
+        self.clock = [0.0]
+
+    def _cache(self):
+        return GenreCache(backend="file", file_path=self.path, ttl_days=1, stale_days=1,
+                          ttl_jitter=0, time_fn=lambda: self.clock[0])
+
+    def test_stale_entries_are_refreshed_without_losing_answers(self):
+        import sorter_core
+
+        answers = {"Album 0": ["Rock"], "Album 1": ["Jazz"]}
+        backend = MagicMock()
+        backend.get_genre_providers.side_effect = (
+            lambda song, artist, album, *rest: [("Discogs", lambda: list(answers[album]))]
+        )
+        cache = self._cache()
+        resolve = sorter_core._make_genre_resolver(backend, {}, cache, service="spotify")
+        for i in range(2):
+            resolve("s", "Artist", f"Album {i}", f"al{i}", f"t{i}")
+        cache.close()
+
+        self.clock[0] = 1.5 * 86400
+        answers["Album 0"] = ["Post-Rock"]
+        answers["Album 1"] = []  # provider no longer answers
+        cache = self._cache()
+        resolve = sorter_core._make_genre_resolver(backend, {}, cache, service="spotify")
+        items = stale_entries(cache, "spotify")
+        self.assertEqual(sorted(key for key, _ in items), ["genre:album:al0", "genre:album:al1"])
+        self.assertEqual(stale_entries(cache, "tidal"), [])
+
+        refresher = StaleRefresher(resolve, workers=2)
+        refresher.start(items)
+        report = refresher.finish()
+        self.assertEqual((report["refreshed"], report["unchanged"]), (1, 1))
+
+        fresh = self._cache()
+        self.assertEqual(fresh.get("genre:album:al0"), (["Post-Rock"], "Discogs"))
+        self.assertEqual(fresh.get("genre:album:al1"), (["Jazz"], "Discogs"))  # still served
+        self.assertEqual(list(fresh.stale), ["genre:album:al1"])
+
+    def test_budget_leaves_the_rest_for_later(self):
+        now = [0.0]
+        resolve = MagicMock(return_value=(["Rock"], "Discogs"))
+
+        def slow(*args, **kwargs):
+            now[0] += 10
+            return ["Rock"], "Discogs"
+
+        resolve.side_effect = slow
+        refresher = StaleRefresher(resolve, workers=1, budget_s=25, clock=lambda: now[0])
+        refresher.start([(make_key(f"al{i}", "A", "B"), {"album": "A"}) for i in range(5)])
+        report = refresher.finish()
+        self.assertEqual((report["refreshed"], report["skipped"]), (3, 2))
+
+
+class RunRefreshTest(unittest.TestCase):
+    def setUp(self):
+        from tracks import SpotifyTrack
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.path = os.path.join(tmp.name, "c.json")
+        with open(self.path, "w", encoding="utf-8") as fh:
+            json.dump({"genre:album:al0": {"genre": ["Rock"], "source": "Discogs",
+                                           "ts": int(time.time()) - 2 * 86400, "ttl": 86400,
+                                           "grace": 30 * 86400}}, fh)
+
+        self.backend = MagicMock(key="spotify", liked_slug="liked", display_name="Fake",
+                                 supports_local=False)
+        self.backend.get_liked_songs.return_value = [
+            SpotifyTrack("S0", "Artist", "Album 0", album_id="al0", track_number=1,
+                         disc_number=1, track_id="t0")
+        ]
+        self.backend.get_genre_providers.return_value = [("Discogs", lambda: ["Post-Rock"])]
+        self.backend.add_tracks.return_value = (1, 0)
+        self.config = configparser.ConfigParser()
+        self.config.read_string(
+            f"[GENRE]\n[CLUSTERING]\n[CACHE]\nbackend = file\nfile_path = {self.path}\n"
+        )
+        cwd = os.getcwd()
+        os.chdir(tmp.name)
+        self.addCleanup(os.chdir, cwd)
+
+    def test_refresh_is_finished_and_flushed_when_upload_fails(self):
+        import sorter_core
+
+        backend, config, path = self.backend, self.config, self.path
+        backend.add_tracks.side_effect = RuntimeError("upload failed")
+        finish = MagicMock(side_effect=StaleRefresher.finish)
+        with patch("builtins.input", return_value="1"), \
+                patch.object(StaleRefresher, "finish", lambda self: finish(self)), \
+                self.assertRaises(RuntimeError):
+            sorter_core.run(backend, config)
+
+        self.assertEqual(finish.call_count, 1)  # no refresh thread left running
+        with open(path, encoding="utf-8") as fh:
+            self.assertEqual(json.load(fh)["genre:album:al0"]["genre"], ["Post-Rock"])
+
+    def test_refresh_calls_reach_the_metrics_and_the_adaptive_history(self):
+        import sorter_core
+
+        prom = os.path.join(self.dir, "providers.prom")
+        stats = os.path.join(self.dir, "provider_stats.json")
+        self.config.set("GENRE", "adaptive_order", "true")
+        self.config.set("GENRE", "adaptive_stats_file", stats)
+        self.config["METRICS"] = {"prometheus_file": prom}
+        with patch("builtins.input", return_value="1"):
+            sorter_core.run(self.backend, self.config)
+
+        # The album was served stale from the cache: every call is the refresh's.
+        with open(prom, encoding="utf-8") as fh:
+            self.assertIn('genre_provider_calls_total{provider="Discogs",outcome="success"} 1',
+                          fh.read())
+        with open(stats, encoding="utf-8") as fh:
+            self.assertEqual(json.load(fh)["spotify"]["Discogs"]["calls"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+import sorter_core
+from genre_normalization import load_genre_roots
+from similarity import SimilarityWorkspace
+from similarity_store import SimilarityStore, album_key
+from tag_vocab import TagVocabulary
+
+
+class SimilarityStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.rules = load_genre_roots()
+
+    def _sims(self, genre_lists, store, workspace=None):
+        codes = TagVocabulary().encode_albums(genre_lists)
+        _, sim_tags, sim_roots = sorter_core._similarity_matrices(
+            codes, self.rules, 2.0, workspace, store
+        )
+        return sim_tags, sim_roots
+
+    def test_album_key_ignores_tag_order(self):
+        self.assertEqual(album_key(["Rock", "Indie"]), album_key(["Indie", "Rock"]))
+        self.assertNotEqual(album_key(["Rock"]), album_key(["Rock", "Indie"]))
+
+    def test_matches_fresh_computation_and_reuses_rows(self):
+        first = [["Pop Punk", "Emo"], ["Bebop", "Jazz"], ["Skate Punk"], ["Techno"]]
+        second = [["Skate Punk"], ["Swing", "Jazz"], ["Pop Punk", "Emo"], ["Techno"], []]
+
+        store = SimilarityStore(os.path.join(self.tmp.name, "sims"))
+        self._sims(first, store)
+        self.assertEqual(store.computed_rows, 4)
+
+        store2 = SimilarityStore(os.path.join(self.tmp.name, "sims"))
+        tags, roots = self._sims(second, store2)
+        self.assertEqual((store2.reused_rows, store2.computed_rows), (3, 2))
+
+        fresh_tags, fresh_roots = self._sims(second, None)
+        np.testing.assert_allclose(tags, fresh_tags, atol=1e-12)
+        np.testing.assert_allclose(roots, fresh_roots, atol=1e-12)
+
+    def test_root_weight_change_invalidates_store(self):
+        lists = [["Pop Punk"], ["Skate Punk"]]
+        path = os.path.join(self.tmp.name, "sims")
+        self._sims(lists, SimilarityStore(path))
+        store = SimilarityStore(path)
+        codes = TagVocabulary().encode_albums(lists)
+        sorter_core._similarity_matrices(codes, self.rules, 5.0, None, store)
+        self.assertEqual(store.reused_rows, 0)
+
+    def test_works_with_budgeted_workspace(self):
+        lists = [["Pop Punk"], ["Skate Punk"], ["Jazz"]]
+        path = os.path.join(self.tmp.name, "sims")
+        with SimilarityWorkspace(budget_mb=1) as ws:
+            self._sims(lists, SimilarityStore(path), ws)
+        with SimilarityWorkspace(budget_mb=1) as ws:
+            store = SimilarityStore(path)
+            tags, _ = self._sims(lists, store, ws)
+            self.assertEqual(tags.dtype, np.float32)
+        self.assertEqual(store.reused_rows, 3)
+
+    def test_new_rows_are_computed_in_blocks_within_the_budget(self):
+        lists = [["Pop Punk", "Emo"], ["Bebop", "Jazz"], ["Skate Punk"], ["Techno"], ["Jazz"]]
+        with SimilarityWorkspace(budget_mb=0.0005, scratch_dir=self.tmp.name) as ws:
+            self.assertEqual(ws.block_rows(len(lists)), 1)
+            tags, roots = self._sims(lists, SimilarityStore(os.path.join(self.tmp.name, "s")), ws)
+            fresh_tags, fresh_roots = self._sims(lists, None)
+            np.testing.assert_allclose(tags, fresh_tags, atol=1e-6)
+            np.testing.assert_allclose(roots, fresh_roots, atol=1e-6)
+
+    def test_dropping_albums_keeps_the_stored_files(self):
+        lists = [["Pop Punk"], ["Skate Punk"], ["Jazz"], ["Techno"], ["House"]]
+        path = os.path.join(self.tmp.name, "sims")
+        self._sims(lists, SimilarityStore(path))
+        index = os.path.join(path, "index.json")
+        before = os.stat(index).st_mtime_ns
+
+        store = SimilarityStore(path)
+        tags, _ = self._sims(lists[1:], store)  # one album removed: 1/5 unused
+        self.assertEqual((store.reused_rows, store.computed_rows), (4, 0))
+        np.testing.assert_allclose(tags, self._sims(lists[1:], None)[0], atol=1e-12)
+        self.assertEqual(os.stat(index).st_mtime_ns, before)
+
+        self._sims(lists[3:], SimilarityStore(path))  # 3/5 unused: compacted
+        self.assertNotEqual(os.stat(index).st_mtime_ns, before)
+
+    def test_new_albums_append_a_block_and_leave_stored_blocks_alone(self):
+        lists = [["Pop Punk"], ["Skate Punk"], ["Jazz"], ["Techno"], ["House"], ["Bebop"]]
+        path = os.path.join(self.tmp.name, "sims")
+        self._sims(lists[:5], SimilarityStore(path))
+        stored = {f: os.stat(os.path.join(path, f)).st_mtime_ns
+                  for f in os.listdir(path) if f.endswith(".npy")}
+
+        for current in (lists, lists[:0:-1]):
+            store = SimilarityStore(path)
+            tags, roots = self._sims(current, store)
+            fresh_tags, fresh_roots = self._sims(current, None)
+            np.testing.assert_allclose(tags, fresh_tags, atol=1e-12)
+            np.testing.assert_allclose(roots, fresh_roots, atol=1e-12)
+        self.assertEqual((store.reused_rows, store.computed_rows), (5, 0))
+
+        for name, mtime in stored.items():  # never rewritten
+            self.assertEqual(os.stat(os.path.join(path, name)).st_mtime_ns, mtime)
+        block = np.load(os.path.join(path, "sim_tags-000002.npy"), mmap_mode="r")
+        self.assertEqual(block.shape, (1, 6))  # only the new album's row
+
+    def test_interrupted_write_keeps_the_previous_store(self):
+        lists = [["Pop Punk"], ["Skate Punk"], ["Jazz"]]
+        path = os.path.join(self.tmp.name, "sims")
+        self._sims(lists, SimilarityStore(path))
+
+        with patch("similarity_store.json.dump", side_effect=OSError("disk full")), \
+                patch("sys.stderr"):
+            self._sims(lists + [["Techno"]], SimilarityStore(path))
+        with open(os.path.join(path, "index.json"), encoding="utf-8") as fh:
+            self.assertEqual(json.load(fh)["generation"], 1)
+
+        store = SimilarityStore(path)
+        current = [["Techno"], ["Jazz"], ["Pop Punk"]]
+        tags, _ = self._sims(current, store)
+        self.assertEqual((store.reused_rows, store.computed_rows), (2, 1))
+        np.testing.assert_allclose(tags, self._sims(current, None)[0], atol=1e-12)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+import os
+import tempfile
+import unittest
+
+from genre_helpers import (
+    get_spotify_album_info,
+    get_spotify_album_search_info,
+    get_spotify_artist_genres,
+    get_spotify_track_artist_genres,
+)
+from spotify_batch import SpotifyCrossLookup, SpotifyGenreTable
+
+
+class FakeSpotify:
+    """Minimal spotipy stand-in that counts requests."""
+
+    def __init__(self, n_albums=45):
+        self.calls = {}
+        self._artists = {f"ar{i}": {"id": f"ar{i}", "genres": [f"genre {i % 5}", "rock"]}
+                         for i in range(30)}
+        self._albums = {}
+        self._tracks = {}
+        for i in range(n_albums):
+            self._albums[f"al{i}"] = {
+                "id": f"al{i}",
+                # Every third album has album-level genres.
+                "genres": ["jazz"] if i % 3 == 0 else [],
+                "artists": [{"id": f"ar{i % 30}"}, {"id": f"ar{(i * 7) % 30}"}],
+            }
+            self._tracks[f"t{i}"] = {"id": f"t{i}", "artists": [{"id": f"ar{(i + 1) % 30}"}]}
+
+    def _count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def album(self, album_id):
+        self._count("album")
+        return self._albums[album_id]
+
+    def track(self, track_id):
+        self._count("track")
+        return self._tracks[track_id]
+
+    def artist(self, artist_id):
+        self._count("artist")
+        return self._artists[artist_id]
+
+    def _name(self, album_id):
+        return f"Record {album_id[2:]}"
+
+    def search(self, q, type, limit=1):
+        self._count("search")
+        if type == "artist":
+            name = q.split(":", 1)[1]
+            hit = self._artists.get("ar" + name.replace("Artist ", ""))
+            return {"artists": {"items": [hit] if hit else []}}
+        title = q.split('"')[1]
+        hits = [a for a in self._albums.values() if self._name(a["id"]) == title]
+        return {"albums": {"items": hits[:1]}}
+
+    def artist_albums(self, artist_id, limit=50):
+        self._count("artist_albums")
+        items = [{"id": a["id"], "name": self._name(a["id"]) + " (Deluxe Edition)"}
+                 for a in self._albums.values() if a["artists"][0]["id"] == artist_id]
+        return {"items": items[:limit]}
+
+    def albums(self, ids):
+        self._count("albums")
+        assert len(ids) <= 20
+        return {"albums": [self._albums.get(i) for i in ids]}
+
+    def tracks(self, ids):
+        self._count("tracks")
+        assert len(ids) <= 50
+        return {"tracks": [self._tracks.get(i) for i in ids]}
+
+    def artists(self, ids):
+        self._count("artists")
+        assert len(ids) <= 50
+        return {"artists": [self._artists.get(i) for i in ids]}
+
+
+class SpotifyGenreTableTest(unittest.TestCase):
+    def test_prefetched_results_match_single_lookups(self):
+        sp = FakeSpotify()
+        table = SpotifyGenreTable(sp)
+        albums = [f"al{i}" for i in range(45)]
+        tracks = [f"t{i}" for i in range(45)]
+        table.prefetch(albums, tracks)
+        # 3 album calls (20 + 20 + 5), 1 track call, 1 artist call.
+        self.assertEqual(sp.calls, {"albums": 3, "tracks": 1, "artists": 1})
+
+        reference = FakeSpotify()
+        for album_id in albums:
+            self.assertEqual(table.album_genres(album_id),
+                             get_spotify_album_info(reference, album_id))
+        for track_id in tracks:
+            self.assertEqual(table.track_artist_genres(track_id),
+                             get_spotify_track_artist_genres(reference, track_id))
+        # No single-item requests were needed after the prefetch.
+        self.assertEqual(sp.calls, {"albums": 3, "tracks": 1, "artists": 1})
+
+    def test_unknown_ids_fall_back_to_single_lookups(self):
+        sp = FakeSpotify()
+        table = SpotifyGenreTable(sp)
+        table.prefetch(["al1"], [])
+        self.assertEqual(table.album_genres("al2"), get_spotify_album_info(FakeSpotify(), "al2"))
+        self.assertEqual(sp.calls["album"], 1)
+
+    def test_failed_bulk_call_falls_back(self):
+        sp = FakeSpotify()
+
+        def broken(ids):
+            raise RuntimeError("boom")
+
+        sp.albums = broken
+        table = SpotifyGenreTable(sp)
+        table.prefetch(["al0", "al1"], [])
+        self.assertEqual(table.album_genres("al1"), get_spotify_album_info(FakeSpotify(), "al1"))
+
+
+class SpotifyCrossLookupTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "matches.json")
+        # 60 albums by 30 distinct artists (first artist of album i is ar{i % 30}).
+        self.pairs = [(f"Record {i}", f"Artist {i % 30}") for i in range(60)]
+
+    def test_matches_per_album_search_helpers(self):
+        sp = FakeSpotify(n_albums=60)
+        cross = SpotifyCrossLookup(sp, self.path)
+        cross.prefetch(self.pairs)
+        reference = FakeSpotify(n_albums=60)
+        for album, artist in self.pairs:
+            self.assertEqual(cross.album_genres(album, artist),
+                             get_spotify_album_search_info(reference, album, artist))
+            self.assertEqual(cross.artist_genres(artist),
+                             get_spotify_artist_genres(reference, artist))
+        # One search + one discography page per distinct artist, plus bulk calls;
+        # the per-album path would need ~60 searches + 60 album + 120 artist calls.
+        self.assertEqual(sp.calls["search"], 30)
+        self.assertEqual(sp.calls["artist_albums"], 30)
+        self.assertNotIn("album", sp.calls)
+        self.assertNotIn("artist", sp.calls)
+
+    def test_persisted_matches_skip_searches(self):
+        first = SpotifyCrossLookup(FakeSpotify(n_albums=60), self.path)
+        first.prefetch(self.pairs)
+        sp = FakeSpotify(n_albums=60)
+        again = SpotifyCrossLookup(sp, self.path)
+        again.prefetch(self.pairs)
+        for album, artist in self.pairs:
+            again.album_genres(album, artist)
+            again.artist_genres(artist)
+        self.assertEqual(set(sp.calls), {"albums", "artists"})
+        self.assertLessEqual(sum(sp.calls.values()), 5)
+
+    def test_failed_artist_search_is_not_repeated(self):
+        sp = FakeSpotify(n_albums=2)
+
+        def down(q, type, limit=1):
+            sp._count("search")
+            raise ConnectionError("spotify down")
+
+        sp.search = down
+        cross = SpotifyCrossLookup(sp, self.path)
+        cross.prefetch([("Record 0", "Artist 0"), ("Record 1", "Artist 0")])
+        self.assertEqual(cross.artist_genres("Artist 0"), [])
+        self.assertEqual(sp.calls["search"], 1)
+        cross.save()
+        self.assertFalse(os.path.exists(self.path))  # misses are not persisted
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import MultiLabelBinarizer
+
+from genre_helpers import normalize_and_sort_genres
+from genre_normalization import (
+    encoded_root_features,
+    genre_similarity_matrix,
+    infer_root,
+    infer_roots_encoded,
+    load_genre_roots,
+    merge_consensus,
+)
+from tag_vocab import TagVocabulary
+
+LISTS = [
+    ["Pop Punk", "Emo", "punk"],
+    ["Punk", " skate  punk "],
+    ["Jazz", "Bebop"],
+    ["Ambient", "Post-Rock"],
+    [],
+    ["emo", "EMO", "Indie Rock"],
+]
+
+
+class TagVocabularyTest(unittest.TestCase):
+    def setUp(self):
+        self.rules = load_genre_roots()
+
+    def test_interning_is_normalized_and_stable(self):
+        vocab = TagVocabulary()
+        a = vocab.intern("Pop  Punk ")
+        self.assertEqual(vocab.intern("pop punk"), a)
+        self.assertIsNone(vocab.intern("  "))
+        self.assertEqual(vocab.norm[a], "pop punk")
+        self.assertEqual(vocab.display[a], "Pop Punk")
+
+    def test_encoding_matches_string_pipeline(self):
+        codes = TagVocabulary().encode_albums(LISTS)
+        expected = normalize_and_sort_genres(
+            [[" ".join(t.split()) for t in sub] for sub in LISTS]
+        )
+        # Same broad -> niche order, minus per-album duplicates.
+        dedup = [list(dict.fromkeys(sub)) for sub in expected]
+        self.assertEqual(codes.display_lists(), dedup)
+
+    def test_roots_match_infer_root(self):
+        codes = TagVocabulary().encode_albums(LISTS)
+        expected = [infer_root(sub, self.rules) for sub in codes.display_lists()]
+        self.assertEqual(infer_roots_encoded(codes, self.rules), expected)
+
+    def test_similarities_match_string_features(self):
+        codes = TagVocabulary().encode_albums(LISTS)
+        display = codes.display_lists()
+        reference = cosine_similarity(MultiLabelBinarizer().fit_transform(display))
+        np.testing.assert_allclose(cosine_similarity(codes.one_hot()), reference, atol=1e-12)
+        features = encoded_root_features(codes, self.rules, 2.0)
+        np.testing.assert_allclose(
+            cosine_similarity(features), genre_similarity_matrix(display, self.rules, 2.0),
+            atol=1e-12,
+        )
+
+    def test_consensus_with_vocab_matches_plain(self):
+        collected = [("Discogs", ["Rock", "Indie Rock"]), ("Last.fm", ["rock", "Shoegaze"]),
+                     ("MusicBrainz", ["indie rock"])]
+        self.assertEqual(merge_consensus(collected, vocab=TagVocabulary()),
+                         merge_consensus(collected))
+
+
+if __name__ == "__main__":
+    unittest.main()
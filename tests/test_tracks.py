@@ -0,0 +1,83 @@
+import tracemalloc
+import unittest
+
+from backends import SpotifyBackend, TidalBackend
+from tracks import SpotifyTrack, TidalTrack, dedupe_tracks, tracks_frame
+
+
+def _spotify_item(i, track_id=None):
+    return {
+        "name": f"Song {i}",
+        "artists": [{"name": f"Artist {i % 7}"}],
+        "album": {"name": f"Album {i % 13}", "id": f"alb{i % 13}"},
+        "track_number": i % 12 + 1,
+        "disc_number": 1,
+        "id": track_id if track_id is not None else f"trk{i}",
+        "uri": f"spotify:track:trk{i}",
+    }
+
+
+class TrackRecordTest(unittest.TestCase):
+    def test_spotify_mapping_and_column_access(self):
+        track = SpotifyBackend._map_track(_spotify_item(3))
+        self.assertIsInstance(track, SpotifyTrack)
+        self.assertEqual(track.get("Spotify Track ID"), "trk3")
+        self.assertEqual(track["Artist"], "Artist 3")
+        self.assertFalse(track.get("Is Local"))
+        self.assertIsNone(track.get("Nope"))
+        self.assertFalse(hasattr(track, "__dict__"))
+
+    def test_tidal_mapping(self):
+        class Obj:
+            def __init__(self, **kw):
+                self.__dict__.update(kw)
+
+        raw = Obj(id=42, name="Tune", artist=Obj(name="Band"),
+                  album=Obj(id=7, name="Record"), track_num=2, volume_num=1)
+        track = TidalBackend._map_track(raw)
+        self.assertIsInstance(track, TidalTrack)
+        self.assertEqual((track.track_id, track.album_id), ("42", "7"))
+        self.assertFalse(track.is_local)
+
+    def test_dedupe_by_id_then_fields(self):
+        a = SpotifyBackend._map_track(_spotify_item(1))
+        b = SpotifyBackend._map_track(_spotify_item(1))
+        c = SpotifyBackend._map_track(_spotify_item(2, track_id=""))
+        d = SpotifyBackend._map_track(_spotify_item(2, track_id=""))
+        self.assertEqual(dedupe_tracks([a, b, c, d]), [a, c])
+
+    def test_frame_columns_match_previous_dict_rows(self):
+        tracks = [SpotifyBackend._map_track(_spotify_item(i)) for i in range(3)]
+        for t in tracks:
+            t.genres, t.source = ["Rock"], "Discogs"
+        df = tracks_frame(tracks)
+        self.assertEqual(list(df.columns), [
+            "Song", "Artist", "Album", "Album ID", "Track Number", "Disc Number",
+            "Spotify Track ID", "Spotify URI", "Is Local", "Album Genre", "source",
+        ])
+        self.assertEqual(list(df.index), [0, 1, 2])
+        self.assertEqual(df.loc[1, "Song"], "Song 1")
+
+    def test_records_use_less_memory_than_dict_rows(self):
+        items = [_spotify_item(i) for i in range(2000)]
+
+        def traced(build):
+            tracemalloc.start()
+            try:
+                rows = build()
+                current, _ = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            del rows
+            return current
+
+        as_records = traced(lambda: [SpotifyBackend._map_track(it) for it in items])
+        columns = SpotifyTrack.columns()
+        as_dicts = traced(lambda: [
+            {c: SpotifyBackend._map_track(it).get(c) for c in columns} for it in items
+        ])
+        self.assertLess(as_records, as_dicts * 0.7)
+
+
+if __name__ == "__main__":
+    unittest.main()
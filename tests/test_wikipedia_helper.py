@@ -0,0 +1,137 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+import wikipedia_lookup
+from genre_helpers import get_wikipedia_album_info
+from wikipedia_lookup import WikipediaGenreLookup, parse_infobox_fields, parse_value_items
+
+KID_A = """{{Short description|2000 studio album by Radiohead}}
+{{Infobox album
+| name       = Kid A
+| type       = studio
+| artist     = [[Radiohead]]
+| cover      = Radiohead.kida.albumart.jpg
+| released   = {{start date|2000|10|2|df=y}}
+| genre      = {{flatlist|
+* [[Experimental rock]]<ref>{{cite web|title=Kid A review}}</ref>
+* [[Electronic music|electronic]]
+* [[post-rock]]
+}}
+| length     = {{Duration|m=49|s=56}}
+| label      = [[Parlophone]]
+}}
+'''''Kid A''''' is the fourth studio album by the English rock band [[Radiohead]]...
+"""
+
+OTHER = """{{Infobox album
+| name   = Kid A (tribute)
+| artist = [[Some Tribute Band]]
+| genre  = [[Jazz]]
+}}"""
+
+
+def _response(pages, status=200):
+    body = json.dumps({"query": {"pages": pages}}).encode()
+    response = Mock()
+    response.status_code = status
+    response.content = body
+    response.json.return_value = json.loads(body)
+    return response
+
+
+def _page(title, content, index):
+    return {"title": title, "index": index,
+            "revisions": [{"slots": {"main": {"content": content}}}]}
+
+
+class InfoboxParserTest(unittest.TestCase):
+    def test_reads_multiline_genre_and_stops(self):
+        fields = parse_infobox_fields(KID_A)
+        self.assertEqual(set(fields), {"artist", "genre"})
+        self.assertEqual(parse_value_items(fields["genre"]),
+                         ["Experimental rock", "electronic", "post-rock"])
+
+    def test_plain_and_inline_values(self):
+        self.assertEqual(parse_value_items("[[Art rock]], [[electronica]]<ref name=a/>"),
+                         ["Art rock", "electronica"])
+        self.assertEqual(parse_value_items("Pop, rock<br/>soul"), ["Pop", "rock", "soul"])
+
+    def test_non_album_pages(self):
+        self.assertIsNone(parse_infobox_fields("{{Infobox musical artist\n| genre = Rock\n}}"))
+        self.assertEqual(parse_infobox_fields("{{Infobox album\n| name = x\n}}\n| genre = no"), {})
+
+
+class WikipediaLookupTest(unittest.TestCase):
+    def test_search_candidates_skip_other_artists_and_cache_title(self):
+        lookup = WikipediaGenreLookup()
+        search = _response([_page("Kid A (tribute)", OTHER, 1), _page("Kid A", KID_A, 2)])
+        with patch("wikipedia_lookup.requests.get", return_value=search) as get:
+            genres = lookup.album_genres("Kid A", "Radiohead")
+        self.assertEqual(genres, ["Experimental rock", "electronic", "post-rock"])
+        self.assertEqual(get.call_args.kwargs["params"]["generator"], "search")
+        self.assertEqual(lookup.titles[("kid a", "radiohead")], "Kid A")
+
+        with patch("wikipedia_lookup.requests.get",
+                   return_value=_response([_page("Kid A", KID_A, 0)])) as get:
+            lookup.album_genres("Kid A", "Radiohead")
+        self.assertEqual(get.call_args.kwargs["params"]["titles"], "Kid A")
+        self.assertEqual(lookup.requests, 2)
+
+    def test_http_errors_are_not_cached(self):
+        lookup = WikipediaGenreLookup()
+        with patch("wikipedia_lookup.requests.get", return_value=_response([], 503)):
+            self.assertEqual(lookup.album_genres("Kid A", "Radiohead"), [])
+        self.assertNotIn(("kid a", "radiohead"), lookup.titles)
+
+    def test_resolved_titles_persist_across_runs(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "wikipedia_titles.json")
+        lookup = WikipediaGenreLookup(path)
+        with patch("wikipedia_lookup.requests.get",
+                   side_effect=[_response([_page("Kid A", KID_A, 1)]), _response([])]):
+            lookup.album_genres("Kid A", "Radiohead")
+            lookup.album_genres("Unknown", "Nobody")
+        lookup.save()
+
+        later = WikipediaGenreLookup(path)
+        with patch("wikipedia_lookup.requests.get",
+                   return_value=_response([_page("Kid A", KID_A, 0)])) as get:
+            self.assertEqual(later.album_genres("Kid A", "Radiohead"),
+                             ["Experimental rock", "electronic", "post-rock"])
+        self.assertEqual(get.call_args.kwargs["params"]["titles"], "Kid A")  # no search
+        self.assertNotIn(("unknown", "nobody"), later.titles)  # misses are retried
+
+    def test_known_titles_are_fetched_in_one_batch(self):
+        lookup = WikipediaGenreLookup()
+        lookup.titles = {("kid a", "radiohead"): "Kid a", ("other", "radiohead"): "Other",
+                         ("new", "radiohead"): None}
+        batch = _response([_page("Kid A", KID_A, 0), _page("Other", OTHER, 1)])
+        batch.json.return_value["query"]["normalized"] = [{"from": "Kid a", "to": "Kid A"}]
+        with patch("wikipedia_lookup.requests.get", return_value=batch) as get:
+            found = lookup.prefetch([("Kid A", "Radiohead"), ("Other", "Radiohead"),
+                                     ("New", "Radiohead"), ("Unseen", "Radiohead")])
+        self.assertEqual((found, get.call_count), (1, 1))
+        self.assertEqual(get.call_args.kwargs["params"]["titles"], "Kid a|Other")
+
+        with patch("wikipedia_lookup.requests.get",
+                   return_value=_response([])) as get:
+            self.assertEqual(lookup.album_genres("Kid A", "Radiohead"),
+                             ["Experimental rock", "electronic", "post-rock"])
+            self.assertEqual(get.call_count, 0)
+            lookup.album_genres("Other", "Radiohead")  # wrong artist: searched again
+        self.assertEqual(get.call_args.kwargs["params"]["generator"], "search")
+
+    def test_provider_wrapper_cleans_tags(self):
+        with patch.object(wikipedia_lookup, "_default_lookup", WikipediaGenreLookup()), \
+                patch("wikipedia_lookup.requests.get",
+                      return_value=_response([_page("Kid A", KID_A, 1)])):
+            self.assertEqual(get_wikipedia_album_info("Kid A", "Radiohead"),
+                             ["Experimental rock", "electronic", "post-rock"])
+
+
+if __name__ == "__main__":
+    unittest.main()
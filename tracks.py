@@ -0,0 +1,121 @@
+"""Compact per-track records shared by the backends and the pipeline.
+
+Backends used to build one dict per track, which the pipeline then turned into
+a DataFrame, back into ``to_dict("records")`` for genre enrichment and once
+more for the upload, so a 50k-track library paid for several generations of
+transient dicts. Tracks are now :class:`TrackRecord` objects with
+``__slots__`` (no per-instance ``__dict__``): fetchers produce them directly,
+deduplication, enrichment and upload work on them in place, and a single
+DataFrame is built column by column for ordering and the CSV
+(:func:`tracks_frame`).
+
+``COLUMNS`` maps the CSV/DataFrame column names to attributes, and
+:meth:`TrackRecord.get` keeps dict-style access by column name working.
+"""
+
+import pandas as pd
+
+
+class TrackRecord:
+    """One fetched track (service-neutral fields)."""
+
+    __slots__ = ("song", "artist", "album", "album_id", "track_number", "disc_number",
+                 "track_id", "genres", "source")
+
+    # Column name -> attribute, in CSV column order.
+    COLUMNS = {
+        "Song": "song",
+        "Artist": "artist",
+        "Album": "album",
+        "Album ID": "album_id",
+        "Track Number": "track_number",
+        "Disc Number": "disc_number",
+    }
+    TRACK_ID_COLUMN = "Track ID"
+    is_local = False
+
+    def __init__(self, song, artist, album, album_id=None, track_number=None,
+                 disc_number=None, track_id=None):
+        self.song = song
+        self.artist = artist
+        self.album = album
+        self.album_id = album_id
+        self.track_number = track_number
+        self.disc_number = disc_number
+        self.track_id = track_id
+        self.genres = None
+        self.source = None
+
+    @classmethod
+    def columns(cls):
+        """Column name -> attribute for this record type, in CSV order."""
+        return {**TrackRecord.COLUMNS, cls.TRACK_ID_COLUMN: "track_id", **cls.COLUMNS}
+
+    def get(self, column, default=None):
+        """Dict-style access by column name (``row.get("Artist")``)."""
+        attr = self.columns().get(column)
+        if attr is None:
+            return default
+        return getattr(self, attr, default)
+
+    def __getitem__(self, column):
+        attr = self.columns().get(column)
+        if attr is None:
+            raise KeyError(column)
+        return getattr(self, attr)
+
+    def dedupe_key(self):
+        """Service track id, or the descriptive fields when there is none."""
+        return self.track_id or (self.song, self.artist, self.album,
+                                 self.track_number, self.disc_number)
+
+    def __repr__(self):
+        return (f"{type(self).__name__}({self.artist!r}, {self.album!r}, "
+                f"{self.song!r}, track_id={self.track_id!r})")
+
+
+class SpotifyTrack(TrackRecord):
+    __slots__ = ("uri", "is_local")
+
+    COLUMNS = {"Spotify URI": "uri", "Is Local": "is_local"}
+    TRACK_ID_COLUMN = "Spotify Track ID"
+
+    def __init__(self, *args, uri=None, is_local=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.uri = uri
+        self.is_local = is_local
+
+
+class TidalTrack(TrackRecord):
+    __slots__ = ()
+
+    COLUMNS = {}
+    TRACK_ID_COLUMN = "Tidal Track ID"
+
+
+def dedupe_tracks(tracks):
+    """Drop repeated tracks, keeping the first occurrence."""
+    seen = set()
+    deduped = []
+    for track in tracks:
+        key = track.dedupe_key()
+        if key in seen:
+            continue
+        seen.add(key)
+        deduped.append(track)
+    return deduped
+
+
+def tracks_frame(tracks):
+    """Build the pipeline DataFrame column-wise from a list of records.
+
+    The index is the position in ``tracks``, so ordered frames map straight
+    back to their records. Enrichment results (``genres`` / ``source``)
+    become the ``Album Genre`` and ``source`` columns when present.
+    """
+    columns = type(tracks[0]).columns() if tracks else dict(TrackRecord.COLUMNS)
+    data = {name: [getattr(t, attr) for t in tracks] for name, attr in columns.items()}
+    if any(t.source is not None for t in tracks):
+        data["Album Genre"] = [t.genres for t in tracks]
+        data["source"] = [t.source for t in tracks]
+    return pd.DataFrame(data)
@@ -0,0 +1,277 @@
+"""Album genres from Wikipedia infobox wikitext via the MediaWiki API.
+
+The original provider guessed an article slug from ``"<album> <artist>"``
+(which usually missed), downloaded the full rendered article (hundreds of KB)
+and parsed all of it with BeautifulSoup to read a single infobox row. Here a
+single ``action=query`` request runs the title search *and* returns the
+section-0 wikitext (where the infobox lives) of the top few candidates at once;
+resolved titles are cached (and, for the provider the sorter uses, persisted in
+``~/.cache/likes_songs_sorter/wikipedia_titles.json``) so later lookups of the
+same album skip the search, in this run and the next ones.
+Before enrichment, albums whose title is already known are fetched together,
+up to ``TITLE_BATCH`` per ``titles=A|B|...`` request, so only unresolved albums
+cost a request (the search) each. The wikitext is scanned line by line from
+``{{Infobox album`` and the scan stops as soon as the ``genre`` field is
+complete.
+"""
+
+import json
+import os
+import re
+import sys
+import tempfile
+
+import requests
+
+from provider_metrics import count_response, record_error
+
+WIKI_API = "https://en.wikipedia.org/w/api.php"
+USER_AGENT = "MusicSorter/1.0 (+github.com/likes-songs-sorter)"
+SEARCH_CANDIDATES = 3
+TITLE_BATCH = 50  # MediaWiki's limit of titles per query for regular clients
+# Parameters shared by every request: section-0 wikitext of the matched pages.
+QUERY_PARAMS = {
+    "action": "query", "format": "json", "formatversion": "2",
+    "prop": "revisions", "rvprop": "content", "rvslots": "main",
+    "rvsection": "0", "redirects": "1",
+}
+
+_INFOBOX_ALBUM = re.compile(r"\{\{\s*infobox album", re.IGNORECASE)
+_FIELD = re.compile(r"^\s*\|\s*([a-z_ ]+?)\s*=(.*)$", re.IGNORECASE)
+_LINK = re.compile(r"\[\[([^\]|]+)(?:\|([^\]]+))?\]\]")
+_REF = re.compile(r"<ref[^>/]*/>|<ref[^>]*>.*?</ref>|<!--.*?-->", re.IGNORECASE | re.DOTALL)
+_SPLIT = re.compile(r"<br\s*/?>|[,*·\n]|\{\{|\}\}|\|", re.IGNORECASE)
+
+
+def default_title_path():
+    return os.path.join(
+        os.path.expanduser("~"), ".cache", "likes_songs_sorter", "wikipedia_titles.json"
+    )
+
+
+def _norm(value):
+    return " ".join(str(value or "").casefold().split())
+
+
+def parse_infobox_fields(wikitext, wanted=("artist", "genre"), stop_at="genre"):
+    """Return ``{field: raw value}`` from an album infobox, or ``None``.
+
+    ``None`` means the text has no ``{{Infobox album``. Lines are scanned from
+    the infobox start; multi-line values (``{{flatlist|`` ...) run until the
+    next ``| field =`` line or the infobox end, and scanning stops once the
+    ``stop_at`` field has been read.
+    """
+    match = _INFOBOX_ALBUM.search(wikitext or "")
+    if not match:
+        return None
+    fields = {}
+    current = None  # field whose value is being read
+    depth = 0       # open ``{{`` templates inside that value
+    for line in wikitext[match.end():].splitlines():
+        if depth > 0:
+            if current in fields:
+                fields[current].append(line)
+            depth = max(0, depth + line.count("{{") - line.count("}}"))
+            continue
+        field = _FIELD.match(line)
+        if field is None and line.strip().startswith("}}"):
+            break  # end of the infobox
+        if field is not None:
+            if current == stop_at:
+                break
+            current = field.group(1).strip().lower()
+            value = field.group(2)
+            if current in wanted:
+                fields[current] = [value]
+        else:
+            value = line
+            if current in fields:
+                fields[current].append(line)
+        depth = max(0, value.count("{{") - value.count("}}"))
+    return {name: "\n".join(parts) for name, parts in fields.items()}
+
+
+def parse_value_items(value):
+    """Items of a raw infobox value (link labels, else plain list items)."""
+    value = _REF.sub("", value or "")
+    links = [label or target for target, label in _LINK.findall(value)]
+    if links:
+        return [" ".join(link.split()) for link in links if link.strip()]
+    items = (item.strip(" '") for item in _SPLIT.split(value))
+    return [item for item in items if item and item.lower() not in {"flatlist", "hlist",
+                                                                    "plainlist", "nowrap"}]
+
+
+class WikipediaGenreLookup:
+    """Infobox genres with a per-album title-resolution cache.
+
+    With a ``title_path`` the resolved titles are read from it on first use
+    and written back by :meth:`save`; without one they last for the run.
+    """
+
+    def __init__(self, title_path=None):
+        self.titles = {}        # (album, artist) key -> resolved title, None: no article
+        self.prefetched = {}    # key -> genres read by :meth:`prefetch`
+        self.title_path = os.path.expanduser(title_path) if title_path else None
+        self.requests = 0
+        self.bytes = 0
+        self._loaded = title_path is None
+        self._dirty = False
+
+    # --- persistence ------------------------------------------------------------
+    def _load(self):
+        self._loaded = True
+        try:
+            with open(self.title_path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return
+        # Only resolved titles are persisted; "no article" is retried next run.
+        for entry in (data.get("titles") or []) if isinstance(data, dict) else []:
+            if isinstance(entry, list) and len(entry) == 3 and entry[2]:
+                self.titles.setdefault((entry[0], entry[1]), entry[2])
+
+    def save(self):
+        """Write the resolved titles back to ``title_path``."""
+        if not self._dirty or self.title_path is None:
+            return
+        data = {"titles": [[album, artist, title]
+                           for (album, artist), title in self.titles.items() if title]}
+        try:
+            directory = os.path.dirname(self.title_path) or "."
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump(data, fh)
+            os.replace(tmp, self.title_path)
+            self._dirty = False
+        except OSError as exc:
+            print(f"⚠️ Could not write Wikipedia title file ({exc}).", file=sys.stderr)
+
+    def _request(self, params):
+        """The ``query`` object of one API call, or ``None`` on an HTTP error."""
+        payload = dict(QUERY_PARAMS, **params)
+        self.requests += 1
+        resp = requests.get(WIKI_API, params=payload, timeout=4,
+                            headers={"User-Agent": USER_AGENT})
+        self.bytes += len(resp.content or b"")
+        count_response(resp)
+        if resp.status_code >= 400:
+            record_error(requests.HTTPError(f"HTTP {resp.status_code} from {WIKI_API}"))
+            return None
+        return resp.json().get("query") or {}
+
+    def _query(self, params):
+        query = self._request(params)
+        if query is None:
+            return None
+        return sorted((p for p in query.get("pages") or [] if not p.get("missing")),
+                      key=lambda p: p.get("index", 0))
+
+    @staticmethod
+    def _page_genres(page, artist_key):
+        """Infobox genres of ``page`` if it is an album by that artist, else ``None``."""
+        revisions = page.get("revisions") or [{}]
+        content = ((revisions[0].get("slots") or {}).get("main") or {}).get("content")
+        fields = parse_infobox_fields(content)
+        if fields is None or "genre" not in fields:
+            return None
+        artist = fields.get("artist")
+        if artist is not None and artist_key and artist_key not in _norm(
+            " ".join(parse_value_items(artist)) or artist
+        ):
+            return None  # an album article, but by someone else
+        return parse_value_items(fields["genre"])
+
+    def prefetch(self, pairs):
+        """Fetch the articles of already-resolved ``(album, artist)`` pairs in batches.
+
+        Returns how many albums were answered. Pairs whose article no longer
+        answers forget their title, so :meth:`album_genres` searches for them
+        again.
+        """
+        if not self._loaded:
+            self._load()
+        wanted = {}
+        for album_name, artist_name in pairs:
+            key = (_norm(album_name), _norm(artist_name))
+            if self.titles.get(key) and key not in self.prefetched:
+                wanted.setdefault(self.titles[key], []).append(key)
+        titles = list(wanted)
+        found = len(self.prefetched)
+        for start in range(0, len(titles), TITLE_BATCH):
+            batch = titles[start:start + TITLE_BATCH]
+            query = self._request({"titles": "|".join(batch)})
+            if query is None:
+                continue  # HTTP error: each album falls back to its own request
+            renamed = {}
+            for step in ("normalized", "redirects"):
+                for entry in query.get(step) or []:
+                    renamed[entry.get("from")] = entry.get("to")
+            pages = {p.get("title"): p for p in query.get("pages") or [] if not p.get("missing")}
+            for title in batch:
+                final = renamed.get(title, title)  # normalized, then redirected
+                page = pages.get(renamed.get(final, final))
+                for key in wanted[title]:
+                    genres = self._page_genres(page, key[1]) if page is not None else None
+                    if genres is None:
+                        self.titles.pop(key, None)
+                        self._dirty = True
+                    else:
+                        self.prefetched[key] = genres
+        return len(self.prefetched) - found
+
+    def album_genres(self, album_name, artist_name):
+        """Genres of the album's Wikipedia article (``[]`` when none found)."""
+        if not self._loaded:
+            self._load()
+        key = (_norm(album_name), _norm(artist_name))
+        if key in self.prefetched:
+            return list(self.prefetched[key])
+        if key in self.titles:
+            title = self.titles[key]
+            if title is None:
+                return []
+            pages = self._query({"titles": title})
+        else:
+            pages = self._query({
+                "generator": "search",
+                "gsrsearch": f"{album_name} {artist_name} album",
+                "gsrlimit": str(SEARCH_CANDIDATES),
+            })
+        if pages is None:
+            return []  # HTTP error: retry on the next lookup
+        for page in pages:
+            genres = self._page_genres(page, key[1])
+            if genres is None:
+                continue
+            title = page.get("title")
+            if title and self.titles.get(key) != title:
+                self._dirty = True
+            self.titles[key] = title
+            return genres
+        if self.titles.get(key):
+            self._dirty = True  # the remembered article no longer answers
+        self.titles[key] = None
+        return []
+
+
+_default_lookup = WikipediaGenreLookup(default_title_path())
+
+
+def get_album_genres(album_name, artist_name):
+    return _default_lookup.album_genres(album_name, artist_name)
+
+
+def prefetch_titles(pairs):
+    """Batch-fetch the provider's already-resolved ``(album, artist)`` pairs."""
+    before = _default_lookup.requests
+    albums = _default_lookup.prefetch(pairs)
+    if albums:
+        print(f"📚 Prefetched Wikipedia infoboxes for {albums} albums in "
+              f"{_default_lookup.requests - before} requests.")
+
+
+def save_titles():
+    """Persist the titles the provider resolved this run."""
+    _default_lookup.save()